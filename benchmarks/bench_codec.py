@@ -0,0 +1,82 @@
+"""比较各个 JSON 编解码器在 PushOicqMsg/SendOicqMsg 包上的性能
+
+python benchmarks/bench_codec.py [-n 次数]
+"""
+import argparse
+import timeit
+
+from nonebot.adapters.secluded.codec import Codec, get_codec
+
+
+def push_oicq_msg(seq: int) -> dict:
+    return {
+        'seq': seq,
+        'cmd': 'PushOicqMsg',
+        'data': [
+            {
+                'Account': '1234567890',
+                'Bubble': '0',
+                'Group': 'Group',
+                'GroupId': '987654321',
+                'GroupName': '某某技术交流群',
+                'MsgId': f'{seq}-1700000000',
+                'MsgType': '0',
+                'Op': '0',
+                'OpName': '群管理员',
+                'OpUid': '',
+                'Title': '活跃',
+                'Typeface': '0',
+                'Uid': 'u_abcdefghijklmn',
+                'Uin': '2233445566',
+                'UinName': '路过的群友',
+                'UserGolineMode': '0'
+            },
+            {'AtName': 'bot', 'AtUin': '1234567890'},
+            {'Text': ' 帮我查一下今天的天气, 顺便讲个笑话 '},
+            {'Img': 'https://gchat.qpic.cn/gchatpic_new/0/0-0-0123456789ABCDEF0123456789ABCDEF/0'},
+            {'Text': '谢谢 🙏'}
+        ]
+    }
+
+
+def send_oicq_msg(seq: int) -> dict:
+    return {
+        'cmd': 'SendOicqMsg',
+        'rsp': True,
+        'seq': seq,
+        'data': [
+            {'Account': '1234567890', 'Group': 'Group', 'GroupId': '987654321', 'Reply': f'{seq}-1700000000'},
+            {'AtName': '路过的群友', 'AtUin': '2233445566'},
+            {'Text': ' 今天晴, 气温 18~26℃, 适合出门。'}
+        ]
+    }
+
+
+def bench(codec: Codec, number: int) -> tuple[float, float, float]:
+    raw = [codec.dumps(push_oicq_msg(i)) for i in range(100)]
+    out = [send_oicq_msg(i) for i in range(100)]
+    decode = timeit.timeit(lambda: [codec.loads(i) for i in raw], number=number)
+    decode_str = timeit.timeit(lambda: [codec.loads(i.decode()) for i in raw], number=number)
+    encode = timeit.timeit(lambda: [codec.dumps(i) for i in out], number=number)
+    frames = number * 100
+    return decode / frames * 1e6, decode_str / frames * 1e6, encode / frames * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{"codec":<10}{"loads(bytes) us":>18}{"loads(str) us":>16}{"dumps us":>12}')
+    for name in ('json', 'orjson', 'msgspec'):
+        try:
+            codec = get_codec(name) # type: ignore
+        except ImportError:
+            print(f'{name:<10}{"未安装":>18}')
+            continue
+        decode, decode_str, encode = bench(codec, args.number)
+        print(f'{name:<10}{decode:>18.2f}{decode_str:>16.2f}{encode:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
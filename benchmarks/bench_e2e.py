@@ -0,0 +1,96 @@
+"""端到端压测: 本地模拟服务端推送群消息, 适配器解析分发后由插件处理并回复
+
+统计事件吞吐, 从服务端发出到进入处理函数的延迟, 发送往返时间和内存占用
+
+python benchmarks/bench_e2e.py [--rate 2000] [--duration 10] [--groups 50]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import resource
+import time
+
+import nonebot
+from nonebot import on_message
+from nonebot.adapters.secluded import Adapter, Bot, MessageEvent
+
+from fake_server import run as run_server
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def bench(args: argparse.Namespace):
+    latencies: list[float] = []
+    rtts: list[float] = []
+
+    matcher = on_message()
+
+    @matcher.handle()
+    async def _(bot: Bot, event: MessageEvent):
+        # 模拟服务端的 MsgId 为 "seq:发出时间"
+        latencies.append((time.time_ns() - int(event.msg_id.split(':')[1])) / 1e6)
+        if event.get_plaintext() == 'ping':
+            start = time.perf_counter()
+            await bot.send(event, 'pong')
+            rtts.append((time.perf_counter() - start) * 1e3)
+
+    adapter = Adapter(nonebot.get_driver())
+    await adapter.startup()
+    # 等待上线并预热
+    await asyncio.sleep(1)
+    latencies.clear()
+    rtts.clear()
+    start = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    elapsed = time.perf_counter() - start
+    count = len(latencies)
+    try:
+        # 过载时处理函数可能还在等待回复, 不无限等待
+        await asyncio.wait_for(adapter.shutdown(), 10)
+    except asyncio.TimeoutError:
+        print('shutdown timed out')
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'events/s        {count / elapsed:.0f}')
+    print(f'latency p50     {percentile(latencies, 50):.2f} ms')
+    print(f'latency p99     {percentile(latencies, 99):.2f} ms')
+    print(f'send rtt p50    {percentile(rtts, 50):.2f} ms')
+    print(f'send rtt p99    {percentile(rtts, 99):.2f} ms')
+    print(f'max rss         {rss:.1f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate', type=float, default=2000, help='每秒推送的群消息数')
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--reply-ratio', type=float, default=0.1, help='需要回复的消息比例')
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(
+        target=run_server,
+        kwargs={'port': args.port, 'rate': args.rate, 'groups': args.groups, 'reply_ratio': args.reply_ratio},
+        daemon=True
+    )
+    server.start()
+    time.sleep(0.5)
+    try:
+        nonebot.init(
+            driver='~websockets',
+            log_level='WARNING',
+            secluded_host=f'ws://127.0.0.1:{args.port}',
+            secluded_token='token'
+        )
+        asyncio.run(bench(args))
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
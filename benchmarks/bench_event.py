@@ -0,0 +1,80 @@
+"""比较立即解析与延迟解析两种 MessageEvent 构造方式的耗时和内存占用
+
+python benchmarks/bench_event.py [-n 事件数]
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable
+
+from nonebot.adapters.secluded.event import MessageEvent
+from nonebot.adapters.secluded.parser import decode_message
+
+from bench_codec import push_oicq_msg
+
+
+def eager(payload: dict) -> MessageEvent:
+    """改动前的构造方式: 先解析全部消息段, 再经过 pydantic 校验构造"""
+    first_data = payload['data'][0]
+    event_group = 'Group' in first_data
+    return MessageEvent(
+        message=decode_message(payload['data'][1:]),
+        account_id=first_data['Account'],
+        user_id=first_data['Uin'],
+        user_name=first_data['UinName'],
+        user_group_name=first_data['OpName'],
+        group_id=first_data['GroupId'] if event_group else None,
+        group_name=first_data['GroupName'] if event_group else None,
+        msg_id=first_data['MsgId']
+    )
+
+
+def lazy(payload: dict) -> MessageEvent:
+    return MessageEvent.from_payload(payload['data'][0], payload['data'][1:])
+
+
+def lazy_plaintext(payload: dict) -> MessageEvent:
+    event = lazy(payload)
+    event.get_plaintext()
+    return event
+
+
+def lazy_message(payload: dict) -> MessageEvent:
+    event = lazy(payload)
+    event.get_message()
+    return event
+
+
+def bench(func: Callable[[dict], MessageEvent], payloads: list[dict]) -> tuple[float, float]:
+    start = time.perf_counter()
+    for i in payloads:
+        func(i)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    events = [func(i) for i in payloads]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del events
+    return len(payloads) / elapsed, size / len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    payloads = [push_oicq_msg(i) for i in range(args.number)]
+    print(f'{"construct":<18}{"events/s":>12}{"bytes/event":>14}')
+    for name, func in (
+        ('eager', eager),
+        ('lazy', lazy),
+        ('lazy+plaintext', lazy_plaintext),
+        ('lazy+message', lazy_message)
+    ):
+        rate, size = bench(func, payloads)
+        print(f'{name:<18}{rate:>12.0f}{size:>14.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""payload_to_event, 发送包编码, 入站过滤与消息历史的微基准, 用于比较不同版本的性能
+
+python benchmarks/bench_micro.py [-n 次数]
+"""
+import argparse
+import itertools
+import timeit
+
+import nonebot
+
+from bench_codec import push_oicq_msg
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    nonebot.init(driver='~websockets', log_level='WARNING', secluded_host='ws://127.0.0.1:8765', secluded_token='token')
+    from nonebot.adapters.secluded import Adapter, Message, MessageSegment
+    from nonebot.adapters.secluded.ingress import IngressFilter
+    from nonebot.adapters.secluded.history import MessageHistory
+
+    adapter = Adapter(nonebot.get_driver())
+    payloads = [push_oicq_msg(i) for i in range(100)]
+    event = adapter.payload_to_event(payloads[0])
+    message = Message([
+        MessageSegment('at', {'user_name': '路过的群友', 'user_id': '2233445566'}),
+        MessageSegment('text', {'text': ' 今天晴, 气温 18~26℃, 适合出门。'}),
+        MessageSegment('img', {'url': 'https://example.com/weather.png'})
+    ])
+
+    deny_group = IngressFilter(deny_groups=[payloads[0]['data'][0]['GroupId']])
+    deny_event = IngressFilter(deny_events=['notice'])
+    # 环形缓冲区比消息种类少, 每次写入都会淘汰一条
+    history = MessageHistory(adapter.codec, 50, 1024 * 1024, 100)
+    history_payloads = itertools.cycle([i['data'] for i in payloads])
+    for i in payloads:
+        history.add(i['data'])
+    msg_id = payloads[-1]['data'][0]['MsgId']
+    group_id = payloads[-1]['data'][0]['GroupId']
+    account_id = payloads[-1]['data'][0]['Account']
+
+    cases = {
+        'payload_to_event': lambda: adapter.payload_to_event(payloads[0]),
+        'payload_to_event+get_message': lambda: adapter.payload_to_event(payloads[0]).get_message(),
+        'message_to_origin+dumps': lambda: adapter.codec.dumps(adapter.message_to_origin(event, message)), # type: ignore
+        'encode_message': lambda: adapter.encode_message(event, message).encode(1), # type: ignore
+        'encode_message(reply)': lambda: adapter.encode_message(event, message, True).encode(1), # type: ignore
+        'ingress(deny_groups)': lambda: deny_group.match(payloads[0]['data']),
+        'ingress(deny_events)': lambda: deny_event.match(payloads[0]['data']),
+        'history.add': lambda: history.add(next(history_payloads)), # type: ignore
+        'history.find': lambda: history.find(account_id, group_id, msg_id),
+        'history.recent(10)': lambda: history.recent(account_id, group_id, 10),
+    }
+    print(f'{"case":<32}{"us/op":>10}')
+    for name, func in cases.items():
+        best = min(timeit.repeat(func, number=args.number, repeat=5))
+        print(f'{name:<32}{best / args.number * 1e6:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
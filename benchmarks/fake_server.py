@@ -0,0 +1,127 @@
+"""本地模拟的 Secluded 服务端, 用于压测
+
+按 _forward_ws 的预期实现 SyncOicq 上线包, 上线后先推送一个带 Account 的包,
+再按指定速率推送群消息, 对每个 SendOicqMsg 回复同 seq 的 Response
+
+python benchmarks/fake_server.py [--port 8765] [--rate 1000] [--groups 50]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+import websockets.asyncio.server
+
+
+def group_message(account: str, group: int, seq: int, text: str) -> dict:
+    return {
+        'seq': seq,
+        'cmd': 'PushOicqMsg',
+        'data': [
+            {
+                'Account': account,
+                'Group': 'Group',
+                'GroupId': str(100000 + group),
+                'GroupName': f'压测群{group}',
+                # 带上发出的时间, 用于统计延迟
+                'MsgId': f'{seq}:{time.time_ns()}',
+                'OpName': '群成员',
+                'Uin': str(200000 + seq % 1000),
+                'UinName': f'群友{seq % 1000}'
+            },
+            {'Text': text}
+        ]
+    }
+
+
+class FakeSecludedServer:
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 8765,
+        account: str = '10001',
+        token: str = 'token',
+        rate: float = 1000,
+        groups: int = 50,
+        reply_ratio: float = 0.1,
+        duration: float = 0
+    ):
+        self.host = host
+        self.port = port
+        self.account = account
+        self.token = token
+        self.rate = rate
+        self.groups = groups
+        self.reply_ratio = reply_ratio
+        self.duration = duration
+        self.pushed = 0
+        self.received = 0
+
+    async def handler(self, ws: websockets.asyncio.server.ServerConnection):
+        raw = await ws.recv()
+        frame = json.loads(raw)
+        if frame['cmd'] != 'SyncOicq':
+            await ws.close()
+            return
+        ok = frame['data']['token'] == self.token
+        await ws.send(json.dumps({'seq': frame['seq'], 'cmd': 'Response', 'data': {'status': ok}}))
+        if not ok:
+            await ws.close()
+            return
+        await ws.send(json.dumps({'seq': 0, 'cmd': 'PushOicqMsg', 'data': [{'Account': self.account, 'Heartbeat': 1}]}))
+        push = asyncio.create_task(self.push(ws))
+        try:
+            async for raw in ws:
+                frame = json.loads(raw)
+                self.received += 1
+                if frame.get('rsp'):
+                    await ws.send(json.dumps({'seq': frame['seq'], 'cmd': 'Response', 'data': {'status': True}}))
+        finally:
+            push.cancel()
+
+    async def push(self, ws: websockets.asyncio.server.ServerConnection):
+        # 每 10ms 补齐按速率应该推送的包数
+        start = time.monotonic()
+        reply_every = int(1 / self.reply_ratio) if self.reply_ratio > 0 else 0
+        for seq in itertools.count(1):
+            while seq > (time.monotonic() - start) * self.rate:
+                await asyncio.sleep(0.01)
+            if self.duration and time.monotonic() - start >= self.duration:
+                return
+            text = 'ping' if reply_every and seq % reply_every == 0 else f'压测消息 {seq}'
+            await ws.send(json.dumps(group_message(self.account, seq % self.groups, seq, text), ensure_ascii=False))
+            self.pushed += 1
+
+    async def serve(self):
+        async with websockets.asyncio.server.serve(self.handler, self.host, self.port, max_size=None):
+            await asyncio.get_running_loop().create_future()
+
+
+def run(**kwargs):
+    asyncio.run(FakeSecludedServer(**kwargs).serve())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--account', default='10001')
+    parser.add_argument('--token', default='token')
+    parser.add_argument('--rate', type=float, default=1000, help='每秒推送的群消息数')
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--reply-ratio', type=float, default=0.1, help='需要回复的消息比例')
+    args = parser.parse_args()
+    run(
+        host=args.host,
+        port=args.port,
+        account=args.account,
+        token=args.token,
+        rate=args.rate,
+        groups=args.groups,
+        reply_ratio=args.reply_ratio
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -3,3 +3,5 @@ from .event import Event, MessageEvent, RequestEvent, NoticeEvent, MetaEvent, Ot
 from .adapter import Adapter as Adapter
 from .message import Message as Message
 from .message import MessageSegment as MessageSegment
+from .exception import ActionFailed as ActionFailed
+from .exception import NetworkError as NetworkError
@@ -1,6 +1,8 @@
 import asyncio
-import json
-from typing import Any, Literal, Optional
+import hmac
+import random
+import time
+from typing import Any, Optional, Union
 from typing_extensions import override
 
 from nonebot import get_plugin_config
@@ -14,22 +16,46 @@ from nonebot.drivers import (
     WebSocket,
     ForwardDriver,
     ReverseDriver,
+    Timeout,
     HTTPServerSetup,
-    WebSocketServerSetup
+    WebSocketServerSetup,
+    WebSocketClientMixin
 )
-import nonebot.drivers.websockets
 
 from nonebot.adapters import Adapter as BaseAdapter
-import websockets.asyncio
-import websockets.asyncio.client
+
+try:
+    # websockets 驱动可以直接以 bytes 收发文本帧, 省去 UTF-8 编解码
+    from websockets import ConnectionClosed
+    from nonebot.drivers.websockets import WebSocket as WebsocketsWebSocket
+except ImportError:
+    WebsocketsWebSocket = None
 
 from .bot import Bot
 from .event import Event, MessageEvent, OtherEvent, RequestEvent, NoticeEvent, MetaEvent
-from .config import Config
+from .config import Config, ConnectionConfig
+from .connection import Connection
+from .codec import get_codec
+from .dispatcher import EventDispatcher
+from .scheduler import OutboundScheduler, PRIORITY_REPLY
+from .spool import OutboundSpool
+from .capture import FrameCapture
+from .cache import TTLCache
+from .ingress import IngressFilter
+from .worker import WorkerClient, WorkerPool
+from . import worker
+from .metadata import MetadataCache
+from .history import MessageHistory
+from .model import CachedMessage
+from .media import MediaUploader
+from .transfer import FileTransfer
+from .encoder import EncodedFrame, MessageEncoder
+from .parser import classify, is_liveness, session_id, REQUEST_EVENTS, NOTICE_EVENTS, META_EVENTS
 from .message import Message, MessageSegment
-from .log import log
+from .exception import ActionFailed, NetworkError
+from .log import log, FrameLogger
+from .metrics import MetricsRegistry
 
-import websockets
 
 class Adapter(BaseAdapter):
 
@@ -37,119 +63,859 @@ class Adapter(BaseAdapter):
     def __init__(self, driver: Driver, **kwargs: Any):
         super().__init__(driver, **kwargs)
         self.adapter_config = get_plugin_config(Config)
-        self.task: Optional[asyncio.Task] = None
-        self.ws: Optional[websockets.asyncio.client.ClientConnection] = None
-        self.seq: int = 1
-        self.account_id: Optional[str] = None
+        self.codec = get_codec(self.adapter_config.secluded_json_codec)
+        self.frame_log = FrameLogger(
+            self.adapter_config.secluded_frame_log,
+            self.adapter_config.secluded_frame_log_sample,
+            self.adapter_config.secluded_frame_log_groups,
+            self.config.log_level
+        )
+        self.encoder = MessageEncoder(self.codec)
+        # 在多进程模式的子进程中运行时不为 None, 连接, 发包和事件都经过主进程
+        self.worker_client = WorkerClient.from_env(self.codec)
+        self.connections: list[Connection] = [
+            Connection(i) for i in self.adapter_config.get_connections()
+        ] if self.worker_client is None else []
+        # 账号 -> 该账号所在的连接
+        self._routes: dict[str, Connection] = {}
+        # shutdown 后不再接受反向连接
+        self._closed = False
+        # 关闭前处理剩余事件和消息期间, 不再分发新的推送
+        self._draining = False
+        self._drain_ignored = 0
+        self._setup_metrics()
+        self.dispatcher = EventDispatcher(
+            self.adapter_config.secluded_dispatch_workers,
+            self.adapter_config.secluded_dispatch_queue_size,
+            self._m_dispatch_wait.observe,
+            None if self.worker_client is None else self.worker_client.done
+        )
+        self.workers: Optional[WorkerPool] = None
+        if self.worker_client is None and self.adapter_config.secluded_worker_processes > 0:
+            # 每个子进程可以有与本进程的分发池相同数量(队列加积压)的事件没处理完
+            self.workers = WorkerPool(
+                self.adapter_config.secluded_worker_processes,
+                self.dispatcher.workers * self.dispatcher.queue_size * 2,
+                self.codec,
+                self._handle_worker_call,
+                lambda: list(self.bots)
+            )
+        # 读取时检查的事件队列, 多进程模式下是子进程的在途事件
+        self.events: Union[EventDispatcher, WorkerPool] = self.dispatcher if self.workers is None else self.workers
+        self.scheduler = OutboundScheduler(
+            self._request,
+            self.adapter_config.secluded_send_rate_group,
+            self.adapter_config.secluded_send_burst_group,
+            self.adapter_config.secluded_send_rate_global,
+            self.adapter_config.secluded_send_burst_global
+        )
+        self.spool: Optional[OutboundSpool] = None
+        self._spool_tasks: set[asyncio.Future] = set()
+        if not self.adapter_config.secluded_spool_path is None and self.worker_client is None:
+            self.spool = OutboundSpool(
+                self.adapter_config.secluded_spool_path,
+                self.adapter_config.secluded_spool_max_items,
+                self.adapter_config.secluded_spool_ttl
+            )
+        # 在解析事件之前丢弃不需要处理的推送
+        ingress_rules = (
+            self.adapter_config.secluded_ingress_allow_groups,
+            self.adapter_config.secluded_ingress_deny_groups,
+            self.adapter_config.secluded_ingress_deny_users,
+            self.adapter_config.secluded_ingress_deny_events
+        )
+        self.ingress: Optional[IngressFilter] = None
+        if any(ingress_rules):
+            self.ingress = IngressFilter(*ingress_rules)
+        # (Account, GroupId, MsgId) 去重, 重连后服务端可能重复推送同一条消息
+        self.dedup: Optional[TTLCache[tuple[str, str, str], None]] = None
+        if self.adapter_config.secluded_dedup_size > 0:
+            self.dedup = TTLCache(
+                self.adapter_config.secluded_dedup_size,
+                self.adapter_config.secluded_dedup_ttl
+            )
+        self.metadata: Optional[MetadataCache] = None
+        if self.adapter_config.secluded_metadata_size > 0:
+            self.metadata = MetadataCache(
+                self.adapter_config.secluded_metadata_size,
+                self.adapter_config.secluded_metadata_ttl
+            )
+        # 子进程不保存历史, 查询时交给主进程
+        self.history: Optional[MessageHistory] = None
+        if self.adapter_config.secluded_history_size > 0 and self.worker_client is None:
+            self.history = MessageHistory(
+                self.codec,
+                self.adapter_config.secluded_history_size,
+                self.adapter_config.secluded_history_max_bytes,
+                self.adapter_config.secluded_history_groups
+            )
+        self.media = MediaUploader(
+            self._upload_request,
+            self.adapter_config.secluded_media_chunk_size,
+            self.adapter_config.secluded_media_cache_size,
+            self.adapter_config.secluded_media_cache_ttl
+        )
+        self.transfer = FileTransfer(
+            self._transfer_request,
+            self.adapter_config.secluded_transfer_chunk_size,
+            self.adapter_config.secluded_transfer_concurrency,
+            self.adapter_config.secluded_transfer_retries,
+            self.adapter_config.secluded_reconnect_interval
+        )
+        self.capture: Optional[FrameCapture] = None
+        if not self.adapter_config.secluded_capture_path is None and self.worker_client is None:
+            self.capture = FrameCapture(
+                self.adapter_config.secluded_capture_path,
+                self.adapter_config.secluded_capture_max_bytes,
+                self.adapter_config.secluded_capture_backups
+            )
+            self.metrics.func_counter(
+                'secluded_capture_dropped_total', '抓包队列已满时没有写入的包数',
+                lambda: {(): self.capture.dropped if not self.capture is None else 0}
+            )
         self.setup()
 
+    def _setup_metrics(self):
+        self.metrics = MetricsRegistry()
+        self._m_frames = self.metrics.counter(
+            'secluded_frames_received_total', '收到的包数', ('cmd',)
+        )
+        self._m_events = self.metrics.counter(
+            'secluded_events_total', '解析出的事件数', ('type',)
+        )
+        self._m_parse_errors = self.metrics.counter(
+            'secluded_parse_errors_total', '解析失败的包数', ('stage',)
+        )
+        self._m_dropped = self.metrics.counter(
+            'secluded_events_dropped_total', '事件队列已满时丢弃的事件数'
+        )
+        self._m_ingress = self.metrics.counter(
+            'secluded_ingress_dropped_total', '被过滤规则丢弃的推送数', ('rule',)
+        )
+        self._m_duplicates = self.metrics.counter(
+            'secluded_duplicate_events_total', '因 MsgId 重复而丢弃的推送数'
+        )
+        self._m_drain_events = self.metrics.counter(
+            'secluded_shutdown_events_total', '关闭时等待处理的事件: processed 处理完, running 到期时仍在处理, dropped 到期时还没开始处理而丢弃', ('result',)
+        )
+        self._m_drain_sends = self.metrics.counter(
+            'secluded_shutdown_sends_total', '关闭时等待发出的消息: sent 发出, spooled 写入离线队列, dropped 丢弃或没收到应答', ('result',)
+        )
+        self._m_watchdog = self.metrics.counter(
+            'secluded_watchdog_timeouts_total', '因心跳或 ping 超时断开重连的次数', ('reason',)
+        )
+        self._m_parse = self.metrics.histogram(
+            'secluded_parse_seconds', 'payload_to_event 耗时'
+        )
+        self._m_dispatch_wait = self.metrics.histogram(
+            'secluded_dispatch_wait_seconds', '事件从入队到开始处理的等待时间'
+        )
+        self._m_send = self.metrics.histogram(
+            'secluded_send_seconds', '发包到收到应答包的耗时', ('result',)
+        )
+        self.metrics.gauge(
+            'secluded_dispatch_queue_depth', '等待处理的事件数',
+            lambda: {(): self.events.qsize}
+        )
+        self.metrics.gauge(
+            'secluded_worker_up', '子进程是否在线',
+            lambda: {} if self.workers is None else {(str(i),): int(up) for i, up in enumerate(self.workers.up)}, ('worker',)
+        )
+        self.metrics.gauge(
+            'secluded_send_queue_depth', '等待发送的消息数',
+            lambda: {(): self.scheduler.qsize}
+        )
+        self.metrics.gauge(
+            'secluded_metadata_entries', '缓存的群, 群成员和好友信息数',
+            lambda: {} if self.metadata is None else {
+                ('group',): self.metadata.groups.live(),
+                ('member',): self.metadata.members.live(),
+                ('friend',): self.metadata.friends.live()
+            }, ('table',)
+        )
+        self.metrics.gauge(
+            'secluded_history_messages', '消息历史中保存的群消息数',
+            lambda: {(): 0 if self.history is None else self.history.messages}
+        )
+        self.metrics.gauge(
+            'secluded_history_bytes', '消息历史占用的大致字节数',
+            lambda: {(): 0 if self.history is None else self.history.bytes}
+        )
+        self.metrics.func_counter(
+            'secluded_media_cache_hits_total', '命中上传缓存的图片数',
+            lambda: {(): self.media.hits}
+        )
+        self.metrics.func_counter(
+            'secluded_media_uploads_total', '实际上传的图片数',
+            lambda: {(): self.media.uploads}
+        )
+        self.metrics.func_counter(
+            'secluded_media_uploaded_bytes_total', '上传的字节数',
+            lambda: {(): self.media.uploaded_bytes}
+        )
+        self.metrics.gauge(
+            'secluded_transfers_active', '正在进行的群文件传输数',
+            lambda: {(): self.transfer.active}
+        )
+        self.metrics.func_counter(
+            'secluded_transfer_bytes_total', '群文件传输的字节数',
+            lambda: {('upload',): self.transfer.uploaded_bytes, ('download',): self.transfer.downloaded_bytes}, ('direction',)
+        )
+        self.metrics.func_counter(
+            'secluded_transfer_retries_total', '群文件分片重试次数',
+            lambda: {(): self.transfer.retried}
+        )
+        self.metrics.gauge(
+            'secluded_connection_up', '连接是否在线',
+            lambda: {(i.config.host,): int(i.state == 'connected') for i in self.connections}, ('host',)
+        )
+        self.metrics.gauge(
+            'secluded_connection_uptime_seconds', '本次上线以来的秒数',
+            lambda: {(i.config.host,): i.uptime for i in self.connections}, ('host',)
+        )
+        self.metrics.func_counter(
+            'secluded_connection_downtime_seconds_total', '累计断开的秒数',
+            lambda: {(i.config.host,): i.downtime for i in self.connections}, ('host',)
+        )
+        self.metrics.gauge(
+            'secluded_heartbeat_interval_seconds', '测得的心跳间隔',
+            lambda: {(i.config.host,): i.heartbeat_interval for i in self.connections if not i.heartbeat_interval is None}, ('host',)
+        )
+        self.metrics.gauge(
+            'secluded_ping_rtt_seconds', '最近一次 WebSocket ping 的往返时间',
+            lambda: {(i.config.host,): i.ping_rtt for i in self.connections if not i.ping_rtt is None}, ('host',)
+        )
+        self.metrics.func_counter(
+            'secluded_connection_reconnects_total', '重连次数',
+            lambda: {(i.config.host,): i.reconnects for i in self.connections}, ('host',)
+        )
+
     def setup(self):
-        # if not isinstance(self.driver, nonebot.drivers.websockets):
-        #     # 判断用户配置的Driver类型是否符合适配器要求，不符合时应抛出异常
-        #     raise RuntimeError(
-        #         f"Current driver {self.config.driver} doesn't support websocket client connections!"
-        #         f"{self.get_name()} Adapter need a WebSocket Client Driver to work."
-        #     )
+        if not self.worker_client is None:
+            if self.driver.type != 'none':
+                raise RuntimeError(
+                    f"Worker process is running with driver {self.config.driver}!"
+                    f"Do not pass driver to nonebot.init() when secluded_worker_processes is set, worker processes use ~none."
+                )
+            self.driver.on_startup(self.startup)
+            self.driver.on_shutdown(self.shutdown)
+            self._filter_worker_hooks()
+            return
+        if self.connections and not isinstance(self.driver, WebSocketClientMixin):
+            raise RuntimeError(
+                f"Current driver {self.config.driver} doesn't support websocket client connections!"
+                f"{self.get_name()} Adapter need a WebSocket Client Driver (e.g. ~aiohttp, ~websockets) to work."
+            )
+        if not self.adapter_config.secluded_reverse_path is None:
+            if not isinstance(self.driver, ReverseDriver):
+                raise RuntimeError(
+                    f"Current driver {self.config.driver} doesn't support websocket server connections!"
+                    f"{self.get_name()} Adapter need a ReverseDriver (e.g. ~fastapi) to use secluded_reverse_path."
+                )
+            if not self.adapter_config.secluded_reverse_access_token:
+                # 反向连接会收到带 secluded_token 的上线包, 并且可以推送事件, 不能对任何人开放
+                raise RuntimeError(
+                    "secluded_reverse_access_token is required when secluded_reverse_path is set!"
+                )
+            self.setup_websocket_server(
+                WebSocketServerSetup(
+                    URL(self.adapter_config.secluded_reverse_path),
+                    f'{self.get_name()} WebSocket',
+                    self._handle_reverse_ws
+                )
+            )
+        if self.adapter_config.secluded_metrics_path and isinstance(self.driver, ReverseDriver):
+            self.setup_http_server(
+                HTTPServerSetup(
+                    URL(self.adapter_config.secluded_metrics_path),
+                    'GET',
+                    f'{self.get_name()} Metrics',
+                    self._handle_metrics
+                )
+            )
         # 在 NoneBot 启动和关闭时进行相关操作
         self.driver.on_startup(self.startup)
         self.driver.on_shutdown(self.shutdown)
 
+    def _filter_worker_hooks(self):
+        """子进程中只注册 NoneBot 自身和 secluded_worker_hook_plugins 中的插件的钩子, 其余钩子只在主进程中运行"""
+        allowed = ('nonebot.', *(f'{i}.' for i in self.adapter_config.secluded_worker_hook_plugins))
+        for name in ('on_startup', 'on_shutdown', 'on_bot_connect', 'on_bot_disconnect'):
+            setattr(self.driver, name, worker.hook_filter(getattr(self.driver, name), allowed))
+
     async def startup(self):
-        self.task = asyncio.create_task(self._forward_ws())
+        if not self.worker_client is None:
+            self.dispatcher.start()
+            await self.worker_client.start(self._handle_worker_event, self._handle_worker_bot, self._handle_worker_close)
+            return
+        if not self.connections:
+            log(
+                'WARNING',
+                '没有配置任何连接, 请设置 secluded_host 或 secluded_connections'
+            )
+        if not self.spool is None:
+            await self.spool.open()
+        if not self.capture is None:
+            self.capture.start()
+        self.dispatcher.start()
+        self.scheduler.start()
+        if not self.workers is None:
+            await self.workers.start()
+        # 此时还没有反向连接, 这里只有配置的正向连接
+        for conn in self.connections:
+            conn.task = asyncio.create_task(self._forward_ws(conn))
     
     async def shutdown(self):
-        pass
+        await self._drain()
+        self._closed = True
+        if not self.worker_client is None:
+            await self.worker_client.stop()
+            await self.dispatcher.stop()
+            return
+        # 先断开连接, 让超过期限还在等待应答的处理函数立即失败, 否则停止 worker 时会一直等到超时
+        tasks = [conn.task for conn in self.connections if not conn.task is None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for conn in self.connections:
+            conn.close()
+        if not self.workers is None:
+            await self.workers.stop()
+        await self.dispatcher.stop()
+        await self.scheduler.stop()
+        if not self.spool is None:
+            for task in self._spool_tasks:
+                task.cancel()
+            await asyncio.gather(*self._spool_tasks, return_exceptions=True)
+            await self.spool.close()
+        if not self.capture is None:
+            await self.capture.stop()
+
+    async def _drain(self):
+        """在 secluded_shutdown_timeout 内处理完剩余的事件并发出排队的消息
+
+        期间继续读取连接以收到应答包, 但不再分发新的推送; 到期时还没发出的消息写入离线队列, 没有启用离线队列时丢弃
+        """
+        self._draining = True
+        events = self.dispatcher if self.workers is None else self.workers
+        scheduler = self.scheduler if self.worker_client is None else None
+        pending_events = events.pending
+        pending_sends = 0 if scheduler is None else scheduler.qsize + scheduler.sending
+        # sent 在发出时就已计数, 减去还没收到应答的才是已经结束的
+        finished = 0 if scheduler is None else scheduler.sent - scheduler.sending
+        if not pending_events and not pending_sends:
+            return
+        log(
+            'INFO',
+            f'正在关闭, 等待 {pending_events} 个事件处理完, {pending_sends} 条消息发出, 最多等待 {self.adapter_config.secluded_shutdown_timeout} 秒'
+        )
+
+        async def drain():
+            await (self.dispatcher.join() if self.workers is None else self.workers.drain())
+            # 处理函数都结束后不会再有新消息
+            if not scheduler is None:
+                await scheduler.join()
+
+        try:
+            await asyncio.wait_for(drain(), self.adapter_config.secluded_shutdown_timeout)
+        except asyncio.TimeoutError:
+            pass
+        # 到期后不再开始处理新的事件, 正在处理的事件在断开连接后结束
+        dropped_events = events.qsize
+        running_events = events.pending - dropped_events
+        processed_events = max(0, pending_events - events.pending)
+        if self.workers is None:
+            self.dispatcher.discard()
+        spooled = dropped_sends = 0
+        if not scheduler is None:
+            for frame, future in scheduler.take_queued():
+                if await self._spool_frame(frame):
+                    spooled += 1
+                    future.set_result(None)
+                else:
+                    dropped_sends += 1
+                    future.set_exception(NetworkError('适配器已关闭'))
+            # 已经发出但没收到应答的消息在断开连接时失败, 不一定没有送达
+            dropped_sends += scheduler.sending
+        sent = 0 if scheduler is None else scheduler.sent - scheduler.sending - finished
+        self._m_drain_events.inc('processed', amount=processed_events)
+        self._m_drain_events.inc('running', amount=running_events)
+        self._m_drain_events.inc('dropped', amount=dropped_events)
+        self._m_drain_sends.inc('sent', amount=sent)
+        self._m_drain_sends.inc('spooled', amount=spooled)
+        self._m_drain_sends.inc('dropped', amount=dropped_sends)
+        summary = f'处理完 {processed_events} 个事件'
+        if not scheduler is None:
+            summary += f', 发出 {sent} 条消息'
+        if running_events:
+            summary += f', {running_events} 个事件在断开连接时仍在处理'
+        if spooled:
+            summary += f', {spooled} 条消息写入离线队列'
+        if self._drain_ignored:
+            summary += f', 忽略关闭期间收到的 {self._drain_ignored} 个推送'
+        if dropped_events or dropped_sends:
+            summary += f'; 丢弃 {dropped_events} 个事件, {dropped_sends} 条消息'
+        log(
+            'WARNING' if dropped_events or dropped_sends else 'INFO',
+            f'关闭前{summary}'
+        )
+
+    async def _spool_frame(self, frame: Union[Message.OriginMessage.Send, EncodedFrame]) -> bool:
+        """把没发出的包写入离线队列, 下次上线后重发"""
+        if self.spool is None:
+            return False
+        account_id = frame.account_id if isinstance(frame, EncodedFrame) else frame['data'][0]['Account'] # type: ignore
+        await self.spool.push(self._spool_key(account_id), self._encode_frame(frame, 0, False)) # type: ignore
+        return True
 
-    async def _forward_ws(self):
+    def _spool_key(self, account_id: str) -> str:
+        """离线队列按连接保存; 还不知道账号在哪条连接上时按账号保存, 账号上线后重发"""
+        conn = self._routes.get(account_id)
+        return f'account:{account_id}' if conn is None else conn.config.host
+
+    async def _forward_ws(self, conn: Connection):
         log(
             'INFO',
-            '开始建立连接'
+            f'开始建立连接: {conn.config.host}'
+        )
+        # 不设置读取超时, 空闲的连接由心跳和 ping 检测
+        request = Request(
+            'GET',
+            URL(conn.config.host),
+            timeout=Timeout(
+                connect=self.adapter_config.secluded_api_timeout,
+                read=None,
+                close=self.adapter_config.secluded_ping_timeout
+            )
         )
+        attempt = 0
+        # 连接没有抛出异常就结束时也按这个间隔重连
+        delay = self._backoff_delay(attempt)
         while True:
+            conn.state = 'connecting'
+            online = False
             try:
-                self.ws = await websockets.asyncio.client.connect(self.adapter_config.secluded_host)
+                async with self.websocket(request) as ws:
+                    conn.ws = ws
+                    try:
+                        log(
+                            'INFO',
+                            '连接成功! 开始发送上线包'
+                        )
+                        await self._sync_oicq(conn)
+                        attempt = 0
+                        delay = self._backoff_delay(attempt)
+                        online = True
+                        await self._run_connection(conn)
+                    finally:
+                        self._close_connection(conn)
+                        # 正常关闭, 否则退出时会以 1011 关闭连接
+                        await ws.close()
+            except Exception as e:
+                delay = self._backoff_delay(attempt)
+                attempt += 1
                 log(
-                    'INFO',
-                    '连接成功! 开始发送上线包'
-                )
-                send: Message.OriginMessage.Send = {
-                    'seq': self.seq,
-                    'cmd': 'SyncOicq',
-                    'rsp': True,
-                    'data': {
-                        'pid': str(self.adapter_config.secluded_plugin_id),
-                        'name': str(self.adapter_config.secluded_plugin_name),
-                        'token': str(self.adapter_config.secluded_token)
-                    }
-                }
-                await self.ws.send(
-                    json.dumps(send)
+                    'ERROR',
+                    f'{"连接中断" if online else "连接失败"}, {delay:.1f}秒后重试',
+                    e
                 )
-                self.seq += 1
-                recv: Message.OriginMessage.Recv = json.loads(await self.ws.recv(True))
-                if recv['data']['status'] == True: # type: ignore
-                    log(
-                        'INFO',
-                        '上线成功!'
-                    )
-                else:
-                    raise self.TokenIncorrentError(f'Token错误! 错误Token: {self.adapter_config.secluded_token}')
+            await asyncio.sleep(delay)
+
+    async def _handle_reverse_ws(self, ws: WebSocket):
+        """Secluded 连接到适配器的反向连接
+
+        同一个 id 的连接共用一个 Connection, 断线期间的调用会等待它重新连上
+        """
+        if not self._check_access_token(ws.request):
+            log(
+                'WARNING',
+                f'反向连接 access_token 错误: {ws.request.url}'
+            )
+            await ws.close(1008, 'access_token 错误')
+            return
+        await ws.accept()
+        if self._closed:
+            await ws.close(1001, '适配器已关闭')
+            return
+        host = f'reverse:{ws.request.url.query.get("id", "default")}'
+        conn = next((i for i in self.connections if i.config.host == host), None)
+        if conn is None:
+            conn = Connection(ConnectionConfig(
+                host=host,
+                token=self.adapter_config.secluded_token,
+                plugin_id=self.adapter_config.secluded_plugin_id,
+                plugin_name=self.adapter_config.secluded_plugin_name
+            ))
+            self.connections.append(conn)
+        elif not conn.ws is None and not conn.task is None:
+            # 同一个 id 重新连上时旧连接可能还没发现断开, 先关闭旧连接
+            log(
+                'WARNING',
+                f'反向连接 {host} 重复连接, 关闭旧连接'
+            )
+            old = conn.task
+            await conn.ws.close(1000, '重复连接')
+            await asyncio.wait((old,))
+        conn.ws = ws
+        conn.task = asyncio.current_task()
+        conn.state = 'connecting'
+        log(
+            'INFO',
+            f'反向连接成功: {host}, 开始发送上线包'
+        )
+        try:
+            await self._sync_oicq(conn)
+            await self._run_connection(conn)
+        except WebSocketClosed as e:
+            log(
+                'WARNING',
+                f'反向连接断开: {host}, code={e.code}'
+            )
+        except Exception as e:
+            log(
+                'ERROR',
+                f'反向连接中断: {host}',
+                e
+            )
+        finally:
+            self._close_connection(conn)
+            if not ws.closed:
+                await ws.close()
+
+    def _check_access_token(self, request: Request) -> bool:
+        token = self.adapter_config.secluded_reverse_access_token
+        if not token:
+            return False
+        authorization = request.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            given = authorization[7:]
+        else:
+            given = request.url.query.get('access_token') or ''
+        return hmac.compare_digest(given.encode(), token.encode())
+
+    async def _run_connection(self, conn: Connection):
+        """上线后重发离线消息, 然后一直读取到连接断开"""
+        # 重发期间的发送等待重发结束, 不再写入离线队列, 否则会留在队列中直到下次上线
+        conn.state = 'replaying'
+        await self._replay_spool(conn)
+        down = conn.set_connected()
+        if down is None:
+            log(
+                'INFO',
+                '上线成功!'
+            )
+        else:
+            log(
+                'INFO',
+                f'重连成功! 第 {conn.reconnects} 次重连, 本次断开 {down:.1f} 秒'
+            )
 
+        log(
+            'INFO',
+            '等待获取账号ID'
+        )
+        reader = asyncio.ensure_future(self._read_frames(conn))
+        watchdog = asyncio.ensure_future(self._watchdog(conn))
+        try:
+            done, _ = await asyncio.wait((reader, watchdog), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            reader.cancel()
+            watchdog.cancel()
+            await asyncio.gather(reader, watchdog, return_exceptions=True)
+        for task in done:
+            task.result()
+
+    async def _read_frames(self, conn: Connection):
+        while True:
+            if self.events.full and not conn.pending:
+                conn.paused = True
                 try:
-                    log(
-                        'INFO',
-                        '等待获取账号ID'
-                    )
-                    while True:
-                        recv = json.loads(await self.ws.recv(True))
-                        if recv['cmd'] == 'PushOicqMsg' and 'Account' in recv['data'][0].keys():
-                            self.account_id = recv['data'][0]['Account']
-                            log(
-                                'INFO',
-                                f'获取账号ID成功: {self.account_id}'
-                            )
-                            break
-                    self._handle_connect()
-                    if 'Uin' in recv['data'][0].keys():
-                        await self._forward(recv)
-                    
-                    while True:
-                        recv = json.loads(await self.ws.recv(True))
-                        if 'Uin' in recv['data'][0].keys():
-                            await self._forward(recv)
-                except json.JSONDecodeError as e:
-                    log(
-                        'WARNING',
-                        'JSON解析失败!',
-                        e
-                    )
-            except websockets.exceptions.ConnectionClosedError as e:
-                if self.ws is None:
-                    log(
-                        'ERROR',
-                        '连接失败, 5秒后重试',
-                        e
-                    )
-                else:
-                    log(
-                        'ERROR',
-                        '连接中断, 5秒后重试',
-                        e
-                    )
-                await asyncio.sleep(5)
+                    await self._wait_dispatch_room(conn)
+                finally:
+                    conn.paused = False
+                    conn.resumed_at = time.monotonic()
+                # 暂停读取期间读不到心跳, 从恢复读取开始重新计算
+                if not conn.last_heartbeat is None:
+                    conn.last_heartbeat = conn.resumed_at
+            await self._handle_frame(conn, await self._recv_frame(conn))
+
+    async def _watchdog(self, conn: Connection):
+        """心跳或 ping 超时时抛出异常, 让连接断开重连
+
+        半开的 TCP 连接读取时不会报错, 只能靠这里发现
+        """
+        missed = self.adapter_config.secluded_heartbeat_missed
+        interval = self.adapter_config.secluded_ping_interval
+        ping = interval > 0
+        next_ping = time.monotonic() + interval
+        while True:
+            await asyncio.sleep(1)
+            if conn.paused:
+                # 暂停读取期间收不到心跳和 pong, 从恢复读取开始重新计算
+                next_ping = time.monotonic() + interval
+                continue
+            if missed > 0 and conn.heartbeat_overdue(missed):
+                self._m_watchdog.inc('heartbeat')
+                raise NetworkError(f'超过 {missed} 个心跳间隔没有收到心跳, 上次心跳在 {time.monotonic() - conn.last_heartbeat:.1f} 秒前') # type: ignore
+            if ping and time.monotonic() >= next_ping:
+                start = time.monotonic()
+                try:
+                    ping = not await conn.ping(self.adapter_config.secluded_ping_timeout) is None
+                except asyncio.TimeoutError as e:
+                    if conn.paused or conn.resumed_at > start:
+                        # 等待 pong 期间暂停过读取
+                        next_ping = time.monotonic() + interval
+                        continue
+                    self._m_watchdog.inc('ping')
+                    raise NetworkError('等待 pong 超时') from e
+                next_ping = time.monotonic() + interval
+
+    def _close_connection(self, conn: Connection):
+        conn.set_disconnected()
+        conn.fail_pending(NetworkError('连接中断'))
+        self._handle_disconnect(conn)
+        conn.ws = None
+
+    async def _wait_dispatch_room(self, conn: Connection):
+        """事件队列已满时暂停读取
+
+        有调用在等待这条连接的应答包时必须继续读取, 否则处理函数与读取会互相等待
+        """
+        while self.events.full and not conn.pending:
+            conn.request_sent.clear()
+            room = asyncio.ensure_future(self.events.wait_room())
+            sent = asyncio.ensure_future(conn.request_sent.wait())
+            try:
+                await asyncio.wait((room, sent), return_when=asyncio.FIRST_COMPLETED)
             finally:
-                if not self.ws is None:
-                    await self.ws.close()
-                self._handle_disconnect()
-                self.ws = None
+                room.cancel()
+                sent.cancel()
+
+    async def _recv_frame(self, conn: Connection) -> str | bytes:
+        assert not conn.ws is None
+        if not WebsocketsWebSocket is None and isinstance(conn.ws, WebsocketsWebSocket):
+            try:
+                raw = await conn.ws.websocket.recv(decode=False)
+            except ConnectionClosed as e:
+                raise WebSocketClosed(
+                    1006 if e.rcvd is None else e.rcvd.code,
+                    '' if e.rcvd is None else e.rcvd.reason
+                ) from e
+        else:
+            # 其他驱动只能按帧的类型收到 str 或 bytes
+            raw = await conn.ws.receive()
+        if not self.capture is None:
+            self.capture('recv', conn.config.host, raw.encode() if isinstance(raw, str) else raw)
+        return raw
+
+    async def _send_frame(self, conn: Connection, raw: bytes, captured: Optional[bytes] = None):
+        """captured 为写入抓包文件的内容, 默认与 raw 相同"""
+        assert not conn.ws is None
+        if not self.capture is None:
+            self.capture('send', conn.config.host, raw if captured is None else captured)
+        if not WebsocketsWebSocket is None and isinstance(conn.ws, WebsocketsWebSocket):
+            # 编码得到的 bytes 直接作为文本帧发出
+            await conn.ws.websocket.send(raw, text=True)
+        else:
+            # 与服务端之间使用文本帧, NoneBot 的 WebSocket 只能用 str 发送文本帧
+            await conn.ws.send_text(raw.decode())
 
-    async def _forward(self, recv: Message.OriginMessage.Recv):
+    async def _sync_oicq(self, conn: Connection):
+        """发送上线包并等待结果"""
+        assert not conn.ws is None
+        send: Message.OriginMessage.Send = {
+            'seq': conn.next_seq(),
+            'cmd': 'SyncOicq',
+            'rsp': True,
+            'data': {
+                'pid': str(conn.config.plugin_id),
+                'name': str(conn.config.plugin_name),
+                'token': str(conn.config.token)
+            }
+        }
+        # 抓包文件会被分享出去回放和排查问题, 不能带有 token
+        redacted = None if self.capture is None else self.codec.dumps({**send, 'data': {**send['data'], 'token': '***'}}) # type: ignore
+        await self._send_frame(conn, self.codec.dumps(send), redacted)
+        recv: Message.OriginMessage.Recv = self.codec.loads(await self._recv_frame(conn))
+        if recv['data']['status'] != True: # type: ignore
+            raise self.TokenIncorrentError(f'Token错误! 错误Token: {conn.config.token}')
+
+    async def _replay_spool(self, conn: Connection, key: Optional[str] = None):
+        """按顺序重发断线期间保存的包, 不等待应答包"""
+        if self.spool is None or conn.ws is None:
+            return
+        if key is None:
+            key = conn.config.host
+        frames = await self.spool.pop_all(key)
+        if not frames:
+            return
         log(
             'INFO',
-            str(recv)
+            f'开始重发 {len(frames)} 条离线消息'
+        )
+        for i, item in enumerate(frames):
+            data: Message.OriginMessage.Send = self.codec.loads(item.frame)
+            data['seq'] = conn.next_seq()
+            self.frame_log('send', data)
+            try:
+                await self._send_frame(conn, self.codec.dumps(data))
+            except Exception:
+                # 没发出去的放回队列, 等下次上线, 保留原来的写入时间
+                await self.spool.restore(key, frames[i:])
+                raise
+
+    async def _replay_account_spool(self, conn: Connection, account_id: str):
+        """重发账号上线前按账号保存的包"""
+        try:
+            await self._replay_spool(conn, f'account:{account_id}')
+        except Exception as e:
+            log(
+                'WARNING',
+                f'重发账号 {account_id} 的离线消息失败',
+                e
+            )
+        finally:
+            self._spool_tasks.discard(asyncio.current_task()) # type: ignore
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """指数退避, 加上随机抖动避免多个连接同时重连"""
+        delay = min(
+            self.adapter_config.secluded_reconnect_max_interval,
+            self.adapter_config.secluded_reconnect_interval * 2 ** attempt
         )
-        event = self.payload_to_event(recv)
-        asyncio.create_task(self.bot.handle_event(event))
+        return delay * random.uniform(0.5, 1)
+
+    async def _handle_frame(self, conn: Connection, raw: str | bytes):
+        """处理一个收到的包, 单个包的异常不会导致断开连接"""
+        try:
+            recv: Message.OriginMessage.Recv = self.codec.loads(raw)
+        except self.codec.decode_error as e:
+            self._m_parse_errors.inc('json')
+            log(
+                'WARNING',
+                'JSON解析失败!',
+                e
+            )
+            return
+        self.frame_log('recv', recv)
+        self._m_frames.inc(str(recv.get('cmd')))
+        try:
+            if recv['cmd'] == 'Response':
+                conn.handle_response(recv)
+            elif recv['cmd'] == 'PushOicqMsg' and recv['data']:
+                liveness = is_liveness(recv['data'])
+                if liveness:
+                    conn.heartbeat()
+                if not 'Account' in recv['data'][0]:
+                    return
+                account_id = recv['data'][0]['Account']
+                if not account_id in conn.accounts:
+                    self._handle_connect(conn, account_id)
+                if liveness and not self.adapter_config.secluded_forward_heartbeat:
+                    return
+                if self._draining:
+                    self._drain_ignored += 1
+                    return
+                if not self.ingress is None:
+                    rule = self.ingress.match(recv['data'])
+                    if not rule is None:
+                        self._m_ingress.inc(rule)
+                        return
+                if not self.metadata is None:
+                    self.metadata.observe(recv['data'][0])
+                if 'Uin' in recv['data'][0]:
+                    if self._is_duplicate(recv['data'][0]):
+                        self._m_duplicates.inc()
+                        return
+                    self._forward(recv, raw)
+        except Exception as e:
+            log(
+                'WARNING',
+                '处理消息失败!',
+                e
+            )
+
+    def _is_duplicate(self, first_data: Any) -> bool:
+        msg_id = first_data.get('MsgId')
+        if self.dedup is None or not msg_id:
+            return False
+        return not self.dedup.add((first_data['Account'], first_data.get('GroupId', ''), msg_id), None)
+
+    def _forward(self, recv: Message.OriginMessage.Recv, raw: str | bytes) -> bool:
+        """解析并放入事件队列, 返回是否放入
+
+        多进程模式下不解析, 只按包头选择子进程, 把原始包交给子进程解析
+        """
+        first_data = recv['data'][0]
+        if self.workers is None:
+            start = time.perf_counter()
+            try:
+                event = self.payload_to_event(recv)
+            except Exception:
+                self._m_parse_errors.inc('event')
+                raise
+            self._m_parse.observe(time.perf_counter() - start)
+            event_type = event.get_type()
+        else:
+            event_type, _ = classify(recv['data'])
+        self._m_events.inc(event_type)
+        if not self.history is None and event_type == 'message' and 'Group' in first_data:
+            self.history.add(recv['data']) # type: ignore
+        if self.workers is None:
+            queued = self.dispatcher.put(self.bots[first_data['Account']], event) # type: ignore
+        else:
+            queued = self.workers.put(session_id(event_type, first_data), raw.encode() if isinstance(raw, str) else raw) # type: ignore
+        if not queued:
+            self._m_dropped.inc()
+        return queued
+
+    def _handle_worker_event(self, raw: bytes):
+        """子进程收到主进程转发的推送包"""
+        assert not self.worker_client is None
+        queued = False
+        try:
+            recv: Message.OriginMessage.Recv = self.codec.loads(raw)
+            first_data = recv['data'][0]
+            self._handle_worker_bot(first_data['Account'], True)
+            if not self.metadata is None:
+                self.metadata.observe(first_data)
+            queued = self._forward(recv, raw)
+        except Exception as e:
+            log(
+                'WARNING',
+                '处理消息失败!',
+                e
+            )
+        finally:
+            # 没有放入队列的事件也要告诉主进程, 否则主进程会一直认为它在处理中
+            if not queued:
+                self.worker_client.done()
+
+    def _handle_worker_bot(self, account_id: str, connected: bool):
+        if connected and not account_id in self.bots:
+            self.bot_connect(Bot(self, self_id=account_id))
+        elif not connected and account_id in self.bots:
+            self.bot_disconnect(self.bots[account_id])
+
+    def _handle_worker_close(self):
+        """与主进程的连接断开后子进程退出"""
+        if not self._closed:
+            self.driver.exit() # type: ignore
+
+    async def _handle_worker_call(self, kind: int, header: list, body: bytes) -> Any:
+        """主进程执行子进程的发包"""
+        match kind:
+            case worker.CALL:
+                _, account_id, timeout, spool, encoded, group_id, rsp = header
+                data = EncodedFrame(account_id, group_id, rsp, body) if encoded else self.codec.loads(body)
+                return await self._request(data, timeout, account_id, spool)
+            case worker.SEND:
+                _, key, priority, timeout, account_id, group_id = header
+                return await self.scheduler.submit(key, EncodedFrame(account_id, group_id, True, body), priority, timeout)
+            case worker.HISTORY:
+                _, account_id, group_id, msg_id, count = header
+                return self._query_history(account_id, group_id, msg_id, count)
+        raise NetworkError(f'未知的调用类型: {kind}')
 
     @classmethod
     def payload_to_event(cls, payload: Message.OriginMessage.Recv) -> Event:
@@ -160,105 +926,17 @@ class Adapter(BaseAdapter):
 
         # 做一层异常处理，以应对平台事件数据的变更
         try:
-            keys = []
-            for i in payload['data']:
-                for x in i.keys():
-                    keys.append(x)
-            event_type: Literal['message', 'request', 'notice', 'meta_event', 'other_event'] | None = None
-
-            for i in keys:
-                i = str(i)
-                if i in (
-                    'AtAll',
-                    'AtUin',
-                    'AtName',
-                    'Gif',
-                    'Img',
-                    'Text',
-                    'Audio',
-                    'Video',
-                    'GroupFileUpload'
-                ):
-                    event_type = 'message'
-                elif i in (
-                    'NewFriendNotify',
-                    'GroupNotify',
-                ):
-                    event_type = 'request'
-                elif i in (
-                    'GroupNewMember',
-                    'GroupMemberSignout',
-                    'GroupMemverNickModify',
-                    'GroupModifyAdmin',
-                    'GroupModifyNickModify',
-                    'GroupProhibitAll',
-                    'GroupProhibitMember',
-                    'GroupBeatABeat',
-                    'GroupEssence',
-                    'GroupDissolut'
-                ):
-                    event_type = 'notice'
-                elif i in (
-                    'Heartbeat',
-                    'Heartbeating',
-                    'Offline',
-                    'Goline',
-                    'GolineWindows',
-                    'OfflineWindows',
-                    'System',
-                    'Online'
-                ):
-                    event_type = 'meta_event'
-            if event_type is None:
-                event_type = 'other_event'
-            
+            event_type, event_key = classify(payload['data'])
             first_data = payload['data'][0]
-            event_group = 'Group' in first_data.keys()
-            event_group_id = first_data['GroupId'] if event_group else None
-            account_id = first_data['Account']            
 
-            messages: list[MessageSegment] = []
-            
             match event_type:
                 case 'message':
-                    for i in payload['data'][1:]:
-                        items = list(i.items())
-                        first_item = items[0]
-                        if first_item[0] == 'Text':
-                            messages.append(MessageSegment('text', {'text': first_item[1]}))
-                        elif first_item[0] == 'AtName':
-                            messages.append(MessageSegment('at', {'user_name': items[0][1], 'user_id': items[1][1], 'text': f'@{items[0][1]}'}))
-                        elif first_item[0] == 'AtAll':
-                            messages.append(MessageSegment('at_all', {}))
-                        elif first_item[0] == 'Img':
-                            messages.append(MessageSegment('img', {'type': 'img', 'url': items[0][1]}))
-                        elif first_item[0] == 'Gif':
-                            messages.append(MessageSegment('img', {'type': 'gif', 'url': items[0][1]}))
-                    return MessageEvent(
-                        message=Message(messages),
-                        account_id=first_data['Account'],
-                        user_id=first_data['Uin'],
-                        user_name=first_data['UinName'],
-                        user_group_name=first_data['OpName'],
-                        group_id=first_data['GroupId'] if 'Group' in first_data.keys() else None,
-                        group_name=first_data['GroupName'] if 'Group' in first_data.keys() else None,
-                        msg_id=first_data['MsgId']
-                    )
+                    return MessageEvent.from_payload(first_data, payload['data'][1:])
                 case 'request':
-                    if 'GroupNotify' in first_data.keys():
+                    if event_key in REQUEST_EVENTS:
                         return RequestEvent(
                             MessageSegment(
-                                'group_new_member_request',
-                                {
-                                    'user_id': first_data['Uin'],
-                                    'user_name': first_data['UinName']
-                                }
-                            )
-                        )
-                    elif 'NewFriendNotify' in first_data.keys():
-                        return RequestEvent(
-                            MessageSegment(
-                                'new_friend_request',
+                                REQUEST_EVENTS[event_key], # type: ignore
                                 {
                                     'user_id': first_data['Uin'],
                                     'user_name': first_data['UinName']
@@ -266,20 +944,10 @@ class Adapter(BaseAdapter):
                             )
                         )
                 case 'notice':
-                    if 'GroupNewMember' in first_data.keys():
-                        return NoticeEvent(
-                            MessageSegment(
-                                'group_new_member',
-                                {
-                                    'user_id': first_data['Uin'],
-                                    'user_name': first_data['UinName']
-                                }
-                            )
-                        )
-                    elif 'GroupMemberSignout' in first_data.keys():
+                    if event_key in NOTICE_EVENTS:
                         return NoticeEvent(
                             MessageSegment(
-                                'group_member_signout',
+                                NOTICE_EVENTS[event_key], # type: ignore
                                 {
                                     'user_id': first_data['Uin'],
                                     'user_name': first_data['UinName']
@@ -287,10 +955,10 @@ class Adapter(BaseAdapter):
                             )
                         )
                 case 'meta_event':
-                    if 'Heartbeat' in first_data.keys():
+                    if event_key in META_EVENTS:
                         return MetaEvent(
                             MessageSegment(
-                                'Heartbeat'
+                                META_EVENTS[event_key] # type: ignore
                             )
                         )
             
@@ -310,68 +978,60 @@ class Adapter(BaseAdapter):
             raise Exception
 
     def message_to_origin(self, event: MessageEvent, message: Message, reply: bool = False) -> Message.OriginMessage.Send:
-        data: list[MessageSegment.OriginSegment.Send] = [
-            MessageSegment.OriginSegment.Send({
-                'Account': self.account_id if not self.account_id is None else '',
-            })
-        ]
+        """转换为发送包的字典, 发送时使用 encode_message 直接编码"""
+        first = MessageSegment.OriginSegment.Send({
+            'Account': event.account_id,
+        })
         if not event.group_id is None:
-            data[0]['Group'] = 'Group'
-            data[0]['GroupId'] = event.group_id if not event.group_id is None else ''
+            first['Group'] = 'Group'
+            first['GroupId'] = event.group_id
         if reply:
-            data[0]['Reply'] = event.get_msg_id()
-        for i in message:
-            match i.type:
-                case 'text':
-                    data.append(
-                        MessageSegment.OriginSegment.Send({
-                            'Text': i.data['text']
-                        })
-                    )
-                case 'img':
-                    data.append(
-                        MessageSegment.OriginSegment.Send({
-                            'Img': i.data['url']
-                        })
-                    )
-                case 'gif':
-                    data.append(
-                        MessageSegment.OriginSegment.Send({
-                            'Gif': i.data['url']
-                        })
-                    )
-                case 'at':
-                    data.append(
-                        MessageSegment.OriginSegment.Send({
-                            'AtName': i.data['user_name'],
-                            'AtUin': i.data['user_id']
-                        })
-                    )
-                case 'at_all':
-                    data.append(
-                        MessageSegment.OriginSegment.Send({
-                            'AtAll': 'AtAll'
-                        })
-                    )
-        
+            first['Reply'] = event.get_msg_id()
+        # seq 在发送时由账号所在的连接分配
         send: Message.OriginMessage.Send = {
             'cmd': 'SendOicqMsg',
             'rsp': True,
-            'seq': self.seq,
-            'data':data
+            'seq': 0,
+            'data': [first, *self.encoder.segments(message)]
         }
         return send
-    
+
+    def encode_message(self, event: MessageEvent, message: Message, reply: bool = False) -> EncodedFrame:
+        return self.encoder.encode(
+            event.account_id,
+            event.group_id,
+            message,
+            event.get_msg_id() if reply else None
+        )
+
     class TokenIncorrentError(Exception):
         def __init__(self, *args: Any, **kwargs: Any):
             super().__init__(*args, **kwargs)
 
-    def _handle_connect(self):
-        self.bot = Bot(self, self_id=self.account_id)  # 实例化 Bot  # type: ignore
-        self.bot_connect(self.bot)  # 建立 Bot 连接
+    def _handle_connect(self, conn: Connection, account_id: str):
+        log(
+            'INFO',
+            f'获取账号ID成功: {account_id}'
+        )
+        conn.accounts.add(account_id)
+        first = not account_id in self._routes
+        self._routes[account_id] = conn
+        if first and not self.spool is None:
+            self._spool_tasks.add(asyncio.ensure_future(self._replay_account_spool(conn, account_id)))
+        if not account_id in self.bots:
+            bot = Bot(self, self_id=account_id)  # 实例化 Bot
+            self.bot_connect(bot)  # 建立 Bot 连接
+            if not self.workers is None:
+                self.workers.broadcast(worker.CONNECT, [account_id])
 
-    def _handle_disconnect(self):
-        self.bot_disconnect(self.bot)  # 断开 Bot 连接
+    def _handle_disconnect(self, conn: Connection):
+        # 保留路由, 断线期间的发送会等待这条连接重新上线
+        for account_id in conn.accounts:
+            if self._routes.get(account_id) is conn and account_id in self.bots:
+                self.bot_disconnect(self.bots[account_id])  # 断开 Bot 连接
+                if not self.workers is None:
+                    self.workers.broadcast(worker.DISCONNECT, [account_id])
+        conn.accounts.clear()
 
     @classmethod
     @override
@@ -379,15 +1039,165 @@ class Adapter(BaseAdapter):
         return 'secluded'
 
     @override
-    async def _call_api(self, data: Message.OriginMessage.Send) -> Any: # type: ignore
-        while True:
-            if not self.ws is None:
-                await self.ws.send(json.dumps(data))
-                break
-            else:
-                await asyncio.sleep(5)
-
-    async def send(self, event: MessageEvent, message: Message, reply: bool = False):
-        origin_message = self.message_to_origin(event, message, reply)
-        print(origin_message)
-        await self._call_api(origin_message)
\ No newline at end of file
+    async def _call_api(self, bot: Bot, api: str, **data: Any) -> Any: # type: ignore
+        """以 `api` 为 cmd 发包, 返回应答包的 data
+
+        data:
+            data: 包内容
+            timeout: 等待应答包的超时时间, 默认为 `secluded_api_timeout`
+        """
+        timeout: Optional[float] = data.pop('timeout', None)
+        send: Message.OriginMessage.Send = {
+            'seq': 0,
+            'cmd': api, # type: ignore
+            'rsp': True,
+            'data': data.get('data', [])
+        }
+        return await self._request(send, timeout, bot.self_id)
+
+    async def _request(
+        self,
+        data: Union[Message.OriginMessage.Send, EncodedFrame],
+        timeout: Optional[float] = None,
+        account_id: Optional[str] = None,
+        spool: bool = True
+    ) -> Any:
+        """从账号所在的连接发包, 默认按包内的 Account 选择连接
+
+        连接断开时等待重新上线; 启用了离线队列且 spool 为 True 时则写入队列并直接返回 None
+        """
+        if account_id is None:
+            account_id = data.account_id if isinstance(data, EncodedFrame) else data['data'][0]['Account'] # type: ignore
+        if not self.worker_client is None:
+            # 子进程没有连接, 交给主进程发送
+            if isinstance(data, EncodedFrame):
+                return await self.worker_client.call(worker.CALL, [account_id, timeout, spool, True, data.group_id, data.rsp], data.body)
+            return await self.worker_client.call(worker.CALL, [account_id, timeout, spool, False, None, None], self.codec.dumps(data))
+        conn = self._routes.get(account_id) # type: ignore
+        if conn is None:
+            if spool and not self.spool is None:
+                # 还没有连接上报过这个账号, 例如重启后第一次上线前, 按账号写入离线队列
+                await self.spool.push(self._spool_key(account_id), self._encode_frame(data, 0, False)) # type: ignore
+                return None
+            raise NetworkError(f'账号 {account_id} 没有连接')
+        if conn.state == 'closed':
+            raise NetworkError('连接已关闭')
+        if timeout is None:
+            timeout = self.adapter_config.secluded_api_timeout
+        if spool and not self.spool is None and conn.state in ('disconnected', 'connecting'):
+            # 断线时写入离线队列, 上线后重发
+            await self.spool.push(conn.config.host, self._encode_frame(data, 0, False))
+            return None
+        if conn.ws is None or conn.state != 'connected':
+            try:
+                await asyncio.wait_for(self._wait_connected(conn), timeout)
+            except asyncio.TimeoutError as e:
+                raise NetworkError(f'等待重新上线超时: {conn.config.host}') from e
+        assert not conn.ws is None
+        seq = conn.next_seq()
+        raw = self._encode_frame(data, seq)
+        if not (data.rsp if isinstance(data, EncodedFrame) else data['rsp']):
+            await self._send_frame(conn, raw)
+            return None
+
+        # 先登记再发包, 防止应答包比登记先到
+        future = conn.expect(seq)
+        start = time.perf_counter()
+        result = 'error'
+        try:
+            await self._send_frame(conn, raw)
+            recv = await asyncio.wait_for(future, timeout)
+            result = 'success'
+        except asyncio.TimeoutError as e:
+            result = 'timeout'
+            raise NetworkError(f'等待应答包超时: seq={seq}') from e
+        finally:
+            conn.forget(seq)
+            self._m_send.observe(time.perf_counter() - start, result)
+        return self._parse_response(recv)
+
+    def _encode_frame(self, data: Union[Message.OriginMessage.Send, EncodedFrame], seq: int, record: bool = True) -> bytes:
+        if isinstance(data, EncodedFrame):
+            raw = data.encode(seq)
+            # 只有需要记录时才解码
+            if record and self.frame_log.enabled:
+                self.frame_log('send', self.codec.loads(raw))
+            return raw
+        data['seq'] = seq
+        if record:
+            self.frame_log('send', data)
+        return self.codec.dumps(data)
+
+    async def query_history(
+        self,
+        account_id: str,
+        group_id: str,
+        msg_id: Optional[str] = None,
+        count: int = 1
+    ) -> Optional[list[CachedMessage]]:
+        """在消息历史中查询 msg_id 对应的消息, msg_id 为 None 时查询最近 count 条, 没有启用消息历史时返回 None"""
+        if self.worker_client is None:
+            data = self._query_history(account_id, group_id, msg_id, count)
+        else:
+            data = await self.worker_client.call(worker.HISTORY, [account_id, group_id, msg_id, count], b'')
+        if data is None:
+            return None
+        return [CachedMessage.from_data(group_id, i) for i in data]
+
+    def _query_history(self, account_id: str, group_id: str, msg_id: Optional[str], count: int) -> Optional[list[list[Any]]]:
+        if self.history is None:
+            return None
+        if msg_id is None:
+            return self.history.recent(account_id, group_id, count)
+        data = self.history.find(account_id, group_id, msg_id)
+        return [] if data is None else [data]
+
+    @staticmethod
+    async def _wait_connected(conn: Connection):
+        while conn.ws is None or conn.state != 'connected':
+            if conn.state == 'closed':
+                raise NetworkError('连接已关闭')
+            await conn.connected.wait()
+
+    async def _upload_request(self, account_id: str, data: list[dict[str, str]]) -> Any:
+        return await self._transfer_request(account_id, data, None)
+
+    async def _transfer_request(self, account_id: str, data: list[dict[str, str]], timeout: Optional[float]) -> Any:
+        """分片必须得到应答才能继续, 不写入离线队列"""
+        send: Message.OriginMessage.Send = {
+            'seq': 0,
+            'cmd': 'SendOicqMsg',
+            'rsp': True,
+            'data': data # type: ignore
+        }
+        return await self._request(send, timeout, account_id, False)
+
+    async def _handle_metrics(self, request: Request) -> Response:
+        return Response(
+            200,
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'},
+            content=self.metrics.render()
+        )
+
+    @staticmethod
+    def _parse_response(recv: Message.OriginMessage.Recv) -> Any:
+        result = recv['data']
+        if isinstance(result, dict) and result.get('status') == False:
+            raise ActionFailed(result)
+        return result
+
+    async def send(
+        self,
+        event: MessageEvent,
+        message: Message,
+        reply: bool = False,
+        timeout: Optional[float] = None,
+        priority: int = PRIORITY_REPLY
+    ) -> Any:
+        message = await self.media.prepare(event.account_id, message)
+        frame = self.encode_message(event, message, reply)
+        key = f'{event.account_id}/{event.get_group_id()}'
+        if not self.worker_client is None:
+            # 由主进程的发送调度器统一限速
+            return await self.worker_client.call(worker.SEND, [key, priority, timeout, frame.account_id, frame.group_id], frame.body)
+        return await self.scheduler.submit(key, frame, priority, timeout)
\ No newline at end of file
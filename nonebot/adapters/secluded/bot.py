@@ -1,4 +1,7 @@
-from typing import TYPE_CHECKING, Union, Any
+import asyncio
+from contextlib import aclosing
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Iterable, Optional, TypeVar, Union, Any
 from typing_extensions import override
 
 from nonebot.adapters import Bot as BaseBot
@@ -6,10 +9,24 @@ from nonebot.message import handle_event
 
 from .event import Event, MessageEvent
 from .message import Message, MessageSegment
+from .model import (
+    CachedMessage,
+    FriendInfo,
+    GroupFileInfo,
+    GroupInfo,
+    MemberInfo,
+    UserInfo,
+    result_entries,
+    result_items
+)
+from .scheduler import PRIORITY_REPLY
+from .transfer import TransferFile
 
 if TYPE_CHECKING:
     from .adapter import Adapter
 
+_T = TypeVar('_T')
+
 class Bot(BaseBot):
     adapter: 'Adapter' # type: ignore
 
@@ -19,29 +36,282 @@ class Bot(BaseBot):
         event: MessageEvent,
         message: Union[str, Message, MessageSegment],
         reply: bool = False,
+        timeout: Optional[float] = None,
+        priority: int = PRIORITY_REPLY,
         **kwargs: Any,
     ) -> Any:
+        """发送消息, 返回应答包的 data
+
+        timeout: 等待应答包的超时时间, 默认为 `secluded_api_timeout`, 超时抛出 `NetworkError`
+        priority: 发送优先级, 越小越先发送, 批量通知可以使用 `PRIORITY_BULK`
+        """
         if not event.group_id is None:
             if type(message) == str:
-                await self.adapter.send(
+                return await self.adapter.send(
                     event, 
                     Message([
                         MessageSegment('text', {'text': message})
                     ]),
-                    reply
+                    reply,
+                    timeout,
+                    priority
                 )
             elif type(message) == MessageSegment:
-                await self.adapter.send(
+                return await self.adapter.send(
                     event,
                     Message([
                         message
                     ]),
-                    reply
+                    reply,
+                    timeout,
+                    priority
                 )
             elif type(message) == Message:
-                await self.adapter.send(event, message, reply)
+                return await self.adapter.send(event, message, reply, timeout, priority)
         else:
             pass
     
+    async def _query(self, op: str, timeout: Optional[float] = None, **fields: str) -> Any:
+        """发送查询类的操作, 返回应答包的 data"""
+        return await self.call_api(
+            'SendOicqMsg',
+            data=[{'Account': self.self_id, op: op, **fields}],
+            timeout=timeout
+        )
+
+    async def _pages(self, op: str, timeout: Optional[float] = None, **fields: str) -> AsyncIterator[Any]:
+        """按 Offset 分页查询, 逐页返回应答包的 data
+
+        处理当前页时已经在请求下一页; 收到空页, 或服务端不支持 Offset 又返回了第一页时结束;
+        调用方提前结束时需要关闭这个生成器 (例如使用 contextlib.aclosing), 才能及时取消预取的下一页
+        """
+        offset = 0
+        first = None
+        page: Optional[asyncio.Future] = asyncio.ensure_future(self._query(op, timeout, Offset='0', **fields))
+        try:
+            while not page is None:
+                result = await page
+                page = None
+                items = result_entries(result)
+                if not items or (offset and items[0] == first):
+                    return
+                if not offset:
+                    first = items[0]
+                offset += len(items)
+                page = asyncio.ensure_future(self._query(op, timeout, Offset=str(offset), **fields))
+                yield result
+        finally:
+            if not page is None:
+                # 已经失败的预取被取消后也不会再报告 "exception was never retrieved"
+                page.cancel()
+
+    async def iter_group_list(self, timeout: Optional[float] = None) -> AsyncIterator[GroupInfo]:
+        """逐个返回账号加入的群, 不使用缓存"""
+        async with aclosing(self._pages('GroupListGet', timeout)) as pages:
+            async for result in pages:
+                for i in result_items(result):
+                    yield GroupInfo.from_data(i)
+
+    async def iter_member_list(self, group_id: str, timeout: Optional[float] = None) -> AsyncIterator[MemberInfo]:
+        """逐个返回群成员, 不使用缓存, is_admin 为 None"""
+        async with aclosing(self._pages('GroupMemberListGet', timeout, GroupId=group_id)) as pages:
+            async for result in pages:
+                for i in result_items(result):
+                    yield MemberInfo.from_data(group_id, i)
+
+    async def iter_friend_list(self, timeout: Optional[float] = None) -> AsyncIterator[FriendInfo]:
+        """逐个返回好友, 不使用缓存"""
+        async with aclosing(self._pages('FriendListGet', timeout)) as pages:
+            async for result in pages:
+                for i in result_items(result):
+                    yield FriendInfo.from_data(i)
+
+    async def iter_group_files(
+        self,
+        group_id: str,
+        folder_id: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[GroupFileInfo]:
+        """逐个返回群文件和文件夹, folder_id 为 None 时列出根目录"""
+        fields = {'GroupId': group_id}
+        if not folder_id is None:
+            fields['Id'] = folder_id
+        async with aclosing(self._pages('GroupFileListGet', timeout, **fields)) as pages:
+            async for result in pages:
+                for i in result_items(result):
+                    yield GroupFileInfo.from_data(group_id, i)
+
+    async def iter_group_msg_cache(self, group_id: str, timeout: Optional[float] = None) -> AsyncIterator[CachedMessage]:
+        """逐条返回服务端缓存的群消息"""
+        async with aclosing(self._pages('GroupMsgCacheGet', timeout, GroupId=group_id)) as pages:
+            async for result in pages:
+                for i in result_entries(result):
+                    yield CachedMessage.from_data(group_id, i)
+
+    async def get_user_info(self, user_id: str, timeout: Optional[float] = None) -> UserInfo:
+        """查询 QQ 资料"""
+        items = result_items(await self._query('UserInfoGet', timeout, Uin=user_id))
+        return UserInfo.from_data(user_id, items[0] if items else {})
+
+    async def get_user_infos(self, user_ids: Iterable[str], timeout: Optional[float] = None) -> list[UserInfo]:
+        """同时查询多个 QQ 的资料, 最多同时发出 `secluded_query_concurrency` 个查询"""
+        limit = asyncio.Semaphore(max(1, self.adapter.adapter_config.secluded_query_concurrency))
+
+        async def get(user_id: str) -> UserInfo:
+            async with limit:
+                return await self.get_user_info(user_id, timeout)
+
+        return list(await asyncio.gather(*(get(i) for i in user_ids)))
+
+    async def get_history_message(self, group_id: str, msg_id: str, timeout: Optional[float] = None) -> Optional[CachedMessage]:
+        """按 MsgId 查找群消息, 消息历史中没有时查询服务端的消息缓存, 都没有时返回 None"""
+        messages = await self.adapter.query_history(self.self_id, group_id, msg_id)
+        if messages:
+            return messages[0]
+        async with aclosing(self.iter_group_msg_cache(group_id, timeout)) as cached:
+            async for message in cached:
+                if message.msg_id == msg_id:
+                    return message
+        return None
+
+    async def get_recent_messages(self, group_id: str, count: int, timeout: Optional[float] = None) -> list[CachedMessage]:
+        """最近 count 条群消息, 从旧到新; 消息历史中不足 count 条时与服务端的消息缓存合并"""
+        local = await self.adapter.query_history(self.self_id, group_id, None, count)
+        if not local is None and len(local) >= count:
+            return local
+        messages = {i.msg_id: i async for i in self.iter_group_msg_cache(group_id, timeout)}
+        for i in local or ():
+            messages.setdefault(i.msg_id, i)
+        result = list(messages.values())
+        if all(not i.time is None for i in result):
+            result.sort(key=lambda i: i.time) # type: ignore
+        return result[-count:] if count > 0 else []
+
+    async def upload_group_file(
+        self,
+        group_id: str,
+        file: TransferFile,
+        name: Optional[str] = None,
+        folder_id: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Any:
+        """分片上传群文件, 返回最后一个分片的应答包的 data
+
+        file: 本地路径或异步的 bytes 流, 上传流时需要传入 name
+        timeout: 每个分片等待应答包的超时时间
+        """
+        return await self.adapter.transfer.upload(self.self_id, group_id, file, name, folder_id, timeout)
+
+    async def download_group_file(
+        self,
+        group_id: str,
+        file: Union[str, GroupFileInfo],
+        path: Union[str, Path],
+        timeout: Optional[float] = None
+    ) -> Path:
+        """分片下载群文件到 path, 中断后再次调用时接着下载
+
+        file: 文件 Id, 或 iter_group_files 得到的 GroupFileInfo(此时按其中的 MD5 校验)
+        """
+        if isinstance(file, GroupFileInfo):
+            return await self.adapter.transfer.download(self.self_id, group_id, file.file_id, path, file.md5, timeout)
+        return await self.adapter.transfer.download(self.self_id, group_id, file, path, None, timeout)
+
+    async def _shared(self, key: tuple[str, ...], func: Callable[[], Awaitable[_T]]) -> _T:
+        metadata = self.adapter.metadata
+        if metadata is None:
+            return await func()
+        return await metadata.shared(key, func)
+
+    async def get_group_list(self, refresh: bool = False) -> list[GroupInfo]:
+        """账号加入的群, 优先使用缓存, refresh 为 True 时重新查询"""
+        metadata = self.adapter.metadata
+        if not refresh and not metadata is None:
+            groups = metadata.group_list(self.self_id)
+            if not groups is None:
+                return groups
+        return await self._shared(('groups', self.self_id), self._fetch_group_list)
+
+    async def _fetch_group_list(self) -> list[GroupInfo]:
+        groups = [i async for i in self.iter_group_list()]
+        if not self.adapter.metadata is None:
+            self.adapter.metadata.fill_groups(self.self_id, groups)
+        return groups
+
+    async def get_group_info(self, group_id: str, refresh: bool = False) -> Optional[GroupInfo]:
+        """群信息, 缓存中没有时查询群列表, 不在群列表中时返回 None"""
+        metadata = self.adapter.metadata
+        if not refresh and not metadata is None:
+            group = metadata.group(self.self_id, group_id)
+            if not group is None:
+                return group
+        for group in await self.get_group_list(refresh):
+            if group.group_id == group_id:
+                return group
+        return None
+
+    async def get_member_list(self, group_id: str, refresh: bool = False) -> list[MemberInfo]:
+        """群成员列表, 优先使用缓存, refresh 为 True 时重新查询"""
+        metadata = self.adapter.metadata
+        if not refresh and not metadata is None:
+            members = metadata.member_list(self.self_id, group_id)
+            if not members is None:
+                return members
+        return await self._shared(('members', self.self_id, group_id), lambda: self._fetch_member_list(group_id))
+
+    async def _fetch_member_list(self, group_id: str) -> list[MemberInfo]:
+        # 成员列表中没有管理员信息, 同时查询管理员列表
+        admins_task = asyncio.ensure_future(self._query('GroupMemberListGetAdmin', GroupId=group_id))
+        try:
+            members = [i async for i in self.iter_member_list(group_id)]
+            admins_result = await admins_task
+        finally:
+            admins_task.cancel()
+        admins = {str(i['Uin']) for i in result_items(admins_result) if 'Uin' in i}
+        for member in members:
+            member.is_admin = member.user_id in admins
+        if not self.adapter.metadata is None:
+            self.adapter.metadata.fill_members(self.self_id, group_id, members)
+        return members
+
+    async def get_member_info(self, group_id: str, user_id: str, refresh: bool = False) -> Optional[MemberInfo]:
+        """群成员信息, 缓存中没有或不知道是否为管理员时查询整个群的成员列表"""
+        metadata = self.adapter.metadata
+        if not refresh and not metadata is None:
+            member = metadata.member(self.self_id, group_id, user_id)
+            if not member is None and not member.is_admin is None:
+                return member
+        for member in await self.get_member_list(group_id, refresh):
+            if member.user_id == user_id:
+                return member
+        return None
+
+    async def get_friend_list(self, refresh: bool = False) -> list[FriendInfo]:
+        """好友列表, 优先使用缓存, refresh 为 True 时重新查询"""
+        metadata = self.adapter.metadata
+        if not refresh and not metadata is None:
+            friends = metadata.friend_list(self.self_id)
+            if not friends is None:
+                return friends
+        return await self._shared(('friends', self.self_id), self._fetch_friend_list)
+
+    async def _fetch_friend_list(self) -> list[FriendInfo]:
+        friends = [i async for i in self.iter_friend_list()]
+        if not self.adapter.metadata is None:
+            self.adapter.metadata.fill_friends(self.self_id, friends)
+        return friends
+
+    async def get_friend_info(self, user_id: str, refresh: bool = False) -> Optional[FriendInfo]:
+        """好友信息, 缓存中没有时查询好友列表, 不是好友时返回 None"""
+        metadata = self.adapter.metadata
+        if not refresh and not metadata is None:
+            friend = metadata.friend(self.self_id, user_id)
+            if not friend is None:
+                return friend
+        for friend in await self.get_friend_list(refresh):
+            if friend.user_id == user_id:
+                return friend
+        return None
+
     async def handle_event(self, event: Event):
         await handle_event(self, event)
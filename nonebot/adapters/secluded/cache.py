@@ -0,0 +1,103 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Generic, Hashable, Optional, TypeVar, Union
+
+_K = TypeVar('_K', bound=Hashable)
+_V = TypeVar('_V')
+_D = TypeVar('_D')
+_T = TypeVar('_T')
+
+
+class TTLCache(Generic[_K, _V]):
+    """写入 ttl 秒后过期, 超过 maxsize 时淘汰最久没有访问的项
+
+    过期的项在下次访问或被淘汰时才删除
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (过期时间, 值)
+        self._data: OrderedDict[_K, tuple[float, _V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        """包括已过期还没删除的项"""
+        return len(self._data)
+
+    def live(self) -> int:
+        """未过期的项数, 需要遍历所有项"""
+        now = time.monotonic()
+        return sum(1 for expires, _ in self._data.values() if expires >= now)
+
+    def __contains__(self, key: _K) -> bool:
+        return self._lookup(key) is not None
+
+    def _lookup(self, key: _K) -> Optional[tuple[float, _V]]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return item
+
+    def get(self, key: _K, default: _D = None) -> Union[_V, _D]:
+        item = self._lookup(key)
+        return default if item is None else item[1]
+
+    def touch(self, key: _K) -> Optional[_V]:
+        """取出未过期的值, 并从现在起重新计算过期时间"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        now = time.monotonic()
+        if item[0] < now:
+            del self._data[key]
+            return None
+        self._data[key] = (now + self.ttl, item[1])
+        self._data.move_to_end(key)
+        return item[1]
+
+    def set(self, key: _K, value: _V):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def add(self, key: _K, value: _V) -> bool:
+        """key 不存在时写入并返回 True, 已存在时返回 False"""
+        if self._lookup(key) is not None:
+            return False
+        self.set(key, value)
+        return True
+
+    def pop(self, key: _K, default: _D = None) -> Union[_V, _D]:
+        item = self._data.pop(key, None)
+        if item is None or item[0] < time.monotonic():
+            return default
+        return item[1]
+
+    def clear(self):
+        self._data.clear()
+
+
+class SingleFlight(Generic[_K]):
+    """同一个 key 同时只执行一次, 并发的调用方共享结果
+
+    某个调用方被取消不会影响正在执行的任务和其他调用方
+    """
+
+    def __init__(self):
+        self._inflight: dict[_K, asyncio.Future] = {}
+
+    def __contains__(self, key: _K) -> bool:
+        return key in self._inflight
+
+    async def run(self, key: _K, func: Callable[[], Awaitable[_T]]) -> _T:
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._inflight[key] = asyncio.ensure_future(func())
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
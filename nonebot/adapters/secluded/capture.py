@@ -0,0 +1,277 @@
+"""抓取收发的原始包, 以及把抓到的包回放进适配器
+
+python -m nonebot.adapters.secluded.capture 抓包文件 [--speed 1] [--plugin 插件名]
+"""
+import argparse
+import asyncio
+import gzip
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, Literal, Optional
+
+from .config import ConnectionConfig
+from .connection import Connection
+from .log import log
+
+if TYPE_CHECKING:
+    from .adapter import Adapter
+
+Direction = Literal['recv', 'send']
+
+
+@dataclass
+class CapturedFrame:
+    time: float
+    direction: Direction
+    host: str
+    raw: bytes
+
+
+class FrameCapture:
+    """把收发的原始包写入 gzip 压缩的文件, 文件超过 max_bytes 后轮换
+
+    每条记录为一行 `时间戳\\t方向\\t连接地址\\t长度`, 后面跟着原始包和一个换行;
+    写文件在单独的线程中进行, 队列满时丢弃记录并计数, 不会阻塞事件循环
+    """
+
+    def __init__(self, path: str, max_bytes: int, backups: int, queue_size: int = 10000):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        # 因为队列已满没有写入的包数
+        self.dropped: int = 0
+        self._queue: queue.Queue[Optional[bytes]] = queue.Queue(queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._raw: Optional[BinaryIO] = None
+
+    def start(self):
+        if self._thread is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name='secluded-capture', daemon=True)
+            self._thread.start()
+
+    async def stop(self):
+        """写完队列中剩余的记录后关闭文件"""
+        if not self._thread is None:
+            await asyncio.get_running_loop().run_in_executor(None, self._stop)
+            self._thread = None
+
+    def _stop(self):
+        assert not self._thread is None
+        self._queue.put(None)
+        self._thread.join()
+
+    def __call__(self, direction: Direction, host: str, raw: bytes):
+        record = f'{time.time():.6f}\t{direction}\t{host}\t{len(raw)}\n'.encode() + raw + b'\n'
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _open(self) -> gzip.GzipFile:
+        self._raw = open(self.path, 'ab')
+        return gzip.GzipFile(fileobj=self._raw, mode='ab')
+
+    def _close(self, file: gzip.GzipFile):
+        file.close()
+        if not self._raw is None:
+            self._raw.close()
+            self._raw = None
+
+    def _backup(self, i: int) -> Path:
+        return self.path.with_name(f'{self.path.name}.{i}')
+
+    def _rotate(self):
+        if self.backups <= 0:
+            self.path.unlink()
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if self._backup(i).exists():
+                self._backup(i).replace(self._backup(i + 1))
+        self.path.replace(self._backup(1))
+
+    def _run(self):
+        try:
+            file = self._open()
+        except Exception as e:
+            log(
+                'ERROR',
+                f'无法打开抓包文件: {self.path}',
+                e
+            )
+            return
+        try:
+            while True:
+                try:
+                    record = self._queue.get(timeout=1)
+                except queue.Empty:
+                    # 空闲时把已写入的内容刷到磁盘, 进程崩溃时不丢失
+                    file.flush()
+                    continue
+                if record is None:
+                    break
+                file.write(record)
+                assert not self._raw is None
+                if self._raw.tell() >= self.max_bytes:
+                    self._close(file)
+                    self._rotate()
+                    file = self._open()
+        except Exception as e:
+            log(
+                'ERROR',
+                '写入抓包文件失败, 停止抓包',
+                e
+            )
+        finally:
+            self._close(file)
+
+
+def capture_files(path: str) -> list[Path]:
+    """返回 path 及轮换出的旧文件, 从旧到新排列"""
+    base = Path(path)
+    files: list[Path] = []
+    i = 1
+    while base.with_name(f'{base.name}.{i}').exists():
+        files.append(base.with_name(f'{base.name}.{i}'))
+        i += 1
+    files.reverse()
+    if base.exists():
+        files.append(base)
+    return files
+
+
+def read_capture(paths: Iterable[Path]) -> Iterator[CapturedFrame]:
+    """按顺序读取抓包文件中的记录, 文件末尾不完整的记录会被忽略"""
+    for path in paths:
+        with gzip.open(path, 'rb') as f:
+            try:
+                while True:
+                    header = f.readline()
+                    if not header:
+                        break
+                    timestamp, direction, host, length = header.rstrip(b'\n').split(b'\t')
+                    raw = f.read(int(length))
+                    if len(raw) < int(length):
+                        break
+                    f.read(1)
+                    yield CapturedFrame(
+                        float(timestamp),
+                        direction.decode(), # type: ignore
+                        host.decode(),
+                        raw
+                    )
+            except (EOFError, ValueError) as e:
+                log(
+                    'WARNING',
+                    f'抓包文件不完整, 忽略剩余部分: {path}',
+                    e
+                )
+
+
+class _ReplaySocket:
+    """回放时代替 WebSocket, 发出的包不发到网络, 需要应答的包直接视为成功"""
+
+    def __init__(self, adapter: 'Adapter', conn: Connection):
+        self.adapter = adapter
+        self.conn = conn
+
+    async def send_text(self, data: str):
+        data = self.adapter.codec.loads(data)
+        if data.get('rsp'):
+            asyncio.get_running_loop().call_soon(
+                self.conn.handle_response,
+                {'seq': data['seq'], 'cmd': 'Response', 'data': {'status': True}}
+            )
+
+    async def close(self, code: int = 1000, reason: str = ''):
+        pass
+
+
+@dataclass
+class ReplayStats:
+    frames: int = 0
+    elapsed: float = 0
+
+
+async def replay(adapter: 'Adapter', frames: Iterable[CapturedFrame], speed: float = 1) -> ReplayStats:
+    """把抓到的收包按原来的时间间隔除以 speed 送进适配器, speed 为 0 时尽快送入
+
+    与正常收包走同样的解析和分发流程, 返回时所有事件都已处理完
+    """
+    adapter.dispatcher.start()
+    adapter.scheduler.start()
+    connections: dict[str, Connection] = {}
+    stats = ReplayStats()
+    start = time.perf_counter()
+    first: Optional[float] = None
+    try:
+        for frame in frames:
+            if frame.direction != 'recv':
+                continue
+            conn = connections.get(frame.host)
+            if conn is None:
+                conn = connections[frame.host] = Connection(ConnectionConfig(host=frame.host, token=''))
+                conn.ws = _ReplaySocket(adapter, conn) # type: ignore
+                conn.set_connected()
+            if speed > 0:
+                if first is None:
+                    first = frame.time
+                delay = (frame.time - first) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            # 回放时应答不依赖读取, 队列满了直接等待
+            while adapter.dispatcher.full:
+                await adapter.dispatcher.wait_room()
+            await adapter._handle_frame(conn, frame.raw)
+            stats.frames += 1
+        await adapter.dispatcher.join()
+    finally:
+        for conn in connections.values():
+            conn.set_disconnected()
+            adapter._handle_disconnect(conn)
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把抓到的包回放进适配器')
+    parser.add_argument('path', help='抓包文件, 会按从旧到新的顺序包含轮换出的文件')
+    parser.add_argument('--speed', type=float, default=1, help='回放速度倍数, 0 为尽快回放(默认1)')
+    parser.add_argument('--plugin', action='append', default=[], help='回放前加载的插件, 可以指定多次')
+    args = parser.parse_args()
+
+    import nonebot
+    from .adapter import Adapter
+
+    # 回放不建立连接, 不需要支持 WebSocket 的驱动器
+    nonebot.init(
+        driver='~none',
+        secluded_host=None,
+        secluded_connections=[],
+        secluded_reverse_path=None,
+        secluded_capture_path=None,
+        secluded_worker_processes=0
+    )
+    for plugin in args.plugin:
+        nonebot.load_plugin(plugin)
+
+    files = capture_files(args.path)
+    if not files:
+        parser.error(f'找不到抓包文件: {args.path}')
+
+    async def run():
+        adapter = Adapter(nonebot.get_driver())
+        try:
+            stats = await replay(adapter, read_capture(files), args.speed)
+        finally:
+            await adapter.shutdown()
+        print(f'回放 {stats.frames} 个包, 用时 {stats.elapsed:.2f} 秒, {stats.frames / max(stats.elapsed, 1e-9):.0f} 包/秒')
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import json
+from typing import Any, Literal, Union
+
+CodecName = Literal['auto', 'json', 'orjson', 'msgspec']
+
+
+class Codec:
+    """WebSocket 包的编解码器
+
+    dumps 直接编码为 bytes, loads 同时接受 str 和 bytes
+    """
+    name: str = ''
+    decode_error: type[Exception] = ValueError
+
+    def dumps(self, obj: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    name = 'json'
+    decode_error = json.JSONDecodeError
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        self._decoder = json.JSONDecoder()
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj).encode()
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        if not isinstance(data, str):
+            data = data.decode()
+        return self._decoder.decode(data)
+
+
+class OrjsonCodec(Codec):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self.decode_error = orjson.JSONDecodeError
+        self.dumps = orjson.dumps # type: ignore
+        self.loads = orjson.loads # type: ignore
+
+
+class MsgspecCodec(Codec):
+    name = 'msgspec'
+
+    def __init__(self):
+        import msgspec
+        self.decode_error = msgspec.DecodeError
+        self.dumps = msgspec.json.Encoder().encode # type: ignore
+        self.loads = msgspec.json.Decoder().decode # type: ignore
+
+
+_CODECS: dict[str, type[Codec]] = {
+    'json': JsonCodec,
+    'orjson': OrjsonCodec,
+    'msgspec': MsgspecCodec
+}
+
+
+def get_codec(name: CodecName = 'auto') -> Codec:
+    """按名称创建编解码器
+
+    auto: 依次尝试 orjson, msgspec, 都没有安装时使用标准库 json
+    """
+    if name != 'auto':
+        return _CODECS[name]()
+    for i in ('orjson', 'msgspec'):
+        try:
+            return _CODECS[i]()
+        except ImportError:
+            continue
+    return JsonCodec()
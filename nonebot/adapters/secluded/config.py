@@ -1,8 +1,78 @@
 from pydantic import Field, BaseModel
 
+from .codec import CodecName
+from .log import FrameLogMode
+
+
+class ConnectionConfig(BaseModel):
+    host: str
+    token: str | int
+    plugin_id: str | int = 'nonebot'
+    plugin_name: str | int = 'nonebot'
+
 
 class Config(BaseModel):
-    secluded_host: str
-    secluded_token: str | int
+    secluded_host: str | None = None
+    secluded_token: str | int = ''
     secluded_plugin_id: str | int = 'nonebot'
     secluded_plugin_name: str | int = 'nonebot'
+    secluded_connections: list[ConnectionConfig] = Field(default_factory=list)
+    secluded_reverse_path: str | None = None
+    secluded_reverse_access_token: str | None = None
+    secluded_api_timeout: float = 30
+    secluded_json_codec: CodecName = 'auto'
+    secluded_ingress_allow_groups: list[str] = Field(default_factory=list)
+    secluded_ingress_deny_groups: list[str] = Field(default_factory=list)
+    secluded_ingress_deny_users: list[str] = Field(default_factory=list)
+    secluded_ingress_deny_events: list[str] = Field(default_factory=list)
+    secluded_dispatch_workers: int = 16
+    secluded_dispatch_queue_size: int = 100
+    secluded_worker_processes: int = 0
+    secluded_worker_hook_plugins: list[str] = Field(default_factory=list)
+    secluded_send_rate_group: float = 0
+    secluded_send_burst_group: int = 5
+    secluded_send_rate_global: float = 0
+    secluded_send_burst_global: int = 20
+    secluded_forward_heartbeat: bool = False
+    secluded_heartbeat_missed: int = 3
+    secluded_ping_interval: float = 20
+    secluded_ping_timeout: float = 20
+    secluded_reconnect_interval: float = 1
+    secluded_reconnect_max_interval: float = 60
+    secluded_spool_path: str | None = None
+    secluded_spool_max_items: int = 10000
+    secluded_spool_ttl: float = 300
+    secluded_frame_log: FrameLogMode = 'debug'
+    secluded_frame_log_sample: int = 100
+    secluded_frame_log_groups: list[str] = Field(default_factory=list)
+    secluded_metrics_path: str | None = None
+    secluded_capture_path: str | None = None
+    secluded_capture_max_bytes: int = 64 * 1024 * 1024
+    secluded_capture_backups: int = 5
+    secluded_dedup_size: int = 4096
+    secluded_dedup_ttl: float = 300
+    secluded_metadata_size: int = 100000
+    secluded_metadata_ttl: float = 3600
+    secluded_query_concurrency: int = 8
+    secluded_history_size: int = 0
+    secluded_history_max_bytes: int = 256 * 1024
+    secluded_history_groups: int = 1000
+    secluded_media_chunk_size: int = 256 * 1024
+    secluded_media_cache_size: int = 1024
+    secluded_media_cache_ttl: float = 86400
+    secluded_transfer_chunk_size: int = 512 * 1024
+    secluded_transfer_concurrency: int = 4
+    secluded_transfer_retries: int = 5
+    secluded_shutdown_timeout: float = 10
+
+    def get_connections(self) -> list[ConnectionConfig]:
+        """secluded_host 与 secluded_connections 中配置的所有连接"""
+        connections = list(self.secluded_connections)
+        if not self.secluded_host is None:
+            connections.insert(0, ConnectionConfig(
+                host=self.secluded_host,
+                token=self.secluded_token,
+                plugin_id=self.secluded_plugin_id,
+                plugin_name=self.secluded_plugin_name
+            ))
+        return connections
@@ -0,0 +1,155 @@
+import asyncio
+import time
+from typing import Any, Literal, Optional
+
+from nonebot.drivers import WebSocket
+
+from .config import ConnectionConfig
+from .message import Message
+from .log import log
+
+ConnectionState = Literal['disconnected', 'connecting', 'replaying', 'connected', 'closed']
+
+
+class Connection:
+    """一条到 Secluded 的 WebSocket 连接
+
+    正向连接由适配器主动连接并重连, 反向连接由 Secluded 连接到适配器;
+    每条连接有独立的 seq 与应答表, 一条连接上可以有多个账号
+    """
+
+    def __init__(self, config: ConnectionConfig):
+        self.config = config
+        self.task: Optional[asyncio.Task] = None
+        self.ws: Optional[WebSocket] = None
+        self.seq: int = 1
+        self.state: ConnectionState = 'disconnected'
+        # 上线成功后 set, 断开时 clear, 等待发送的调用方在这里等待
+        self.connected = asyncio.Event()
+        self.reconnects: int = 0
+        self._downtime: float = 0
+        self._down_since: Optional[float] = None
+        self._up_since: Optional[float] = None
+        # 在这条连接上出现过的账号
+        self.accounts: set[str] = set()
+        # seq -> 等待应答包的 Future
+        self._pending: dict[int, asyncio.Future[Message.OriginMessage.Recv]] = {}
+        # 登记新的 seq 时 set, 用于唤醒暂停读取的连接
+        self.request_sent = asyncio.Event()
+        # 最近一次收到心跳的时间, 以及平滑后的心跳间隔
+        self.last_heartbeat: Optional[float] = None
+        self.heartbeat_interval: Optional[float] = None
+        # 最近一次 WebSocket ping 的往返时间
+        self.ping_rtt: Optional[float] = None
+        # 事件队列已满暂停读取时为 True, 以及最近一次恢复读取的时间
+        self.paused: bool = False
+        self.resumed_at: float = 0
+
+    def __repr__(self) -> str:
+        return f'Connection(host={self.config.host!r})'
+
+    @property
+    def downtime(self) -> float:
+        """上线成功后累计断开的秒数"""
+        if self._down_since is None:
+            return self._downtime
+        return self._downtime + time.monotonic() - self._down_since
+
+    @property
+    def uptime(self) -> float:
+        """本次上线以来的秒数, 未上线时为 0"""
+        return 0 if self._up_since is None else time.monotonic() - self._up_since
+
+    def set_connected(self) -> Optional[float]:
+        """标记为已上线, 如果是重连则返回本次断开的秒数"""
+        down: Optional[float] = None
+        if not self._down_since is None:
+            down = time.monotonic() - self._down_since
+            self._downtime += down
+            self._down_since = None
+            self.reconnects += 1
+        self._up_since = time.monotonic()
+        # 已经知道心跳间隔时从上线开始计算, 服务端上线后一直不发心跳也能发现
+        self.last_heartbeat = None if self.heartbeat_interval is None else self._up_since
+        self.ping_rtt = None
+        self.state = 'connected'
+        self.connected.set()
+        return down
+
+    def set_disconnected(self):
+        if self.state == 'connected':
+            self._down_since = time.monotonic()
+        self._up_since = None
+        self.state = 'disconnected'
+        self.connected.clear()
+
+    def close(self):
+        """适配器关闭后不再重连, 唤醒所有等待上线的调用方"""
+        self.set_disconnected()
+        self.state = 'closed'
+        self.connected.set()
+
+    def heartbeat(self):
+        now = time.monotonic()
+        if not self.last_heartbeat is None:
+            gap = now - self.last_heartbeat
+            self.heartbeat_interval = gap if self.heartbeat_interval is None else self.heartbeat_interval * 0.8 + gap * 0.2
+        self.last_heartbeat = now
+
+    def heartbeat_overdue(self, missed: int) -> bool:
+        """超过 missed 个心跳间隔没有收到心跳, 还没测出心跳间隔时为 False"""
+        if self.last_heartbeat is None or self.heartbeat_interval is None:
+            return False
+        return time.monotonic() - self.last_heartbeat > missed * self.heartbeat_interval
+
+    async def ping(self, timeout: float) -> Optional[float]:
+        """发送 WebSocket ping 并等待 pong, 返回往返时间
+
+        驱动器不支持等待 pong 时(例如 aiohttp 和反向连接)返回 None, 等待超时抛出 asyncio.TimeoutError
+        """
+        ping: Any = getattr(getattr(self.ws, 'websocket', None), 'ping', None)
+        if ping is None:
+            return None
+        start = time.perf_counter()
+        waiter = await ping()
+        if waiter is None:
+            return None
+        await asyncio.wait_for(waiter, timeout)
+        self.ping_rtt = time.perf_counter() - start
+        return self.ping_rtt
+
+    @property
+    def pending(self) -> int:
+        """等待应答包的调用数"""
+        return len(self._pending)
+
+    def next_seq(self) -> int:
+        seq = self.seq
+        self.seq += 1
+        return seq
+
+    def expect(self, seq: int) -> asyncio.Future[Message.OriginMessage.Recv]:
+        """登记一个等待应答包的 seq"""
+        future: asyncio.Future[Message.OriginMessage.Recv] = asyncio.get_running_loop().create_future()
+        self._pending[seq] = future
+        self.request_sent.set()
+        return future
+
+    def forget(self, seq: int):
+        self._pending.pop(seq, None)
+
+    def handle_response(self, recv: Message.OriginMessage.Recv):
+        future = self._pending.pop(recv['seq'], None)
+        if future is None:
+            log(
+                'DEBUG',
+                f'收到未知应答包: seq={recv["seq"]}'
+            )
+        elif not future.done():
+            future.set_result(recv)
+
+    def fail_pending(self, exc: Exception):
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(exc)
@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Optional
+
+from .event import Event
+from .log import log
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+_Item = tuple['Bot', Event, float]
+
+
+def route(event: Event, n: int) -> int:
+    """按 session_id 选择 n 个 worker 中的一个, 没有 session_id 的事件交给第一个"""
+    session_id: Optional[str]
+    try:
+        session_id = event.get_session_id()
+    except Exception:
+        session_id = None
+    return route_session(session_id, n)
+
+
+def route_session(session_id: Optional[str], n: int) -> int:
+    return hash(session_id) % n if session_id else 0
+
+
+class EventDispatcher:
+    """有界的事件分发池
+
+    同一个 session_id 的事件总是交给同一个 worker, 保证按顺序处理;
+    worker 的队列满了之后事件先放进这个 worker 的积压队列,
+    积压也达到上限后 full 为 True, 由读取方决定暂停读取还是丢弃事件
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        observe_wait: Optional[Callable[[float], None]] = None,
+        on_done: Optional[Callable[[], None]] = None
+    ):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        # 积压上限, 与所有 worker 队列的总容量相同
+        self.backlog_size = self.workers * queue_size
+        # 事件从入队到开始处理等待的秒数
+        self.observe_wait = observe_wait
+        # 每个事件处理完(包括出错)后调用
+        self.on_done = on_done
+        self._queues: list[asyncio.Queue[Optional[_Item]]] = []
+        self._backlogs: list[deque[_Item]] = []
+        self._backlogged: int = 0
+        # 正在处理的事件数
+        self.active: int = 0
+        self._room = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._full: bool = False
+        self._dropping: bool = False
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queues = [asyncio.Queue(self.queue_size) for _ in range(self.workers)]
+        self._backlogs = [deque() for _ in range(self.workers)]
+        self._backlogged = 0
+        self._room.set()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    def discard(self) -> int:
+        """丢弃还没开始处理的事件, 返回丢弃的数量"""
+        count = self.qsize
+        for queue, backlog in zip(self._queues, self._backlogs):
+            backlog.clear()
+            while not queue.empty():
+                queue.get_nowait()
+                queue.task_done()
+        self._backlogged = 0
+        self._room.set()
+        return count
+
+    async def stop(self):
+        self.discard()
+        # NoneBot 处理事件时会屏蔽取消, 被取消的 worker 可能回到 get 继续等待, 所以再放一个 None 让它退出
+        for queue in self._queues:
+            queue.put_nowait(None)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def join(self):
+        """等待已放入的事件全部处理完"""
+        for queue in self._queues:
+            await queue.join()
+
+    @property
+    def qsize(self) -> int:
+        """所有 worker 队列和积压队列中等待处理的事件数"""
+        return sum(queue.qsize() for queue in self._queues) + self._backlogged
+
+    @property
+    def pending(self) -> int:
+        """还没处理完的事件数, 包括正在处理的"""
+        return self.qsize + self.active
+
+    @property
+    def full(self) -> bool:
+        return self._backlogged >= self.backlog_size
+
+    async def wait_room(self):
+        """等待积压降到上限以下"""
+        await self._room.wait()
+
+    def put(self, bot: 'Bot', event: Event) -> bool:
+        """放入一个事件, 积压已满时丢弃并返回 False"""
+        i = route(event, self.workers)
+        queue, backlog = self._queues[i], self._backlogs[i]
+        item = (bot, event, time.perf_counter())
+        if not backlog and not queue.full():
+            queue.put_nowait(item)
+            if (self._full or self._dropping) and self.qsize < self.workers * self.queue_size // 2:
+                # 积压降到一半以下再重新提示, 避免刷屏
+                self._full = self._dropping = False
+            return True
+        if self.full:
+            if not self._dropping:
+                self._dropping = True
+                log(
+                    'WARNING',
+                    f'事件队列已满且有调用在等待应答, 丢弃新事件: 队列深度 {self.qsize}'
+                )
+            return False
+        # 保证同一个 worker 的事件顺序, 积压不为空时新事件也排在积压后面
+        backlog.append(item)
+        self._backlogged += 1
+        if self.full:
+            self._room.clear()
+            if not self._full:
+                self._full = True
+                log(
+                    'WARNING',
+                    f'事件队列已满, 暂停读取: 队列深度 {self.qsize}'
+                )
+        return True
+
+    async def _worker(self, i: int):
+        queue, backlog = self._queues[i], self._backlogs[i]
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            bot, event, enqueued_at = item
+            if backlog:
+                queue.put_nowait(backlog.popleft())
+                self._backlogged -= 1
+                if not self.full:
+                    self._room.set()
+            if not self.observe_wait is None:
+                self.observe_wait(time.perf_counter() - enqueued_at)
+            self.active += 1
+            try:
+                await bot.handle_event(event)
+            except Exception as e:
+                log(
+                    'ERROR',
+                    f'处理事件时出现异常: {event.get_type()}',
+                    e
+                )
+            finally:
+                self.active -= 1
+                queue.task_done()
+                if not self.on_done is None:
+                    self.on_done()
@@ -0,0 +1,217 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Optional, TypeVar
+
+from .codec import Codec, JsonCodec
+from .message import MessageSegment
+from .log import log
+
+SegmentEncoder = Callable[[MessageSegment], Optional[MessageSegment.OriginSegment.Send]]
+# 直接编码为 JSON bytes 的内置编码函数, 第二个参数为 codec.dumps
+RawSegmentEncoder = Callable[[MessageSegment, Callable[[Any], bytes]], bytes]
+_E = TypeVar('_E', bound=SegmentEncoder)
+
+SEGMENT_ENCODERS: dict[str, SegmentEncoder] = {}
+# 编码函数 -> 结果相同的直接编码函数, 内置编码函数被覆盖后不再使用
+_RAW_ENCODERS: dict[SegmentEncoder, RawSegmentEncoder] = {}
+
+
+def register_segment_encoder(*types: str) -> Callable[[_E], _E]:
+    """注册消息段编码函数, 以 MessageSegment 的 type 区分
+
+    编码函数返回发送包中的一段, 返回 None 时丢弃该消息段, 重复注册时覆盖之前的编码函数
+
+    用法:
+        ```python
+        @register_segment_encoder('xml')
+        def _(segment):
+            return {'Xml': segment.data['xml']}
+        ```
+    """
+    def wrapper(func: _E) -> _E:
+        for i in types:
+            SEGMENT_ENCODERS[i] = func
+        return func
+    return wrapper
+
+
+@dataclass(slots=True)
+class EncodedFrame:
+    """编码好的发送包, 只差 seq
+
+    body 是包中 seq 之后的部分, 发送时拼上连接分配的 seq 即可
+    """
+    account_id: str
+    group_id: Optional[str]
+    rsp: bool
+    body: bytes
+
+    def encode(self, seq: int) -> bytes:
+        return b'{"seq":%d,' % seq + self.body
+
+
+class MessageEncoder:
+    """把 Message 一次编码为 SendOicqMsg 包
+
+    每个发送目标的包头(cmd, Account, Group, GroupId)编码一次后缓存;
+    使用标准库 json 时内置的消息段直接编码为 bytes, 不构造字典,
+    orjson 和 msgspec 一次编码整个列表比在 Python 中拼接更快, 仍然先转换为字典
+    """
+
+    def __init__(self, codec: Codec, cache_size: int = 4096):
+        self.codec = codec
+        self.cache_size = cache_size
+        self._direct = isinstance(codec, JsonCodec)
+        # (账号, 群号) -> 包头, 到第一段的 GroupId 为止, 不含第一段的右括号
+        self._headers: dict[tuple[str, Optional[str]], bytes] = {}
+        self._unknown: set[str] = set()
+
+    def header(self, account_id: str, group_id: Optional[str]) -> bytes:
+        key = (account_id, group_id)
+        header = self._headers.get(key)
+        if header is None:
+            if len(self._headers) >= self.cache_size:
+                # 发送目标通常很少, 超过上限时直接清空
+                self._headers.clear()
+            dumps = self.codec.dumps
+            header = b'"cmd":"SendOicqMsg","rsp":true,"data":[{"Account":' + dumps(account_id)
+            if not group_id is None:
+                header += b',"Group":"Group","GroupId":' + dumps(group_id)
+            self._headers[key] = header
+        return header
+
+    def segments(self, message: Iterable[MessageSegment]) -> list[MessageSegment.OriginSegment.Send]:
+        encoders = SEGMENT_ENCODERS
+        segments: list[MessageSegment.OriginSegment.Send] = []
+        for i in message:
+            encoder = encoders.get(i.type)
+            if encoder is None:
+                self._warn_unknown(i.type)
+                continue
+            segment = encoder(i)
+            if not segment is None:
+                segments.append(segment)
+        return segments
+
+    def encode(
+        self,
+        account_id: str,
+        group_id: Optional[str],
+        message: Iterable[MessageSegment],
+        reply: Optional[str] = None
+    ) -> EncodedFrame:
+        dumps = self.codec.dumps
+        body = self._headers.get((account_id, group_id)) or self.header(account_id, group_id)
+        if not reply is None:
+            body += b',"Reply":' + dumps(reply)
+        if self._direct:
+            segments = self._encode_direct(message)
+        else:
+            # 编码结果为 [{...},{...}], 去掉开头的 [
+            segments = dumps(self.segments(message))[1:]
+        if segments == b']':
+            body += b'}]}'
+        else:
+            body += b'},' + segments + b'}'
+        return EncodedFrame(account_id, group_id, True, body)
+
+    def _encode_direct(self, message: Iterable[MessageSegment]) -> bytes:
+        """逐段编码, 结果为 {...},{...}], 与 dumps(segments)[1:] 相同"""
+        dumps = self.codec.dumps
+        encoders = SEGMENT_ENCODERS
+        raw_encoders = _RAW_ENCODERS
+        parts: list[bytes] = []
+        for i in message:
+            encoder = encoders.get(i.type)
+            if encoder is None:
+                self._warn_unknown(i.type)
+                continue
+            raw = raw_encoders.get(encoder)
+            if raw is None:
+                segment = encoder(i)
+                if not segment is None:
+                    parts.append(dumps(segment))
+            else:
+                parts.append(raw(i, dumps))
+        return b','.join(parts) + b']'
+
+    def _warn_unknown(self, segment_type: str):
+        if not segment_type in self._unknown:
+            self._unknown.add(segment_type)
+            log(
+                'WARNING',
+                f'没有 {segment_type} 消息段的编码函数, 已忽略, 可以用 register_segment_encoder 注册'
+            )
+
+
+def _raw_encoder(encoder: SegmentEncoder) -> Callable[[RawSegmentEncoder], RawSegmentEncoder]:
+    """登记与 encoder 结果相同的直接编码函数, 键的顺序也需要相同"""
+    def wrapper(func: RawSegmentEncoder) -> RawSegmentEncoder:
+        _RAW_ENCODERS[encoder] = func
+        return func
+    return wrapper
+
+
+@register_segment_encoder('text')
+def _encode_text(segment: MessageSegment) -> MessageSegment.OriginSegment.Send:
+    return {'Text': segment.data['text']} # type: ignore
+
+
+@_raw_encoder(_encode_text)
+def _raw_text(segment: MessageSegment, dumps: Callable[[Any], bytes]) -> bytes:
+    return b'{"Text":' + dumps(segment.data['text']) + b'}'
+
+
+def _encode_media(key: str, segment: MessageSegment) -> MessageSegment.OriginSegment.Send:
+    send = {key: segment.data['url']}
+    # 上传过的文件带上 MD5 和大小, 服务端按内容查找
+    if 'md5' in segment.data:
+        send['MD5'] = segment.data['md5']
+        send['Size'] = str(segment.data['size'])
+    return send # type: ignore
+
+
+def _raw_media(key: bytes, segment: MessageSegment, dumps: Callable[[Any], bytes]) -> bytes:
+    data = segment.data
+    if 'md5' in data:
+        return b'{"' + key + b'":' + dumps(data['url']) + b',"MD5":' + dumps(data['md5']) + b',"Size":' + dumps(str(data['size'])) + b'}'
+    return b'{"' + key + b'":' + dumps(data['url']) + b'}'
+
+
+@register_segment_encoder('img')
+def _encode_img(segment: MessageSegment) -> MessageSegment.OriginSegment.Send:
+    return _encode_media('Img', segment)
+
+
+@_raw_encoder(_encode_img)
+def _raw_img(segment: MessageSegment, dumps: Callable[[Any], bytes]) -> bytes:
+    return _raw_media(b'Img', segment, dumps)
+
+
+@register_segment_encoder('gif')
+def _encode_gif(segment: MessageSegment) -> MessageSegment.OriginSegment.Send:
+    return _encode_media('Gif', segment)
+
+
+@_raw_encoder(_encode_gif)
+def _raw_gif(segment: MessageSegment, dumps: Callable[[Any], bytes]) -> bytes:
+    return _raw_media(b'Gif', segment, dumps)
+
+
+@register_segment_encoder('at')
+def _encode_at(segment: MessageSegment) -> MessageSegment.OriginSegment.Send:
+    return {'AtName': segment.data['user_name'], 'AtUin': segment.data['user_id']} # type: ignore
+
+
+@_raw_encoder(_encode_at)
+def _raw_at(segment: MessageSegment, dumps: Callable[[Any], bytes]) -> bytes:
+    return b'{"AtName":' + dumps(segment.data['user_name']) + b',"AtUin":' + dumps(segment.data['user_id']) + b'}'
+
+
+@register_segment_encoder('at_all')
+def _encode_at_all(segment: MessageSegment) -> MessageSegment.OriginSegment.Send:
+    return {'AtAll': 'AtAll'} # type: ignore
+
+
+@_raw_encoder(_encode_at_all)
+def _raw_at_all(segment: MessageSegment, dumps: Callable[[Any], bytes]) -> bytes:
+    return b'{"AtAll":"AtAll"}'
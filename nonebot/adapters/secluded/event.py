@@ -1,16 +1,57 @@
-from typing import Literal, Optional
+from typing import Any, Literal, Optional, TypeVar
 from typing_extensions import override
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 from nonebot.adapters import Event as BaseEvent
-from nonebot.compat import model_dump
+from nonebot.compat import PYDANTIC_V2, model_dump
+
+if PYDANTIC_V2:
+    from pydantic import computed_field
 
 from .message import Message, MessageSegment
+from .parser import decode_message, extract_plaintext, mentions
+
+_E = TypeVar('_E', bound=BaseModel)
+
+
+_object_setattr = object.__setattr__
+
+
+# 读写私有属性, 不经过 pydantic 的 __getattr__ / __setattr__, 解析事件时会频繁调用
+if PYDANTIC_V2:
+    def _get_private(model: BaseModel, name: str) -> Any:
+        return model.__pydantic_private__[name] # type: ignore
+
+    def _set_private(model: BaseModel, name: str, value: Any):
+        model.__pydantic_private__[name] = value # type: ignore
+else:
+    _get_private = getattr
+    _set_private = _object_setattr
+
+
+def _construct(cls: type[_E], values: dict[str, Any], private: dict[str, Any]) -> _E:
+    """跳过 pydantic 校验直接构造, 只用于字段类型已知正确的场合"""
+    model = cls.model_construct(**values) if PYDANTIC_V2 else cls.construct(**values) # type: ignore
+    for key, value in private.items():
+        _set_private(model, key, value)
+    return model
 
 class Event(BaseEvent):
     pass
 
 class MessageEvent(Event):
+    account_id: str
+    user_id: str
+    user_name: str
+    user_group_name: str
+    group_id: Optional[str]
+    group_name: Optional[str]
+    msg_id: str
+    # 未解析的消息段, 第一次读取 message 时才解析为 _message
+    # 使用 pydantic 的私有属性, 复制, pickle 时一起保存
+    _segments: list['MessageSegment.OriginSegment.Recv'] = PrivateAttr(default_factory=list)
+    _message: Optional[Message] = PrivateAttr(default=None)
+
     def __init__(
         self,
         message: Message,
@@ -22,15 +63,53 @@ class MessageEvent(Event):
         group_name: Optional[str],
         msg_id: str
     ):
-        super().__init__()
-        self.message = message
-        self.account_id = account_id
-        self.user_id = user_id
-        self.user_name = user_name
-        self.user_group_name = user_group_name
-        self.group_id = group_id
-        self.group_name = group_name
-        self.msg_id = msg_id
+        super().__init__(
+            account_id=account_id,
+            user_id=user_id,
+            user_name=user_name,
+            user_group_name=user_group_name,
+            group_id=group_id,
+            group_name=group_name,
+            msg_id=msg_id
+        )
+        _set_private(self, '_message', message)
+
+    @classmethod
+    def from_payload(
+        cls,
+        first_data: 'MessageSegment.OriginSegment.RecvFirst',
+        segments: list['MessageSegment.OriginSegment.Recv']
+    ) -> 'MessageEvent':
+        """从原始包构造, 跳过 pydantic 校验, 消息段延迟到 get_message 时解析"""
+        event_group = 'Group' in first_data
+        return _construct(cls, {
+            'account_id': first_data['Account'],
+            'user_id': first_data['Uin'],
+            'user_name': first_data['UinName'],
+            'user_group_name': first_data['OpName'],
+            'group_id': first_data['GroupId'] if event_group else None,
+            'group_name': first_data['GroupName'] if event_group else None,
+            'msg_id': first_data['MsgId']
+        }, {'_segments': segments, '_message': None})
+
+    @property
+    def message(self) -> Message:
+        message = _get_private(self, '_message')
+        if message is None:
+            message = decode_message(_get_private(self, '_segments'))
+            _set_private(self, '_message', message)
+        return message
+
+    @message.setter
+    def message(self, message: Message):
+        _set_private(self, '_message', message)
+
+    if PYDANTIC_V2:
+        # 导出时与字段一样包含 message
+        message = computed_field(message) # type: ignore
+    else:
+        def dict(self, **kwargs) -> dict[str, Any]: # type: ignore
+            return {**super().dict(**kwargs), 'message': self.message}
 
     @override
     def get_type(self) -> Literal['message']:
@@ -50,6 +129,11 @@ class MessageEvent(Event):
     
     @override
     def get_plaintext(self) -> str:
+        if _get_private(self, '_message') is None:
+            # 不需要解析整条消息
+            text = extract_plaintext(_get_private(self, '_segments'))
+            if not text is None:
+                return text
         plaintext: str = ''
         for i in self.message:
             if i.type == 'text':
@@ -66,6 +150,10 @@ class MessageEvent(Event):
     
     @override
     def is_tome(self) -> bool:
+        if _get_private(self, '_message') is None:
+            tome = mentions(_get_private(self, '_segments'), self.account_id)
+            if not tome is None:
+                return tome
         for i in self.message:
             if i.type == 'at':
                 if i.data['user_id'] == self.account_id:
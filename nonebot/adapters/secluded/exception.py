@@ -0,0 +1,22 @@
+from typing import Any, Optional
+
+from nonebot.exception import AdapterException
+from nonebot.exception import ActionFailed as BaseActionFailed
+from nonebot.exception import NetworkError as BaseNetworkError
+
+
+class SecludedAdapterException(AdapterException):
+    def __init__(self, *args: object):
+        super().__init__('secluded', *args)
+
+
+class NetworkError(BaseNetworkError, SecludedAdapterException):
+    """连接中断或应答包超时"""
+
+
+class ActionFailed(BaseActionFailed, SecludedAdapterException):
+    """收到了应答包, 但是操作失败"""
+
+    def __init__(self, response: Optional[Any] = None):
+        super().__init__(response)
+        self.response = response
@@ -0,0 +1,113 @@
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from .codec import Codec
+
+# 每条记录除消息段以外的大致开销, 用于按字节数限制
+_ENTRY_OVERHEAD = 200
+
+
+@dataclass(slots=True)
+class HistoryEntry:
+    msg_id: str
+    user_id: str
+    user_name: str
+    time: int
+    # 编码后的消息段列表, 查询时才解码
+    segments: bytes
+
+    @property
+    def size(self) -> int:
+        return len(self.segments) + len(self.msg_id) + len(self.user_name) + _ENTRY_OVERHEAD
+
+
+class _GroupHistory:
+    __slots__ = ('entries', 'index', 'size')
+
+    def __init__(self):
+        self.entries: deque[HistoryEntry] = deque()
+        # MsgId -> 记录
+        self.index: dict[str, HistoryEntry] = {}
+        self.size: int = 0
+
+
+class MessageHistory:
+    """按 (账号, 群号) 保存最近收到的群消息
+
+    每个群是一个环形缓冲区, 超过 max_entries 条或 max_bytes 字节时淘汰最早的消息;
+    最多保存 max_groups 个群, 超出时淘汰最久没有收到消息的群;
+    消息段编码为 bytes 保存, 查询时得到与 GroupMsgCacheGet 应答相同格式的消息
+    """
+
+    def __init__(self, codec: Codec, max_entries: int, max_bytes: int, max_groups: int):
+        self.codec = codec
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.max_groups = max(1, max_groups)
+        self._groups: OrderedDict[tuple[str, str], _GroupHistory] = OrderedDict()
+        self.messages: int = 0
+        self.bytes: int = 0
+
+    def add(self, data: list[dict[str, Any]]):
+        """记录一条群消息推送的 data"""
+        first = data[0]
+        msg_id = first.get('MsgId')
+        if not msg_id:
+            return
+        key = (first['Account'], first['GroupId'])
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _GroupHistory()
+            if len(self._groups) > self.max_groups:
+                self._drop(self._groups.popitem(last=False)[1])
+        else:
+            self._groups.move_to_end(key)
+            if msg_id in group.index:
+                return
+        entry = HistoryEntry(
+            msg_id,
+            first.get('Uin', ''),
+            first.get('UinName', ''),
+            int(time.time()),
+            self.codec.dumps(data[1:])
+        )
+        group.entries.append(entry)
+        group.index[msg_id] = entry
+        size = entry.size
+        group.size += size
+        self.messages += 1
+        self.bytes += size
+        while len(group.entries) > self.max_entries or (group.size > self.max_bytes and len(group.entries) > 1):
+            old = group.entries.popleft()
+            del group.index[old.msg_id]
+            size = old.size
+            group.size -= size
+            self.messages -= 1
+            self.bytes -= size
+
+    def _drop(self, group: _GroupHistory):
+        self.messages -= len(group.entries)
+        self.bytes -= group.size
+
+    def find(self, account_id: str, group_id: str, msg_id: str) -> Optional[list[Any]]:
+        group = self._groups.get((account_id, group_id))
+        if group is None:
+            return None
+        entry = group.index.get(msg_id)
+        return None if entry is None else self._to_data(entry)
+
+    def recent(self, account_id: str, group_id: str, count: int) -> list[list[Any]]:
+        """最近 count 条消息, 从旧到新"""
+        group = self._groups.get((account_id, group_id))
+        if group is None or count <= 0:
+            return []
+        entries = group.entries
+        return [self._to_data(entries[i]) for i in range(max(0, len(entries) - count), len(entries))]
+
+    def _to_data(self, entry: HistoryEntry) -> list[Any]:
+        return [
+            {'MsgId': entry.msg_id, 'Uin': entry.user_id, 'UinName': entry.user_name, 'Time': entry.time},
+            *self.codec.loads(entry.segments)
+        ]
@@ -0,0 +1,44 @@
+from typing import Any, Iterable, Literal, Optional
+
+from .parser import classify
+
+IngressRule = Literal['allow_groups', 'deny_groups', 'deny_users', 'deny_events']
+
+
+class IngressFilter:
+    """在解析事件之前按推送包的原始字段丢弃不需要处理的包
+
+    规则在创建时编译为集合, 每个包只做几次集合查找;
+    deny_events 可以是事件类型(message, notice 等)或事件 key(GroupBeatABeat 等),
+    只有配置了 deny_events 时才需要遍历整个包确定事件类型
+    """
+
+    def __init__(
+        self,
+        allow_groups: Iterable[str] = (),
+        deny_groups: Iterable[str] = (),
+        deny_users: Iterable[str] = (),
+        deny_events: Iterable[str] = ()
+    ):
+        # 为空时不限制群
+        self.allow_groups: Optional[frozenset[str]] = frozenset(map(str, allow_groups)) or None
+        self.deny_groups: frozenset[str] = frozenset(map(str, deny_groups))
+        self.deny_users: frozenset[str] = frozenset(map(str, deny_users))
+        self.deny_events: frozenset[str] = frozenset(deny_events)
+
+    def match(self, data: list[dict[str, Any]]) -> Optional[IngressRule]:
+        """返回丢弃这个包的规则, 不丢弃时返回 None"""
+        first = data[0]
+        group_id = first.get('GroupId')
+        if not group_id is None:
+            if not self.allow_groups is None and not group_id in self.allow_groups:
+                return 'allow_groups'
+            if group_id in self.deny_groups:
+                return 'deny_groups'
+        if self.deny_users and first.get('Uin') in self.deny_users:
+            return 'deny_users'
+        if self.deny_events:
+            event_type, event_key = classify(data)
+            if event_type in self.deny_events or event_key in self.deny_events:
+                return 'deny_events'
+        return None
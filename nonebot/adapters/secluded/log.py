@@ -1,3 +1,62 @@
-from nonebot.utils import logger_wrapper
+from typing import Any, Iterable, Literal, Union
 
-log = logger_wrapper("secluded")
\ No newline at end of file
+from nonebot.log import logger
+from nonebot.utils import escape_tag, logger_wrapper
+
+log = logger_wrapper("secluded")
+
+FrameLogMode = Literal['off', 'sample', 'debug', 'group']
+
+
+def frame_fields(frame: Any) -> str:
+    """只取出包的关键字段, 不格式化整个包"""
+    data = frame.get('data')
+    first = data[0] if isinstance(data, list) and data and isinstance(data[0], dict) else {}
+    return (
+        f'cmd={frame.get("cmd")} seq={frame.get("seq")} '
+        f'account={first.get("Account")} group={first.get("GroupId")} msg_id={first.get("MsgId")}'
+    )
+
+
+class FrameLogger:
+    """按配置记录收发的包
+
+    off: 不记录
+    sample: 每 sample 个包以 INFO 记录一个
+    debug: 以 DEBUG 记录所有包, 日志等级高于 DEBUG 时不做任何格式化
+    group: 以 INFO 记录 groups 中的群的包
+    """
+
+    def __init__(self, mode: FrameLogMode, sample: int, groups: Iterable[str], log_level: Union[int, str]):
+        levelno = logger.level(log_level).no if isinstance(log_level, str) else log_level
+        if mode == 'debug' and logger.level('DEBUG').no < levelno:
+            mode = 'off'
+        self.mode: FrameLogMode = mode
+        self.sample = max(1, sample)
+        self.groups = frozenset(groups)
+        self._count = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    def __call__(self, direction: Literal['recv', 'send'], frame: Any):
+        mode = self.mode
+        if mode == 'off':
+            return
+        elif mode == 'sample':
+            self._count += 1
+            if self._count % self.sample:
+                return
+            level = 'INFO'
+        elif mode == 'group':
+            data = frame.get('data')
+            if not (isinstance(data, list) and data and data[0].get('GroupId') in self.groups):
+                return
+            level = 'INFO'
+        else:
+            level = 'DEBUG'
+        log(
+            level,
+            f'{direction} {escape_tag(frame_fields(frame))}'
+        )
@@ -0,0 +1,199 @@
+import asyncio
+import base64
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterable, Awaitable, Callable, Optional, Union
+
+from .cache import SingleFlight, TTLCache
+from .exception import ActionFailed
+from .message import Message, MessageSegment
+
+# img/gif 消息段的 file 可以是本地路径, bytes 或异步的 bytes 流
+MediaFile = Union[str, Path, bytes, AsyncIterable[bytes]]
+
+MEDIA_TYPES = ('img', 'gif')
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(slots=True)
+class UploadedMedia:
+    md5: str
+    size: int
+    url: str
+
+
+def upload_chunk_data(account_id: str, md5: str, size: int, offset: int, chunk: bytes) -> list[dict[str, str]]:
+    """上传一个分片的包内容, 分片内容以 base64 放在 CacheNewFile 中"""
+    return [{
+        'Account': account_id,
+        'CacheNewFile': base64.b64encode(chunk).decode(),
+        'MD5': md5,
+        'Size': str(size),
+        'Offset': str(offset)
+    }]
+
+
+def _uploaded_url(result: Any) -> Optional[str]:
+    """服务端已经有完整文件时应答中带有引用地址"""
+    if isinstance(result, dict):
+        return result.get('Url') or result.get('Img')
+    return None
+
+
+def hash_into(path: Path, md5: Any) -> int:
+    """把文件内容分块计入 md5, 返回文件大小"""
+    size = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            md5.update(chunk)
+            size += len(chunk)
+    return size
+
+
+def hash_file(path: Path) -> tuple[str, int]:
+    """分块计算文件的 MD5 和大小"""
+    md5 = hashlib.md5()
+    size = hash_into(path, md5)
+    return md5.hexdigest(), size
+
+
+async def spool_stream(stream: AsyncIterable[bytes], prefix: str = 'secluded-media-') -> tuple[Path, str, int]:
+    """把流写入临时文件, 同时计算 MD5"""
+    loop = asyncio.get_running_loop()
+    fd, name = tempfile.mkstemp(prefix=prefix)
+    path = Path(name)
+    md5 = hashlib.md5()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            async for chunk in stream:
+                md5.update(chunk)
+                size += len(chunk)
+                await loop.run_in_executor(None, f.write, chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path, md5.hexdigest(), size
+
+
+class MediaUploader:
+    """把 img/gif 消息段中的本地文件, bytes 和异步流上传到服务端
+
+    按 (账号, MD5) 缓存上传得到的引用, 同一内容同时只上传一次;
+    文件和流按 chunk_size 分片读取和上传, 不会整个读进内存
+    """
+
+    def __init__(
+        self,
+        request: Callable[[str, list[dict[str, str]]], Awaitable[Any]],
+        chunk_size: int,
+        cache_size: int,
+        cache_ttl: float
+    ):
+        # (账号, 包内容) -> 应答包的 data
+        self.request = request
+        self.chunk_size = max(1, chunk_size)
+        self.cache: TTLCache[tuple[str, str], UploadedMedia] = TTLCache(cache_size, cache_ttl)
+        # (路径, 修改时间, 大小) -> MD5, 避免重复计算同一个文件
+        self._hashes: TTLCache[tuple[str, int, int], str] = TTLCache(cache_size, cache_ttl)
+        self._uploads: SingleFlight[tuple[str, str]] = SingleFlight()
+        self._hashing: SingleFlight[tuple[str, int, int]] = SingleFlight()
+        self.hits: int = 0
+        self.uploads: int = 0
+        self.uploaded_bytes: int = 0
+
+    @staticmethod
+    def needs_upload(message: Message) -> bool:
+        return any(i.type in MEDIA_TYPES and 'file' in i.data for i in message)
+
+    async def prepare(self, account_id: str, message: Message) -> Message:
+        """把带 file 的 img/gif 消息段换成上传后的引用, 多个文件同时上传"""
+        if not self.needs_upload(message):
+            return message
+
+        async def convert(segment: MessageSegment) -> MessageSegment:
+            if not (segment.type in MEDIA_TYPES and 'file' in segment.data):
+                return segment
+            media = await self.upload(account_id, segment.data['file'])
+            return MessageSegment(segment.type, {'url': media.url, 'md5': media.md5, 'size': media.size})
+
+        return Message(await asyncio.gather(*(convert(i) for i in message)))
+
+    async def upload(self, account_id: str, file: MediaFile) -> UploadedMedia:
+        if isinstance(file, bytes):
+            return await self._upload_once(account_id, hashlib.md5(file).hexdigest(), len(file), file)
+        if isinstance(file, (str, Path)):
+            path = Path(file)
+            md5, size = await self._hash_path(path)
+            return await self._upload_once(account_id, md5, size, path)
+        path, md5, size = await spool_stream(file)
+        return await self._upload_once(account_id, md5, size, path, delete=True)
+
+    async def _hash_path(self, path: Path) -> tuple[str, int]:
+        stat = path.stat()
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+        md5 = self._hashes.get(key)
+        if md5 is None:
+            md5 = await self._hashing.run(key, lambda: self._hash_path_uncached(key, path))
+        return md5, stat.st_size
+
+    async def _hash_path_uncached(self, key: tuple[str, int, int], path: Path) -> str:
+        md5, _ = await asyncio.get_running_loop().run_in_executor(None, hash_file, path)
+        self._hashes.set(key, md5)
+        return md5
+
+    async def _upload_once(
+        self,
+        account_id: str,
+        md5: str,
+        size: int,
+        source: Union[bytes, Path],
+        delete: bool = False
+    ) -> UploadedMedia:
+        """delete 为 True 时 source 是临时文件, 不再需要时删除"""
+        key = (account_id, md5)
+        media = self.cache.get(key)
+        if not media is None or key in self._uploads:
+            if delete:
+                source.unlink(missing_ok=True) # type: ignore
+            if not media is None:
+                self.hits += 1
+                return media
+        return await self._uploads.run(key, lambda: self._upload(account_id, md5, size, source, delete))
+
+    async def _upload(self, account_id: str, md5: str, size: int, source: Union[bytes, Path], delete: bool) -> UploadedMedia:
+        loop = asyncio.get_running_loop()
+        file = None
+        try:
+            if isinstance(source, Path):
+                file = await loop.run_in_executor(None, open, source, 'rb')
+            offset = 0
+            url: Optional[str] = None
+            while True:
+                if file is None:
+                    chunk = source[offset:offset + self.chunk_size] # type: ignore
+                else:
+                    chunk = await loop.run_in_executor(None, file.read, self.chunk_size)
+                result = await self.request(account_id, upload_chunk_data(account_id, md5, size, offset, chunk))
+                offset += len(chunk)
+                self.uploaded_bytes += len(chunk)
+                url = _uploaded_url(result)
+                # 服务端已有这个文件时会提前返回引用
+                if not url is None or offset >= size:
+                    break
+        finally:
+            if not file is None:
+                file.close()
+            if delete:
+                source.unlink(missing_ok=True) # type: ignore
+        self.uploads += 1
+        if url is None:
+            # 没有引用地址时无法发送, 也不缓存, 下次重新上传
+            raise ActionFailed({'status': False, 'error': '上传完成但应答中没有引用地址', 'MD5': md5, 'response': result})
+        media = UploadedMedia(md5, size, url)
+        self.cache.set((account_id, md5), media)
+        return media
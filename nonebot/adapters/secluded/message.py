@@ -6,7 +6,7 @@ from nonebot.adapters import Message as BaseMessage, MessageSegment as BaseMessa
 
 class MessageSegment(BaseMessageSegment["Message"]):
     type: Literal['text', 'at', 'at_all', 'img', 'gif'] # type: ignore
-    data: dict[Literal['text', 'url', 'user_id', 'user_name', 'user_group_name'], Any] # type: ignore
+    data: dict[Literal['text', 'url', 'file', 'md5', 'size', 'user_id', 'user_name', 'user_group_name'], Any] # type: ignore
 
     @classmethod
     @override
@@ -62,7 +62,7 @@ class MessageSegment(BaseMessageSegment["Message"]):
         class RecvOnline(TypedDict):
             status: bool
 
-        class Send(dict[Literal['Account', 'Group', 'GroupId', 'Reply', 'MsgId', 'Text', 'AtUin', 'AtName', 'AtAll', 'Reply', 'Img', 'Gif'], str]):
+        class Send(dict[Literal['Account', 'Group', 'GroupId', 'Reply', 'MsgId', 'Text', 'AtUin', 'AtName', 'AtAll', 'Reply', 'Img', 'Gif', 'MD5', 'Size'], str]):
             pass
 
 
@@ -0,0 +1,137 @@
+from typing import Any, Awaitable, Callable, Iterable, Optional, TypeVar
+
+from .cache import SingleFlight, TTLCache
+from .model import FriendInfo, GroupInfo, MemberInfo
+
+_T = TypeVar('_T')
+
+# 收到这些通知时清除对应群成员的缓存
+INVALIDATING_NOTICES: tuple[str, ...] = ('GroupNewMember', 'GroupMemberSignout', 'GroupModifyAdmin')
+
+
+class MetadataCache:
+    """按账号缓存群, 群成员和好友信息
+
+    从收到的每个包中被动更新, 也可以用列表查询批量刷新;
+    每张表最多保存 maxsize 项, 按条数而不是占用的内存限制, 批量查询得到的一个列表算作一项;
+    写入 ttl 秒后过期
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        # (账号, 群号) -> 群信息
+        self.groups: TTLCache[tuple[str, str], GroupInfo] = TTLCache(maxsize, ttl)
+        # (账号, 群号, QQ) -> 群成员信息
+        self.members: TTLCache[tuple[str, str, str], MemberInfo] = TTLCache(maxsize, ttl)
+        # (账号, QQ) -> 好友信息
+        self.friends: TTLCache[tuple[str, str], FriendInfo] = TTLCache(maxsize, ttl)
+        # 批量查询得到的完整列表, key 为 ('groups', 账号), ('members', 账号, 群号) 或 ('friends', 账号)
+        self.lists: TTLCache[tuple[str, ...], tuple[str, ...]] = TTLCache(maxsize, ttl)
+        self._inflight: SingleFlight[tuple[str, ...]] = SingleFlight()
+
+    def observe(self, first_data: dict[str, Any]):
+        """用收到的包的第一段更新缓存"""
+        account = first_data['Account']
+        group_id = first_data.get('GroupId')
+        user_id = first_data.get('Uin')
+        if group_id is None:
+            if user_id and 'Friend' in first_data:
+                friend = self.friends.touch((account, user_id))
+                if friend is None:
+                    self.friends.set((account, user_id), FriendInfo(user_id, first_data.get('UinName')))
+                elif 'UinName' in first_data:
+                    friend.user_name = first_data['UinName']
+            return
+        for key in INVALIDATING_NOTICES:
+            if key in first_data:
+                self.invalidate_member(account, group_id, user_id)
+                return
+        group_name = first_data.get('GroupName')
+        if group_name:
+            group = self.groups.touch((account, group_id))
+            if group is None:
+                self.groups.set((account, group_id), GroupInfo(group_id, group_name))
+            else:
+                group.group_name = group_name
+        if user_id:
+            member = self.members.touch((account, group_id, user_id))
+            if member is None:
+                self.members.set(
+                    (account, group_id, user_id),
+                    MemberInfo(group_id, user_id, first_data.get('UinName'), first_data.get('OpName'))
+                )
+            else:
+                member.user_name = first_data.get('UinName', member.user_name)
+                member.user_group_name = first_data.get('OpName', member.user_group_name)
+
+    def invalidate_member(self, account: str, group_id: str, user_id: Optional[str] = None):
+        if user_id:
+            self.members.pop((account, group_id, user_id))
+        self.lists.pop(('members', account, group_id))
+
+    def group(self, account: str, group_id: str) -> Optional[GroupInfo]:
+        return self.groups.get((account, group_id))
+
+    def member(self, account: str, group_id: str, user_id: str) -> Optional[MemberInfo]:
+        return self.members.get((account, group_id, user_id))
+
+    def friend(self, account: str, user_id: str) -> Optional[FriendInfo]:
+        return self.friends.get((account, user_id))
+
+    def group_list(self, account: str) -> Optional[list[GroupInfo]]:
+        """完整的群列表, 没有缓存或部分已被淘汰时返回 None"""
+        return self._collect(self.groups, ('groups', account), lambda i: (account, i))
+
+    def member_list(self, account: str, group_id: str) -> Optional[list[MemberInfo]]:
+        """完整的群成员列表, 其中有从推送中得到, 不知道是否为管理员的成员时也返回 None"""
+        return self._collect(
+            self.members,
+            ('members', account, group_id),
+            lambda i: (account, group_id, i),
+            lambda i: not i.is_admin is None
+        )
+
+    def friend_list(self, account: str) -> Optional[list[FriendInfo]]:
+        return self._collect(self.friends, ('friends', account), lambda i: (account, i))
+
+    def _collect(
+        self,
+        table: TTLCache[Any, _T],
+        list_key: tuple[str, ...],
+        key: Callable[[str], Any],
+        complete: Callable[[_T], bool] = lambda i: True
+    ) -> Optional[list[_T]]:
+        ids = self.lists.get(list_key)
+        if ids is None:
+            return None
+        items: list[_T] = []
+        for i in ids:
+            item = table.get(key(i))
+            if item is None or not complete(item):
+                return None
+            items.append(item)
+        return items
+
+    def fill_groups(self, account: str, groups: Iterable[GroupInfo]):
+        ids: list[str] = []
+        for group in groups:
+            self.groups.set((account, group.group_id), group)
+            ids.append(group.group_id)
+        self.lists.set(('groups', account), tuple(ids))
+
+    def fill_members(self, account: str, group_id: str, members: Iterable[MemberInfo]):
+        ids: list[str] = []
+        for member in members:
+            self.members.set((account, group_id, member.user_id), member)
+            ids.append(member.user_id)
+        self.lists.set(('members', account, group_id), tuple(ids))
+
+    def fill_friends(self, account: str, friends: Iterable[FriendInfo]):
+        ids: list[str] = []
+        for friend in friends:
+            self.friends.set((account, friend.user_id), friend)
+            ids.append(friend.user_id)
+        self.lists.set(('friends', account), tuple(ids))
+
+    async def shared(self, key: tuple[str, ...], func: Callable[[], Awaitable[_T]]) -> _T:
+        """同一个 key 同时只执行一次 func, 并发的调用方共享结果"""
+        return await self._inflight.run(key, func)
@@ -0,0 +1,195 @@
+import bisect
+from typing import Callable, Iterable, Optional, Union
+
+Labels = tuple[str, ...]
+
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    items = [f'{k}="{_escape(str(v))}"' for k, v in zip(names, values)]
+    if extra:
+        items.append(extra)
+    return '{' + ','.join(items) + '}' if items else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type: str = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames: Labels = tuple(labelnames)
+
+    def render(self) -> list[str]:
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}'
+        ]
+
+    def snapshot(self) -> dict:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for labels, value in self._values.items():
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+    def snapshot(self) -> dict[Labels, float]:
+        return dict(self._values)
+
+
+class Gauge(Metric):
+    """取值时调用 func, 返回 {标签值: 数值}"""
+    type = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        func: Callable[[], dict[Labels, float]],
+        labelnames: Iterable[str] = ()
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+
+    def get(self, *labels: str) -> float:
+        return self.func().get(labels, 0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for labels, value in self.func().items():
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+    def snapshot(self) -> dict[Labels, float]:
+        return self.func()
+
+
+class FuncCounter(Gauge):
+    """取值时调用 func 的计数器, 用于其他模块中已经在累加的总数"""
+    type = 'counter'
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        # 标签值 -> [各个桶的计数(不累加), 总和, 总数]
+        self._values: dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def get(self, *labels: str) -> tuple[float, int]:
+        """返回 (总和, 总数)"""
+        entry = self._values.get(labels)
+        return (entry[1], entry[2]) if entry else (0.0, 0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, i in zip((*self.buckets, float('inf')), counts):
+                cumulative += i
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+    def snapshot(self) -> dict[Labels, tuple[float, int]]:
+        return {k: (v[1], v[2]) for k, v in self._values.items()}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames)) # type: ignore
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        func: Callable[[], dict[Labels, float]],
+        labelnames: Iterable[str] = ()
+    ) -> Gauge:
+        return self.register(Gauge(name, documentation, func, labelnames)) # type: ignore
+
+    def func_counter(
+        self,
+        name: str,
+        documentation: str,
+        func: Callable[[], dict[Labels, float]],
+        labelnames: Iterable[str] = ()
+    ) -> FuncCounter:
+        """只增不减的总数, name 需要以 _total 结尾"""
+        return self.register(FuncCounter(name, documentation, func, labelnames)) # type: ignore
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets)) # type: ignore
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> dict[str, dict[Labels, Union[float, tuple[float, int]]]]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
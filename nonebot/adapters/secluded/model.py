@@ -0,0 +1,151 @@
+from dataclasses import dataclass
+from typing import Any, Optional, Union
+
+from .message import Message
+from .parser import decode_message
+
+
+def result_entries(result: Any) -> list[Union[list[Any], dict[str, Any]]]:
+    """取出列表类查询应答中的每一项
+
+    应答的 data 可能直接是列表, 也可能是包着列表的字典;
+    每一项通常是字典, 消息缓存中的每条消息则可能是消息段列表
+    """
+    if isinstance(result, dict):
+        result = next((i for i in result.values() if isinstance(i, list)), [result])
+    if isinstance(result, list):
+        return [i for i in result if isinstance(i, (list, dict))]
+    return []
+
+
+def result_items(result: Any) -> list[dict[str, Any]]:
+    """取出列表类查询应答中字典类型的每一项"""
+    return [i for i in result_entries(result) if isinstance(i, dict)]
+
+
+@dataclass(slots=True)
+class GroupInfo:
+    group_id: str
+    group_name: Optional[str] = None
+    owner_id: Optional[str] = None
+
+    @classmethod
+    def from_data(cls, data: dict[str, Any]) -> 'GroupInfo':
+        return cls(
+            str(data['GroupId']),
+            data.get('GroupName'),
+            None if data.get('Owner') is None else str(data['Owner'])
+        )
+
+
+@dataclass(slots=True)
+class MemberInfo:
+    """群成员信息, 不知道的字段为 None
+
+    user_name: 昵称
+    user_group_name: 群名片
+    """
+    group_id: str
+    user_id: str
+    user_name: Optional[str] = None
+    user_group_name: Optional[str] = None
+    is_admin: Optional[bool] = None
+
+    @classmethod
+    def from_data(cls, group_id: str, data: dict[str, Any]) -> 'MemberInfo':
+        return cls(
+            group_id,
+            str(data['Uin']),
+            data.get('UinName') or data.get('Nick'),
+            data.get('OpName') or data.get('UinNick')
+        )
+
+
+@dataclass(slots=True)
+class FriendInfo:
+    user_id: str
+    user_name: Optional[str] = None
+
+    @classmethod
+    def from_data(cls, data: dict[str, Any]) -> 'FriendInfo':
+        return cls(
+            str(data['Uin']),
+            data.get('UinName') or data.get('Nick')
+        )
+
+
+@dataclass(slots=True)
+class GroupFileInfo:
+    """群文件或文件夹, 文件夹的 size 和 md5 为 None"""
+    group_id: str
+    file_id: str
+    name: Optional[str] = None
+    size: Optional[int] = None
+    md5: Optional[str] = None
+    uploader_id: Optional[str] = None
+    upload_time: Optional[int] = None
+    is_folder: bool = False
+
+    @classmethod
+    def from_data(cls, group_id: str, data: dict[str, Any]) -> 'GroupFileInfo':
+        return cls(
+            group_id,
+            str(data['Id']),
+            data.get('Name'),
+            None if data.get('Size') is None else int(data['Size']),
+            data.get('MD5'),
+            None if data.get('Uin') is None else str(data['Uin']),
+            None if data.get('Time') is None else int(data['Time']),
+            'Folder' in data or data.get('Type') == 'Folder'
+        )
+
+
+@dataclass(slots=True)
+class UserInfo:
+    """QQ 资料, 不知道的字段为 None"""
+    user_id: str
+    user_name: Optional[str] = None
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    level: Optional[int] = None
+    location: Optional[str] = None
+
+    @classmethod
+    def from_data(cls, user_id: str, data: dict[str, Any]) -> 'UserInfo':
+        return cls(
+            str(data.get('Uin', user_id)),
+            data.get('Nick') or data.get('UinName'),
+            None if data.get('Age') is None else int(data['Age']),
+            data.get('Gender'),
+            None if data.get('Level') is None else int(data['Level']),
+            data.get('Location')
+        )
+
+
+@dataclass(slots=True)
+class CachedMessage:
+    """群消息缓存中的一条消息"""
+    group_id: str
+    msg_id: str
+    user_id: Optional[str]
+    user_name: Optional[str]
+    time: Optional[int]
+    message: Message
+
+    @classmethod
+    def from_data(cls, group_id: str, data: Union[list[Any], dict[str, Any]]) -> 'CachedMessage':
+        # 与推送包的 data 相同, 第一段是消息信息, 之后是消息段; 也可能是把消息段列表放在字段中的字典
+        if isinstance(data, list):
+            first: dict[str, Any] = data[0] if data and isinstance(data[0], dict) else {}
+            segments = data[1:]
+        else:
+            first = data
+            segments = next((i for i in data.values() if isinstance(i, list)), [])
+        return cls(
+            group_id,
+            str(first.get('MsgId', '')),
+            None if first.get('Uin') is None else str(first['Uin']),
+            first.get('UinName'),
+            None if first.get('Time') is None else int(first['Time']),
+            decode_message(i for i in segments if isinstance(i, dict))
+        )
@@ -0,0 +1,201 @@
+from typing import Callable, Iterable, Literal, Optional, TypeVar
+
+from .message import Message, MessageSegment
+
+EventType = Literal['message', 'request', 'notice', 'meta_event', 'other_event']
+SegmentDecoder = Callable[[MessageSegment.OriginSegment.Recv], Optional[MessageSegment]]
+_D = TypeVar('_D', bound=SegmentDecoder)
+
+# 优先级从高到低, 一个包里同时出现多种 key 时取优先级最高的
+_EVENT_KEYS: tuple[tuple[EventType, tuple[str, ...]], ...] = (
+    ('message', (
+        'AtAll',
+        'AtUin',
+        'AtName',
+        'Gif',
+        'Img',
+        'Text',
+        'Audio',
+        'Video',
+        'GroupFileUpload'
+    )),
+    ('request', (
+        'NewFriendNotify',
+        'GroupNotify',
+    )),
+    ('notice', (
+        'GroupNewMember',
+        'GroupMemberSignout',
+        'GroupMemverNickModify',
+        'GroupModifyAdmin',
+        'GroupModifyNickModify',
+        'GroupProhibitAll',
+        'GroupProhibitMember',
+        'GroupBeatABeat',
+        'GroupEssence',
+        'GroupDissolut'
+    )),
+    ('meta_event', (
+        'Heartbeat',
+        'Heartbeating',
+        'Offline',
+        'Goline',
+        'GolineWindows',
+        'OfflineWindows',
+        'System',
+        'Online'
+    ))
+)
+
+EVENT_KEY_INDEX: dict[str, tuple[EventType, int]] = {
+    key: (event_type, len(_EVENT_KEYS) - priority)
+    for priority, (event_type, keys) in enumerate(_EVENT_KEYS)
+    for key in keys
+}
+_MAX_PRIORITY = len(_EVENT_KEYS)
+
+# 事件 key -> 事件描述 MessageSegment 的类型
+REQUEST_EVENTS: dict[str, str] = {
+    'GroupNotify': 'group_new_member_request',
+    'NewFriendNotify': 'new_friend_request'
+}
+NOTICE_EVENTS: dict[str, str] = {
+    'GroupNewMember': 'group_new_member',
+    'GroupMemberSignout': 'group_member_signout'
+}
+META_EVENTS: dict[str, str] = {
+    'Heartbeat': 'Heartbeat'
+}
+# 只用于确认连接存活的包, 默认由适配器处理, 不分发给插件
+LIVENESS_KEYS: frozenset[str] = frozenset((
+    'Heartbeat',
+    'Heartbeating'
+))
+
+SEGMENT_DECODERS: dict[str, SegmentDecoder] = {}
+
+
+def classify(data: Iterable[dict]) -> tuple[EventType, Optional[str]]:
+    """一次遍历包内所有 key, 返回 (事件类型, 命中的 key)"""
+    index = EVENT_KEY_INDEX
+    event_type: EventType = 'other_event'
+    event_key: Optional[str] = None
+    best = 0
+    for item in data:
+        for key in item:
+            hit = index.get(key)
+            if hit is not None and hit[1] > best:
+                event_type, best = hit
+                event_key = key
+                if best == _MAX_PRIORITY:
+                    return event_type, event_key
+    return event_type, event_key
+
+
+def session_id(event_type: EventType, first_data: dict) -> str:
+    """与 payload_to_event 得到的事件的 get_session_id 相同, 不需要构造事件"""
+    if event_type != 'message':
+        return ''
+    account_id = first_data['Account']
+    group_id = first_data['GroupId'] if 'Group' in first_data else None
+    user_id = first_data['Uin']
+    return f'{account_id}/{group_id}/{user_id}'
+
+
+def is_liveness(data: Iterable[dict]) -> bool:
+    keys = LIVENESS_KEYS
+    for item in data:
+        if not keys.isdisjoint(item):
+            return True
+    return False
+
+
+def register_segment_decoder(*keys: str) -> Callable[[_D], _D]:
+    """注册消息段解析函数, 以消息段的第一个 key 区分
+
+    解析函数返回 None 时丢弃该消息段, 重复注册时覆盖之前的解析函数
+
+    用法:
+        ```python
+        @register_segment_decoder('Xml')
+        def _(segment):
+            return MessageSegment('xml', {'xml': segment['Xml']})
+        ```
+    """
+    def wrapper(func: _D) -> _D:
+        for key in keys:
+            SEGMENT_DECODERS[key] = func
+        return func
+    return wrapper
+
+
+def segment_decoder(segment: MessageSegment.OriginSegment.Recv) -> Optional[SegmentDecoder]:
+    """按消息段的第一个 key 查找解析函数, 没有时返回 None"""
+    if not segment:
+        return None
+    return SEGMENT_DECODERS.get(next(iter(segment)))
+
+
+def decode_message(segments: Iterable[MessageSegment.OriginSegment.Recv]) -> Message:
+    messages: list[MessageSegment] = []
+    for segment in segments:
+        decoder = segment_decoder(segment)
+        if decoder is None:
+            continue
+        result = decoder(segment)
+        if not result is None:
+            messages.append(result)
+    return Message(messages)
+
+
+@register_segment_decoder('Text')
+def _decode_text(segment: MessageSegment.OriginSegment.Recv) -> MessageSegment:
+    return MessageSegment('text', {'text': segment['Text']})
+
+
+@register_segment_decoder('AtName', 'AtUin')
+def _decode_at(segment: MessageSegment.OriginSegment.Recv) -> MessageSegment:
+    user_name = segment.get('AtName', '')
+    return MessageSegment('at', {'user_name': user_name, 'user_id': segment.get('AtUin', ''), 'text': f'@{user_name}'})
+
+
+@register_segment_decoder('AtAll')
+def _decode_at_all(segment: MessageSegment.OriginSegment.Recv) -> MessageSegment:
+    return MessageSegment('at_all', {})
+
+
+@register_segment_decoder('Img')
+def _decode_img(segment: MessageSegment.OriginSegment.Recv) -> MessageSegment:
+    return MessageSegment('img', {'type': 'img', 'url': segment['Img']})
+
+
+@register_segment_decoder('Gif')
+def _decode_gif(segment: MessageSegment.OriginSegment.Recv) -> MessageSegment:
+    return MessageSegment('img', {'type': 'gif', 'url': segment['Gif']})
+
+
+# 以下函数不解析整条消息, 结果与 decode_message 之后再读取相同
+# 遇到非内置的解析函数时无法确定结果, 返回 None
+_BUILTIN_DECODERS: frozenset[SegmentDecoder] = frozenset(SEGMENT_DECODERS.values())
+
+
+def extract_plaintext(segments: Iterable[MessageSegment.OriginSegment.Recv]) -> Optional[str]:
+    texts: list[str] = []
+    for segment in segments:
+        decoder = segment_decoder(segment)
+        if decoder is _decode_text:
+            texts.append(segment['Text'])
+        elif not decoder is None and not decoder in _BUILTIN_DECODERS:
+            return None
+    return ''.join(texts)
+
+
+def mentions(segments: Iterable[MessageSegment.OriginSegment.Recv], user_id: str) -> Optional[bool]:
+    found = False
+    for segment in segments:
+        decoder = segment_decoder(segment)
+        if decoder is _decode_at:
+            found = found or segment.get('AtUin', '') == user_id
+        elif not decoder is None and not decoder in _BUILTIN_DECODERS:
+            return None
+    return found
@@ -0,0 +1,233 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from .log import log
+
+PRIORITY_REPLY = 0
+"""回复用户的消息, 优先发送"""
+PRIORITY_BULK = 10
+"""批量通知等不着急的消息"""
+
+
+class TokenBucket:
+    """令牌桶, rate <= 0 时不限速"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens: float = self.burst
+        self.last = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """距离下一个令牌可用还需要等待的秒数"""
+        if self.rate <= 0:
+            return 0
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        if self.rate > 0:
+            self.tokens -= 1
+
+
+@dataclass
+class GroupStats:
+    queued: int = 0
+    sent: int = 0
+    wait_total: float = 0
+    wait_max: float = 0
+
+    @property
+    def wait_avg(self) -> float:
+        return self.wait_total / self.sent if self.sent else 0
+
+
+@dataclass
+class _Item:
+    group: str
+    frame: Any
+    timeout: Optional[float]
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class OutboundScheduler:
+    """发送队列
+
+    每个群一个令牌桶, 另有一个全局令牌桶;
+    按优先级从小到大发送, 同一优先级内各个群轮流发送;
+    每隔 prune_interval 秒删除空闲的群(队列为空且令牌桶已满), 群的数量不会一直增长
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Any, Optional[float]], Awaitable[Any]],
+        group_rate: float = 0,
+        group_burst: int = 1,
+        global_rate: float = 0,
+        global_burst: int = 1,
+        prune_interval: float = 60
+    ):
+        self._send = send
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self._global = TokenBucket(global_rate, global_burst)
+        self._buckets: dict[str, TokenBucket] = {}
+        # 优先级 -> 群 -> 待发送的消息, 群的顺序即轮转顺序
+        self._queues: dict[int, OrderedDict[str, deque[_Item]]] = {}
+        self.stats: dict[str, GroupStats] = {}
+        """每个群的队列深度与等待时间, 群空闲后删除"""
+        self.sent: int = 0
+        """已发出的消息总数"""
+        self.prune_interval = prune_interval
+        self._pruned_at = time.monotonic()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._sending: set[asyncio.Task] = set()
+
+    @property
+    def qsize(self) -> int:
+        return sum(i.queued for i in self.stats.values())
+
+    @property
+    def sending(self) -> int:
+        """已发出还没收到应答包的消息数"""
+        return len(self._sending)
+
+    async def join(self):
+        """等待队列中和正在发送的消息全部完成, 等待期间新提交的消息也会等待"""
+        while True:
+            waiting: list[Any] = [
+                item.future
+                for groups in self._queues.values()
+                for queue in groups.values()
+                for item in queue
+                if not item.future.done()
+            ]
+            waiting.extend(self._sending)
+            if not waiting:
+                return
+            await asyncio.wait(waiting)
+
+    def take_queued(self) -> list[tuple[Any, asyncio.Future]]:
+        """取出所有还没发出的消息, 由调用方决定如何处理 (包, 发送方等待的 future)"""
+        items = [item for groups in self._queues.values() for queue in groups.values() for item in queue]
+        self._queues.clear()
+        for item in items:
+            self.stats[item.group].queued -= 1
+        return [(item.frame, item.future) for item in items if not item.future.done()]
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def submit(self, group: str, frame: Any, priority: int = PRIORITY_REPLY, timeout: Optional[float] = None) -> Any:
+        """排队发送, 返回应答包的 data
+
+        timeout 只计算发出后等待应答包的时间, 不包括排队的时间
+        """
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        item = _Item(group, frame, timeout, future, time.monotonic())
+        self._queues.setdefault(priority, OrderedDict()).setdefault(group, deque()).append(item)
+        self.stats.setdefault(group, GroupStats()).queued += 1
+        self._wakeup.set()
+        return await future
+
+    def _bucket(self, group: str) -> TokenBucket:
+        bucket = self._buckets.get(group)
+        if bucket is None:
+            bucket = self._buckets[group] = TokenBucket(self.group_rate, self.group_burst)
+        return bucket
+
+    def _next(self, now: float) -> tuple[Optional[_Item], Optional[float]]:
+        """取出下一个可以发送的消息, 没有时返回最短需要等待的时间"""
+        delay: Optional[float] = None
+        global_delay = self._global.delay(now)
+        for priority in sorted(self._queues):
+            groups = self._queues[priority]
+            for group in list(groups):
+                queue = groups[group]
+                while queue and queue[0].future.done():
+                    # 发送方已经取消
+                    queue.popleft()
+                    self.stats[group].queued -= 1
+                if not queue:
+                    del groups[group]
+                    continue
+                group_delay = max(global_delay, self._bucket(group).delay(now))
+                if group_delay <= 0:
+                    item = queue.popleft()
+                    if queue:
+                        groups.move_to_end(group)
+                    else:
+                        del groups[group]
+                    return item, None
+                delay = group_delay if delay is None else min(delay, group_delay)
+            if not groups:
+                del self._queues[priority]
+        return None, delay
+
+    def _prune(self, now: float):
+        """删除空闲的群, 之后再提交时与新的群相同"""
+        for group in [group for group, stats in self.stats.items() if stats.queued == 0]:
+            bucket = self._buckets.get(group)
+            if not bucket is None:
+                bucket.delay(now)
+                if bucket.tokens < bucket.burst:
+                    continue
+                del self._buckets[group]
+            del self.stats[group]
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            if now - self._pruned_at >= self.prune_interval:
+                self._prune(now)
+                self._pruned_at = now
+            item, delay = self._next(now)
+            if item is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._global.take()
+            self._bucket(item.group).take()
+            stats = self.stats[item.group]
+            wait = now - item.enqueued_at
+            stats.queued -= 1
+            stats.sent += 1
+            self.sent += 1
+            stats.wait_total += wait
+            stats.wait_max = max(stats.wait_max, wait)
+            task = asyncio.create_task(self._send_item(item))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send_item(self, item: _Item):
+        try:
+            result = await self._send(item.frame, item.timeout)
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+            else:
+                log(
+                    'DEBUG',
+                    f'发送失败: {item.group}',
+                    e
+                )
+        else:
+            if not item.future.done():
+                item.future.set_result(result)
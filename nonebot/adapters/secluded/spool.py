@@ -0,0 +1,136 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+from .log import log
+
+_T = TypeVar('_T')
+
+
+@dataclass
+class SpooledFrame:
+    id: int
+    # 第一次写入队列的时间, 放回队列时保留, 用于计算有效期
+    created: float
+    frame: bytes
+
+
+class OutboundSpool:
+    """断线期间的发送队列, 保存在 SQLite 中, 重启后仍然有效
+
+    所有数据库操作都在一个单独的线程中执行, 不会阻塞事件循环
+    """
+
+    def __init__(self, path: str, max_items: int, ttl: float):
+        self.path = Path(path)
+        self.max_items = max_items
+        self.ttl = ttl
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(1, 'secluded-spool')
+
+    async def _run(self, func: Callable[..., _T], *args: Any) -> _T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def open(self):
+        await self._run(self._open)
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS spool ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'host TEXT NOT NULL, '
+            'created REAL NOT NULL, '
+            'frame BLOB NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS spool_host ON spool (host, id)')
+        self._db.commit()
+
+    async def close(self):
+        if not self._db is None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=False)
+
+    async def push(self, host: str, frame: bytes):
+        """保存一个包, 超过数量上限时丢弃最旧的包"""
+        dropped = await self._run(self._push, host, frame)
+        if dropped:
+            log(
+                'WARNING',
+                f'离线发送队列已满, 丢弃 {dropped} 条最早的消息'
+            )
+
+    def _push(self, host: str, frame: bytes) -> int:
+        assert not self._db is None
+        with self._db:
+            self._db.execute(
+                'INSERT INTO spool (host, created, frame) VALUES (?, ?, ?)',
+                (host, time.time(), frame)
+            )
+            return self._trim()
+
+    async def restore(self, host: str, frames: list[SpooledFrame]):
+        """把 pop_all 取出但没发出去的包放回队列, 保留原来的顺序和写入时间"""
+        dropped = await self._run(self._restore, host, frames)
+        if dropped:
+            log(
+                'WARNING',
+                f'离线发送队列已满, 丢弃 {dropped} 条最早的消息'
+            )
+
+    def _restore(self, host: str, frames: list[SpooledFrame]) -> int:
+        assert not self._db is None
+        with self._db:
+            # 取出后 id 不会再被使用, 按原来的 id 放回即可排在之后写入的包前面
+            self._db.executemany(
+                'INSERT INTO spool (id, host, created, frame) VALUES (?, ?, ?, ?)',
+                [(i.id, host, i.created, i.frame) for i in frames]
+            )
+            return self._trim()
+
+    def _trim(self) -> int:
+        """超过数量上限时删除最旧的包, 返回删除的数量"""
+        assert not self._db is None
+        count: int = self._db.execute('SELECT COUNT(*) FROM spool').fetchone()[0]
+        dropped = max(0, count - self.max_items)
+        if dropped:
+            self._db.execute(
+                'DELETE FROM spool WHERE id IN (SELECT id FROM spool ORDER BY id LIMIT ?)',
+                (dropped,)
+            )
+        return dropped
+
+    async def pop_all(self, host: str) -> list[SpooledFrame]:
+        """按保存顺序取出并删除这条连接的所有未过期的包"""
+        frames, expired = await self._run(self._pop_all, host)
+        if expired:
+            log(
+                'INFO',
+                f'丢弃 {expired} 条过期的离线消息'
+            )
+        return frames
+
+    def _pop_all(self, host: str) -> tuple[list[SpooledFrame], int]:
+        assert not self._db is None
+        deadline = time.time() - self.ttl
+        with self._db:
+            expired = self._db.execute(
+                'DELETE FROM spool WHERE host = ? AND created < ?',
+                (host, deadline)
+            ).rowcount
+            rows = self._db.execute(
+                'SELECT id, created, frame FROM spool WHERE host = ? ORDER BY id',
+                (host,)
+            ).fetchall()
+            if rows:
+                self._db.execute(
+                    'DELETE FROM spool WHERE host = ? AND id <= ?',
+                    (host, rows[-1][0])
+                )
+        return [SpooledFrame(*i) for i in rows], expired
@@ -0,0 +1,252 @@
+import asyncio
+import base64
+import hashlib
+import os
+from pathlib import Path
+from typing import IO, Any, AsyncIterable, Awaitable, Callable, Optional, TypeVar, Union
+
+from .exception import ActionFailed, NetworkError
+from .media import hash_file, hash_into, spool_stream
+from .log import log
+
+# 上传的群文件可以是本地路径或异步的 bytes 流
+TransferFile = Union[str, Path, AsyncIterable[bytes]]
+
+_T = TypeVar('_T')
+
+_MAX_RETRY_INTERVAL = 30
+
+
+def group_file_upload_data(
+    account_id: str,
+    group_id: str,
+    name: str,
+    md5: str,
+    size: int,
+    offset: int,
+    chunk: bytes,
+    folder_id: Optional[str] = None
+) -> list[dict[str, str]]:
+    """上传群文件一个分片的包内容, 分片内容以 base64 放在 GroupFileUpload 中"""
+    data = {
+        'Account': account_id,
+        'GroupId': group_id,
+        'GroupFileUpload': base64.b64encode(chunk).decode(),
+        'Name': name,
+        'MD5': md5,
+        'Size': str(size),
+        'Offset': str(offset)
+    }
+    if not folder_id is None:
+        data['Id'] = folder_id
+    return [data]
+
+
+def group_file_download_data(account_id: str, group_id: str, file_id: str, offset: int, size: int) -> list[dict[str, str]]:
+    """下载群文件一个分片的包内容, 应答的 GroupFile 中是 base64 编码的分片"""
+    return [{
+        'Account': account_id,
+        'GroupId': group_id,
+        'GroupFile': 'GroupFile',
+        'Id': file_id,
+        'Offset': str(offset),
+        'Size': str(size)
+    }]
+
+
+def _next_offset(result: Any) -> Optional[int]:
+    """服务端在应答中给出下一个需要的位置时从那里继续, 已有完整文件时为文件大小"""
+    if isinstance(result, dict) and not result.get('Offset') is None:
+        return int(result['Offset'])
+    return None
+
+
+def _read_at(file: IO[bytes], offset: int, size: int) -> bytes:
+    file.seek(offset)
+    return file.read(size)
+
+
+class FileTransfer:
+    """分片上传和下载群文件
+
+    每次只读写一个分片, 内存占用与文件大小无关; 所有传输共用 concurrency 个名额;
+    分片因断线失败时等待重连后从最后确认的位置继续, 每个分片最多重试 retries 次,
+    下载中断时留下的 .part 文件在下次下载同一个文件时接着使用
+    """
+
+    def __init__(
+        self,
+        request: Callable[[str, list[dict[str, str]], Optional[float]], Awaitable[Any]],
+        chunk_size: int,
+        concurrency: int,
+        retries: int,
+        retry_interval: float
+    ):
+        # (账号, 包内容, 超时时间) -> 应答包的 data
+        self.request = request
+        self.chunk_size = max(1, chunk_size)
+        self.retries = retries
+        self.retry_interval = retry_interval
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self.active: int = 0
+        self.retried: int = 0
+        self.uploaded_bytes: int = 0
+        self.downloaded_bytes: int = 0
+
+    async def upload(
+        self,
+        account_id: str,
+        group_id: str,
+        file: TransferFile,
+        name: Optional[str] = None,
+        folder_id: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Any:
+        """上传群文件, 返回最后一个分片的应答包的 data"""
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            self.active += 1
+            path: Optional[Path] = None
+            delete = False
+            try:
+                if isinstance(file, (str, Path)):
+                    path = Path(file)
+                    md5, size = await loop.run_in_executor(None, hash_file, path)
+                else:
+                    if name is None:
+                        raise ValueError('上传流时需要传入文件名')
+                    path, md5, size = await spool_stream(file, 'secluded-file-')
+                    delete = True
+                return await self._upload(account_id, group_id, path, name or path.name, md5, size, folder_id, timeout)
+            finally:
+                self.active -= 1
+                if delete and not path is None:
+                    path.unlink(missing_ok=True)
+
+    async def _upload(
+        self,
+        account_id: str,
+        group_id: str,
+        path: Path,
+        name: str,
+        md5: str,
+        size: int,
+        folder_id: Optional[str],
+        timeout: Optional[float]
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        file = await loop.run_in_executor(None, open, path, 'rb')
+        try:
+            offset = 0
+            while True:
+                chunk = await loop.run_in_executor(None, _read_at, file, offset, self.chunk_size)
+                data = group_file_upload_data(account_id, group_id, name, md5, size, offset, chunk, folder_id)
+                result = await self._retry(lambda: self.request(account_id, data, timeout))
+                self.uploaded_bytes += len(chunk)
+                next_offset = _next_offset(result)
+                offset = offset + len(chunk) if next_offset is None else next_offset
+                if offset >= size:
+                    return result
+        finally:
+            file.close()
+
+    async def download(
+        self,
+        account_id: str,
+        group_id: str,
+        file_id: str,
+        path: Union[str, Path],
+        md5: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Path:
+        """下载群文件到 path, 先写入 path.part, 校验 MD5 后改名"""
+        path = Path(path)
+        async with self._slots:
+            self.active += 1
+            try:
+                return await self._download(account_id, group_id, file_id, path, md5, timeout)
+            finally:
+                self.active -= 1
+
+    async def _download(
+        self,
+        account_id: str,
+        group_id: str,
+        file_id: str,
+        path: Path,
+        md5: Optional[str],
+        timeout: Optional[float]
+    ) -> Path:
+        loop = asyncio.get_running_loop()
+        part = path.with_name(path.name + '.part')
+        digest = hashlib.md5()
+        offset = 0
+        if part.exists():
+            # 上次中断留下的部分, 计入 MD5 后接着下载
+            offset = await loop.run_in_executor(None, hash_into, part, digest)
+            log(
+                'INFO',
+                f'从 {offset} 字节处继续下载 {path.name}'
+            )
+        size: Optional[int] = None
+        file = await loop.run_in_executor(None, open, part, 'ab')
+        try:
+            while size is None or offset < size:
+                data = group_file_download_data(account_id, group_id, file_id, offset, self.chunk_size)
+                result = await self._retry(lambda: self.request(account_id, data, timeout))
+                if not isinstance(result, dict) or not isinstance(result.get('GroupFile'), str):
+                    raise ActionFailed(result)
+                if not result.get('Size') is None:
+                    size = int(result['Size'])
+                if md5 is None:
+                    md5 = result.get('MD5')
+                if not size is None and offset > size:
+                    # 留下的 .part 比文件还大, 不是这个文件的内容, 从头下载
+                    log(
+                        'WARNING',
+                        f'{part.name} 有 {offset} 字节, 超过文件大小 {size}, 重新下载'
+                    )
+                    await loop.run_in_executor(None, file.truncate, 0)
+                    digest = hashlib.md5()
+                    offset = 0
+                    continue
+                if not size is None and offset >= size:
+                    # .part 已经是完整的文件, 例如上次在改名前中断
+                    break
+                chunk = base64.b64decode(result['GroupFile'])
+                if not chunk:
+                    if size is None:
+                        # 服务端不给出文件大小时以空分片结束
+                        break
+                    raise NetworkError(f'下载 {path.name} 不完整: {offset}/{size}')
+                await loop.run_in_executor(None, file.write, chunk)
+                digest.update(chunk)
+                offset += len(chunk)
+                self.downloaded_bytes += len(chunk)
+        finally:
+            file.close()
+        if not md5 is None and digest.hexdigest() != md5.lower():
+            # 内容不对时不能再接着使用
+            part.unlink(missing_ok=True)
+            raise ActionFailed({'status': False, 'error': f'{path.name} 的 MD5 校验失败', 'MD5': digest.hexdigest()})
+        await loop.run_in_executor(None, os.replace, part, path)
+        return path
+
+    async def _retry(self, func: Callable[[], Awaitable[_T]]) -> _T:
+        """断线或超时时退避后重试, 操作失败(ActionFailed)不重试"""
+        attempt = 0
+        while True:
+            try:
+                return await func()
+            except NetworkError as e:
+                if attempt >= self.retries:
+                    raise
+                delay = min(_MAX_RETRY_INTERVAL, self.retry_interval * 2 ** attempt)
+                attempt += 1
+                self.retried += 1
+                log(
+                    'WARNING',
+                    f'分片传输失败, {delay:.1f}秒后第 {attempt} 次重试',
+                    e
+                )
+                await asyncio.sleep(delay)
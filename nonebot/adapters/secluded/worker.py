@@ -0,0 +1,493 @@
+"""多进程模式: 主进程持有 Secluded 连接, 事件交给子进程中的处理函数
+
+主进程用启动自己的命令行再启动 N 个子进程, 子进程使用 ~none 驱动器并加载同样的插件,
+插件的启动, 关闭和 Bot 连接钩子默认只在主进程中运行;
+双方通过本地 socket 交换带长度前缀的消息, 每条消息为 (类型, JSON 头, 原始字节)
+"""
+import asyncio
+import os
+import secrets
+import socket
+import struct
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from nonebot.utils import escape_tag
+
+from .codec import Codec
+from .dispatcher import route_session
+from .exception import ActionFailed, NetworkError
+from .log import log
+
+# 子进程从这个环境变量中取得 "地址|序号|token"
+WORKER_ENV = 'SECLUDED_WORKER'
+
+# 子进程 -> 主进程: 上线, 处理完若干事件, 发包并等待应答, 交给发送调度器发送, 查询消息历史
+HELLO, DONE, CALL, SEND, HISTORY = 1, 2, 3, 4, 5
+# 主进程 -> 子进程: 事件, 调用结果, Bot 上线, Bot 下线
+EVENT, RESULT, CONNECT, DISCONNECT = 11, 12, 13, 14
+
+_HEAD = struct.Struct('!BII')
+_START_TIMEOUT = 60
+_STOP_TIMEOUT = 10
+_RESTART_DELAY = 1
+
+# 子进程以 python -c 运行, 忽略 nonebot.init() 中传入的 driver 后按原来的方式运行脚本/模块/代码
+_BOOTSTRAP = '''
+import os, runpy, sys
+import nonebot
+_init = nonebot.init
+def _worker_init(**kwargs):
+    for key in [i for i in kwargs if i.lower() == 'driver']:
+        del kwargs[key]
+    _init(**kwargs)
+nonebot.init = _worker_init
+mode, target = sys.argv[1:3]
+if mode == 'module':
+    sys.argv = [target, *sys.argv[3:]]
+    sys.path[0] = os.getcwd()
+    runpy.run_module(target, run_name='__main__', alter_sys=True)
+elif mode == 'command':
+    sys.argv = ['-c', *sys.argv[3:]]
+    exec(compile(target, '<string>', 'exec'), {'__name__': '__main__'})
+else:
+    sys.argv = [target, *sys.argv[3:]]
+    sys.path[0] = os.path.dirname(os.path.abspath(target))
+    runpy.run_path(target, run_name='__main__')
+'''
+
+# 主进程收到子进程的调用时执行: (类型, JSON 头, 原始字节) -> 结果
+CallHandler = Callable[[int, list, bytes], Awaitable[Any]]
+# 当前在线的账号, 子进程上线时逐个通知
+AccountsGetter = Callable[[], Iterable[str]]
+
+
+class _Channel:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, codec: Codec):
+        self.reader = reader
+        self.writer = writer
+        self.codec = codec
+
+    def write(self, kind: int, header: Optional[list] = None, body: bytes = b''):
+        head = b'' if header is None else self.codec.dumps(header)
+        # 部分 Python 3.12 版本的 writelines 会把空的 bytes 留在发送缓冲区中, 之后连接一直无法关闭
+        self.writer.writelines([i for i in (_HEAD.pack(kind, len(head), len(body)), head, body) if i])
+
+    async def read(self) -> tuple[int, list, bytes]:
+        kind, head_size, body_size = _HEAD.unpack(await self.reader.readexactly(_HEAD.size))
+        data = await self.reader.readexactly(head_size + body_size)
+        header = self.codec.loads(data[:head_size]) if head_size else []
+        return kind, header, data[head_size:]
+
+    def close(self):
+        self.writer.close()
+
+
+def split_command(argv: list[str]) -> Optional[tuple[list[str], str, str, list[str]]]:
+    """把 sys.orig_argv 拆成 (解释器参数, 启动方式, 脚本/模块/代码, 其余参数), 无法识别时返回 None
+
+    启动方式为 path, module 或 command, 分别对应 python bot.py, python -m bot 和 python -c ...
+    """
+    i = 1
+    while i < len(argv):
+        arg = argv[i]
+        if arg == '--':
+            return (argv[1:i], 'path', argv[i + 1], argv[i + 2:]) if i + 1 < len(argv) else None
+        if arg == '-' or not arg.startswith('-'):
+            break
+        if arg.startswith('--'):
+            i += 2 if arg == '--check-hash-based-pycs' else 1
+            continue
+        # 单字母参数可以连写, 例如 -uWignore 或 -Bm bot
+        for j in range(1, len(arg)):
+            flag = arg[j]
+            if not flag in 'WXcm':
+                continue
+            if j + 1 < len(arg):
+                value, rest = arg[j + 1:], i + 1
+            elif i + 1 < len(argv):
+                value, rest = argv[i + 1], i + 2
+            else:
+                return None
+            if flag in 'WX':
+                i = rest
+                break
+            options = [*argv[1:i], f'-{arg[1:j]}'] if j > 1 else argv[1:i]
+            return options, 'module' if flag == 'm' else 'command', value, argv[rest:]
+        else:
+            i += 1
+    if i >= len(argv) or argv[i] == '-':
+        return None
+    return argv[1:i], 'path', argv[i], argv[i + 1:]
+
+
+def hook_filter(register: Callable[[Any], Any], allowed: tuple[str, ...]) -> Callable[[Any], Any]:
+    """包装 driver.on_startup 等注册函数, 只注册所在模块以 allowed 中某一项开头的钩子"""
+    def wrapper(func: Any) -> Any:
+        module = getattr(func, '__module__', None) or ''
+        if f'{module}.'.startswith(allowed):
+            return register(func)
+        name = getattr(func, '__qualname__', func)
+        log(
+            'DEBUG',
+            f'子进程中不运行钩子 {escape_tag(f"{module}.{name}")}'
+        )
+        return func
+    return wrapper
+
+
+def _error_header(call_id: int, e: Exception) -> list:
+    if isinstance(e, ActionFailed):
+        return [call_id, 'ActionFailed', e.response]
+    return [call_id, 'NetworkError', str(e) or type(e).__name__]
+
+
+def _raise_error(header: list):
+    _, name, detail = header
+    if name == 'ActionFailed':
+        raise ActionFailed(detail)
+    raise NetworkError(detail)
+
+
+@dataclass
+class _Worker:
+    index: int
+    process: Optional[asyncio.subprocess.Process] = None
+    channel: Optional[_Channel] = None
+    # 已发给子进程但还没处理完的事件数
+    inflight: int = 0
+    restarts: int = 0
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class WorkerPool:
+    """在主进程中启动和管理子进程, 把事件按会话分给子进程
+
+    同一个 session_id 的事件总是交给同一个子进程, 保证按顺序处理;
+    每个子进程最多有 capacity 个没处理完的事件, 达到上限后 full 为 True, 与 EventDispatcher 相同
+    """
+
+    def __init__(self, processes: int, capacity: int, codec: Codec, handle_call: CallHandler, accounts: AccountsGetter):
+        self.processes = max(1, processes)
+        self.capacity = max(1, capacity)
+        self.codec = codec
+        self.handle_call = handle_call
+        self.accounts = accounts
+        self._workers = [_Worker(i) for i in range(self.processes)]
+        self._token = secrets.token_hex(16)
+        self._address = ''
+        self._tempdir: Optional[tempfile.TemporaryDirectory] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._room = asyncio.Event()
+        self._room.set()
+        # 所有子进程都没有在途事件
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks: set[asyncio.Task] = set()
+        self._stopping = False
+        self._args: list[str] = []
+
+    async def start(self):
+        """启动子进程, 等待所有子进程上线"""
+        if hasattr(socket, 'AF_UNIX'):
+            self._tempdir = tempfile.TemporaryDirectory(prefix='secluded-')
+            path = os.path.join(self._tempdir.name, 'worker.sock')
+            self._server = await asyncio.start_unix_server(self._accept, path)
+            self._address = f'unix:{path}'
+        else:
+            self._server = await asyncio.start_server(self._accept, '127.0.0.1', 0)
+            self._address = f'tcp:127.0.0.1:{self._server.sockets[0].getsockname()[1]}'
+        command = split_command(sys.orig_argv)
+        if command is None:
+            log(
+                'WARNING',
+                f'无法识别启动命令 {sys.orig_argv}, 子进程直接以原命令行启动, 请不要在 nonebot.init() 中传入 driver'
+            )
+            self._args = sys.orig_argv[1:]
+        else:
+            options, mode, target, args = command
+            self._args = [*options, '-c', _BOOTSTRAP, mode, target, *args]
+        for worker in self._workers:
+            self._spawn(self._supervise(worker))
+        try:
+            await asyncio.wait_for(asyncio.gather(*(i.ready.wait() for i in self._workers)), _START_TIMEOUT)
+        except asyncio.TimeoutError:
+            log(
+                'WARNING',
+                f'{_START_TIMEOUT} 秒内只有 {sum(i.ready.is_set() for i in self._workers)}/{self.processes} 个子进程上线'
+            )
+        else:
+            log(
+                'INFO',
+                f'{self.processes} 个子进程已上线'
+            )
+
+    async def stop(self):
+        """关闭通信后子进程会自行退出, 超时后强制结束"""
+        self._stopping = True
+        if not self._server is None:
+            self._server.close()
+        for worker in self._workers:
+            if not worker.channel is None:
+                worker.channel.close()
+        processes = [i.process for i in self._workers if not i.process is None and i.process.returncode is None]
+        try:
+            await asyncio.wait_for(asyncio.gather(*(i.wait() for i in processes)), _STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            for process in processes:
+                if process.returncode is None:
+                    process.kill()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if not self._tempdir is None:
+            self._tempdir.cleanup()
+        self._room.set()
+        self._idle.set()
+
+    @property
+    def qsize(self) -> int:
+        """已发给子进程但还没处理完的事件数"""
+        return sum(i.inflight for i in self._workers)
+
+    @property
+    def pending(self) -> int:
+        return self.qsize
+
+    @property
+    def full(self) -> bool:
+        return not self._room.is_set()
+
+    async def drain(self):
+        """关闭前等待已交给子进程的事件全部处理完, 此后退出的子进程不再重新启动"""
+        self._stopping = True
+        await self._idle.wait()
+
+    @property
+    def up(self) -> list[bool]:
+        return [not i.channel is None for i in self._workers]
+
+    async def wait_room(self):
+        await self._room.wait()
+
+    def put(self, session_id: str, raw: bytes) -> bool:
+        """把收到的原始包交给处理这个会话的子进程, 由子进程解析, 子进程不在线或已满时返回 False"""
+        worker = self._workers[route_session(session_id, self.processes)]
+        if worker.channel is None or worker.inflight >= self.capacity:
+            return False
+        worker.channel.write(EVENT, None, raw)
+        worker.inflight += 1
+        self._idle.clear()
+        if worker.inflight >= self.capacity:
+            self._room.clear()
+        return True
+
+    def broadcast(self, kind: int, header: list):
+        for worker in self._workers:
+            if not worker.channel is None:
+                worker.channel.write(kind, header)
+
+    def _spawn(self, coro: Awaitable[Any]):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _update_room(self):
+        if all(i.inflight < self.capacity for i in self._workers):
+            self._room.set()
+        if not self.qsize:
+            self._idle.set()
+
+    async def _supervise(self, worker: _Worker):
+        """子进程退出后重新启动"""
+        env = {
+            **os.environ,
+            'DRIVER': '~none',
+            WORKER_ENV: f'{self._address}|{worker.index}|{self._token}'
+        }
+        while not self._stopping:
+            worker.process = await asyncio.create_subprocess_exec(sys.executable, *self._args, env=env)
+            code = await worker.process.wait()
+            if self._stopping:
+                return
+            log(
+                'ERROR',
+                f'子进程 {worker.index} 退出, 返回值 {code}, {_RESTART_DELAY} 秒后重新启动'
+            )
+            await asyncio.sleep(_RESTART_DELAY)
+            worker.restarts += 1
+
+    async def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """每个子进程的连接一个任务, 关闭时由 stop 取消"""
+        task = asyncio.current_task()
+        assert not task is None
+        self._tasks.add(task)
+        try:
+            await self._serve(_Channel(reader, writer, self.codec))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._tasks.discard(task)
+
+    async def _serve(self, channel: _Channel):
+        try:
+            kind, header, _ = await channel.read()
+            if kind != HELLO or header[1] != self._token or not 0 <= header[0] < self.processes:
+                raise ValueError('握手失败')
+        except Exception as e:
+            log(
+                'WARNING',
+                '拒绝了一个子进程连接',
+                e
+            )
+            channel.close()
+            return
+        worker = self._workers[header[0]]
+        worker.channel = channel
+        worker.inflight = 0
+        if worker.restarts:
+            log(
+                'INFO',
+                f'子进程 {worker.index} 重新上线'
+            )
+        worker.ready.set()
+        for account_id in self.accounts():
+            channel.write(CONNECT, [account_id])
+        try:
+            while True:
+                kind, header, body = await channel.read()
+                if kind == DONE:
+                    worker.inflight = max(0, worker.inflight - header[0])
+                    self._update_room()
+                else:
+                    self._spawn(self._call(channel, kind, header, body))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if worker.channel is channel:
+                worker.channel = None
+                worker.inflight = 0
+                worker.ready.clear()
+                self._update_room()
+            channel.close()
+
+    async def _call(self, channel: _Channel, kind: int, header: list, body: bytes):
+        call_id = header[0]
+        try:
+            result = await self.handle_call(kind, header, body)
+        except Exception as e:
+            channel.write(RESULT, _error_header(call_id, e))
+        else:
+            channel.write(RESULT, [call_id], self.codec.dumps(result))
+
+
+class WorkerClient:
+    """子进程与主进程的连接, 转发调用并接收事件"""
+
+    def __init__(self, address: str, index: int, token: str, codec: Codec):
+        self.address = address
+        self.index = index
+        self.token = token
+        self.codec = codec
+        self._channel: Optional[_Channel] = None
+        self._task: Optional[asyncio.Task] = None
+        self._seq = 0
+        self._pending: dict[int, asyncio.Future] = {}
+        # 处理完还没通知主进程的事件数
+        self._done = 0
+
+    @classmethod
+    def from_env(cls, codec: Codec) -> Optional['WorkerClient']:
+        value = os.environ.get(WORKER_ENV)
+        if not value:
+            return None
+        address, index, token = value.split('|')
+        return cls(address, int(index), token, codec)
+
+    async def start(
+        self,
+        on_event: Callable[[bytes], None],
+        on_bot: Callable[[str, bool], None],
+        on_close: Callable[[], None]
+    ):
+        scheme, _, rest = self.address.partition(':')
+        if scheme == 'unix':
+            reader, writer = await asyncio.open_unix_connection(rest)
+        else:
+            host, _, port = rest.rpartition(':')
+            reader, writer = await asyncio.open_connection(host, int(port))
+        self._channel = _Channel(reader, writer, self.codec)
+        self._channel.write(HELLO, [self.index, self.token])
+        self._task = asyncio.create_task(self._run(on_event, on_bot, on_close))
+
+    async def stop(self):
+        if not self._task is None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if not self._channel is None:
+            self._channel.close()
+
+    async def _run(
+        self,
+        on_event: Callable[[bytes], None],
+        on_bot: Callable[[str, bool], None],
+        on_close: Callable[[], None]
+    ):
+        assert not self._channel is None
+        try:
+            while True:
+                kind, header, body = await self._channel.read()
+                if kind == EVENT:
+                    on_event(body)
+                elif kind == RESULT:
+                    future = self._pending.pop(header[0], None)
+                    if future is None or future.done():
+                        continue
+                    if len(header) > 1:
+                        try:
+                            _raise_error(header)
+                        except Exception as e:
+                            future.set_exception(e)
+                    else:
+                        future.set_result(self.codec.loads(body))
+                elif kind in (CONNECT, DISCONNECT):
+                    on_bot(header[0], kind == CONNECT)
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            log(
+                'WARNING',
+                f'子进程 {self.index} 与主进程的连接已断开',
+                e
+            )
+        finally:
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(NetworkError('与主进程的连接已断开'))
+            on_close()
+
+    def done(self):
+        """一个事件处理完, 同一轮事件循环中处理完的事件合并通知主进程"""
+        self._done += 1
+        if self._done == 1:
+            asyncio.get_running_loop().call_soon(self._flush_done)
+
+    def _flush_done(self):
+        if not self._channel is None and self._done:
+            self._channel.write(DONE, [self._done])
+        self._done = 0
+
+    async def call(self, kind: int, header: list, body: bytes) -> Any:
+        """发给主进程执行, header 的第一项由这里填入调用 id"""
+        if self._channel is None:
+            raise NetworkError('没有连接到主进程')
+        self._seq += 1
+        call_id = self._seq
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending[call_id] = future
+        self._channel.write(kind, [call_id, *header], body)
+        try:
+            return await future
+        finally:
+            self._pending.pop(call_id, None)
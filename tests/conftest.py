@@ -0,0 +1,58 @@
+import asyncio
+import inspect
+from pathlib import Path
+
+import pytest
+import nonebot
+import nonebot.adapters
+
+# 直接测试仓库中的代码, 不需要先安装
+nonebot.adapters.__path__.insert(0, str(Path(__file__).parent.parent / 'nonebot' / 'adapters'))
+
+nonebot.init(driver='~websockets')
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem: pytest.Function):
+    """协程测试函数在新的事件循环中运行, 不依赖 pytest-asyncio"""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    funcargs = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**funcargs))
+    return True
+
+
+@pytest.fixture
+def make_adapter(monkeypatch: pytest.MonkeyPatch):
+    """用给定的配置项创建 Adapter, 配置项写法与 .env 中相同"""
+    def make(**config):
+        from nonebot.adapters.secluded import Adapter
+
+        driver = nonebot.get_driver()
+        config.setdefault('secluded_host', 'ws://127.0.0.1:1')
+        config.setdefault('secluded_token', 'token')
+        for key, value in config.items():
+            monkeypatch.setattr(driver.config, key, value, raising=False)
+        return Adapter(driver)
+    return make
+
+
+def push(account: str = '10001', group_id: str = '123', user_id: str = '42', msg_id: str = '1', *segments: dict) -> dict:
+    """群消息推送包"""
+    return {
+        'seq': 0,
+        'cmd': 'PushOicqMsg',
+        'data': [
+            {
+                'Account': account,
+                'Group': 'Group',
+                'GroupId': group_id,
+                'GroupName': '测试群',
+                'Uin': user_id,
+                'UinName': '群友',
+                'OpName': '群名片',
+                'MsgId': msg_id
+            },
+            *(segments or ({'Text': '你好'},))
+        ]
+    }
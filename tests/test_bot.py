@@ -0,0 +1,59 @@
+import asyncio
+from contextlib import aclosing
+
+from nonebot.adapters.secluded import Bot
+
+
+def make_bot(make_adapter, monkeypatch, pages: dict[str, object]) -> tuple[Bot, list[asyncio.Task]]:
+    """按 Offset 返回 pages 中的应答, 没有的页一直等待"""
+    adapter = make_adapter()
+    bot = Bot(adapter, '10001')
+    queries: list[asyncio.Task] = []
+
+    def query(op, timeout=None, **fields):
+        task = asyncio.ensure_future(run(fields['Offset']))
+        queries.append(task)
+        return task
+
+    async def run(offset):
+        await asyncio.sleep(0)
+        result = pages.get(offset)
+        if result is None:
+            await asyncio.Event().wait()
+        return result
+
+    async def query_history(*args):
+        return None
+
+    monkeypatch.setattr(bot, '_query', query)
+    monkeypatch.setattr(adapter, 'query_history', query_history)
+    return bot, queries
+
+
+def messages(*msg_ids: str) -> list:
+    return [[{'MsgId': i, 'Uin': '42'}, {'Text': i}] for i in msg_ids]
+
+
+async def test_break_cancels_prefetch(make_adapter, monkeypatch):
+    """提前结束时取消正在预取的下一页"""
+    bot, queries = make_bot(make_adapter, monkeypatch, {'0': messages('1', '2')})
+    message = await bot.get_history_message('123', '1')
+    assert not message is None and message.msg_id == '1'
+    assert len(queries) == 2
+    await asyncio.sleep(0)
+    assert queries[1].cancelled()
+
+
+async def test_close_iterator_cancels_prefetch(make_adapter, monkeypatch):
+    bot, queries = make_bot(make_adapter, monkeypatch, {'0': messages('1', '2')})
+    async with aclosing(bot.iter_group_msg_cache('123')) as cached:
+        async for message in cached:
+            break
+    await asyncio.sleep(0)
+    assert queries[1].cancelled()
+
+
+async def test_all_pages(make_adapter, monkeypatch):
+    bot, queries = make_bot(make_adapter, monkeypatch, {'0': messages('1', '2'), '2': messages('3'), '3': []})
+    assert [i.msg_id async for i in bot.iter_group_msg_cache('123')] == ['1', '2', '3']
+    assert len(queries) == 3
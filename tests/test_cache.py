@@ -0,0 +1,95 @@
+import json
+
+from nonebot.adapters.secluded import cache as cache_module
+from nonebot.adapters.secluded.cache import TTLCache
+
+from conftest import push
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'monotonic', clock)
+    cache: TTLCache[str, int] = TTLCache(10, 60)
+    cache.set('a', 1)
+    clock.now += 30
+    cache.set('b', 2)
+    clock.now += 40
+    assert cache.get('a') is None
+    assert not 'a' in cache
+    assert cache.get('b') == 2
+    assert len(cache) == 1
+
+
+def test_touch(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'monotonic', clock)
+    cache: TTLCache[str, int] = TTLCache(10, 60)
+    cache.set('a', 1)
+    clock.now += 50
+    assert cache.touch('a') == 1
+    clock.now += 50
+    assert cache.get('a') == 1
+    clock.now += 20
+    assert cache.touch('a') is None
+
+
+def test_lru():
+    """超出容量时淘汰最久没有访问的项"""
+    cache: TTLCache[str, int] = TTLCache(2, 60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert 'a' in cache
+    assert not 'b' in cache
+    assert 'c' in cache
+
+
+def test_add_pop(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'monotonic', clock)
+    cache: TTLCache[str, int] = TTLCache(10, 60)
+    assert cache.add('a', 1)
+    assert not cache.add('a', 2)
+    assert cache.get('a') == 1
+    clock.now += 61
+    # 过期后可以重新写入
+    assert cache.add('a', 3)
+    assert cache.pop('a') == 3
+    assert cache.pop('a', 0) == 0
+
+
+async def test_dedup(make_adapter, monkeypatch):
+    """重连后重复推送的 MsgId 只处理一次, 不同群的相同 MsgId 不受影响"""
+    adapter = make_adapter(secluded_dedup_size=16)
+    conn = adapter.connections[0]
+    forwarded = []
+    monkeypatch.setattr(adapter, '_forward', lambda recv, raw: forwarded.append(recv['data'][0]['MsgId']))
+    try:
+        for data in (push(msg_id='1'), push(msg_id='2'), push(msg_id='1'), push(group_id='456', msg_id='1')):
+            await adapter._handle_frame(conn, json.dumps(data))
+        assert forwarded == ['1', '2', '1']
+        assert adapter._m_duplicates.get() == 1
+    finally:
+        adapter._handle_disconnect(conn)
+
+
+async def test_dedup_disabled(make_adapter, monkeypatch):
+    adapter = make_adapter(secluded_dedup_size=0)
+    conn = adapter.connections[0]
+    forwarded = []
+    monkeypatch.setattr(adapter, '_forward', lambda recv, raw: forwarded.append(recv['data'][0]['MsgId']))
+    try:
+        for _ in range(2):
+            await adapter._handle_frame(conn, json.dumps(push(msg_id='1')))
+        assert forwarded == ['1', '1']
+    finally:
+        adapter._handle_disconnect(conn)
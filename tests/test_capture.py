@@ -0,0 +1,32 @@
+from nonebot.adapters.secluded.capture import capture_files, read_capture
+
+
+class FakeSocket:
+    def __init__(self, adapter):
+        self.adapter = adapter
+        self.sent: list[dict] = []
+
+    async def send_text(self, data: str):
+        self.sent.append(self.adapter.codec.loads(data))
+
+    async def receive(self) -> str:
+        return self.adapter.codec.dumps({'seq': self.sent[-1]['seq'], 'cmd': 'Response', 'data': {'status': True}}).decode()
+
+
+async def test_token_not_captured(make_adapter, tmp_path):
+    """上线包照常带 token 发出, 抓包文件中的 token 被替换"""
+    path = tmp_path / 'capture.gz'
+    adapter = make_adapter(secluded_capture_path=str(path), secluded_token='secret')
+    assert not adapter.capture is None
+    adapter.capture.start()
+    conn = adapter.connections[0]
+    conn.ws = FakeSocket(adapter)
+    try:
+        await adapter._sync_oicq(conn)
+    finally:
+        await adapter.capture.stop()
+    assert conn.ws.sent[0]['data']['token'] == 'secret'
+    frames = list(read_capture(capture_files(str(path))))
+    assert [i.direction for i in frames] == ['send', 'recv']
+    assert not b'secret' in frames[0].raw
+    assert adapter.codec.loads(frames[0].raw)['data']['token'] == '***'
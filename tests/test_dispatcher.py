@@ -0,0 +1,139 @@
+import asyncio
+import random
+
+from nonebot.adapters.secluded.dispatcher import EventDispatcher, route
+
+
+class FakeEvent:
+    def __init__(self, session_id: str, index: int):
+        self.session_id = session_id
+        self.index = index
+
+    def get_session_id(self) -> str:
+        return self.session_id
+
+    def get_type(self) -> str:
+        return 'message'
+
+
+class FakeBot:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.handled: list[FakeEvent] = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def handle_event(self, event: FakeEvent):
+        await self.gate.wait()
+        if self.delay:
+            await asyncio.sleep(random.uniform(0, self.delay))
+        self.handled.append(event)
+
+
+def test_route_is_stable():
+    event = FakeEvent('10001/123/42', 0)
+    assert route(event, 8) == route(FakeEvent('10001/123/42', 1), 8)
+    assert route(FakeEvent('', 0), 8) == 0
+
+
+async def test_session_order():
+    dispatcher = EventDispatcher(4, 5)
+    dispatcher.start()
+    bot = FakeBot(0.002)
+    sessions = [f'10001/{i}/42' for i in range(10)]
+    for i in range(200):
+        # 与读取连接时相同, 积压满时等待
+        while dispatcher.full:
+            await dispatcher.wait_room()
+        assert dispatcher.put(bot, FakeEvent(sessions[i % 10], i)) # type: ignore
+    await asyncio.wait_for(dispatcher.join(), 5)
+    await dispatcher.stop()
+
+    assert len(bot.handled) == 200
+    for session in sessions:
+        indexes = [i.index for i in bot.handled if i.session_id == session]
+        assert indexes == sorted(indexes)
+
+
+async def test_backlog_full_and_drop():
+    dispatcher = EventDispatcher(1, 2)
+    dispatcher.start()
+    bot = FakeBot()
+    bot.gate.clear()
+    events = [FakeEvent('s', i) for i in range(6)]
+
+    assert dispatcher.put(bot, events[0]) # type: ignore
+    # worker 取走第一个事件后阻塞在处理函数中
+    await asyncio.sleep(0)
+    assert dispatcher.active == 1
+    assert dispatcher.put(bot, events[1]) and dispatcher.put(bot, events[2]) # type: ignore
+    assert not dispatcher.full
+    # 队列满后放进积压, 积压达到上限时 full
+    assert dispatcher.put(bot, events[3]) and dispatcher.put(bot, events[4]) # type: ignore
+    assert dispatcher.full
+    assert dispatcher.qsize == 4
+    room = asyncio.ensure_future(dispatcher.wait_room())
+    await asyncio.sleep(0)
+    assert not room.done()
+    # 积压已满时丢弃
+    assert not dispatcher.put(bot, events[5]) # type: ignore
+
+    bot.gate.set()
+    await asyncio.wait_for(room, 1)
+    await asyncio.wait_for(dispatcher.join(), 1)
+    assert [i.index for i in bot.handled] == [0, 1, 2, 3, 4]
+    assert not dispatcher.full
+    await dispatcher.stop()
+
+
+async def test_handler_exception_does_not_stop_worker():
+    class FailingBot(FakeBot):
+        async def handle_event(self, event):
+            if event.index == 0:
+                raise ValueError('boom')
+            await super().handle_event(event)
+
+    done = []
+    dispatcher = EventDispatcher(1, 5, on_done=lambda: done.append(1))
+    dispatcher.start()
+    bot = FailingBot()
+    dispatcher.put(bot, FakeEvent('s', 0)) # type: ignore
+    dispatcher.put(bot, FakeEvent('s', 1)) # type: ignore
+    await asyncio.wait_for(dispatcher.join(), 1)
+    assert [i.index for i in bot.handled] == [1]
+    assert len(done) == 2
+    await dispatcher.stop()
+
+
+async def test_stop_discards_queued_events():
+    dispatcher = EventDispatcher(1, 5)
+    dispatcher.start()
+    bot = FakeBot()
+    bot.gate.clear()
+    for i in range(4):
+        dispatcher.put(bot, FakeEvent('s', i)) # type: ignore
+    await asyncio.sleep(0)
+    await asyncio.wait_for(dispatcher.stop(), 1)
+    bot.gate.set()
+    await asyncio.sleep(0.01)
+    assert bot.handled == []
+
+
+async def test_reader_resumes_when_call_waits_for_response(make_adapter):
+    """事件队列满时暂停读取, 但有调用在等待应答包时必须恢复读取, 否则处理函数与读取互相等待"""
+    adapter = make_adapter()
+
+    class FullEvents:
+        full = True
+
+        async def wait_room(self):
+            await asyncio.Event().wait()
+
+    adapter.events = FullEvents()
+    conn = adapter.connections[0]
+    paused = asyncio.ensure_future(adapter._wait_dispatch_room(conn))
+    await asyncio.sleep(0.05)
+    assert not paused.done()
+    # 处理函数发出调用, 登记等待应答包
+    conn.expect(conn.next_seq())
+    await asyncio.wait_for(paused, 1)
@@ -0,0 +1,101 @@
+import pytest
+
+from nonebot.adapters.secluded import encoder as encoder_module
+from nonebot.adapters.secluded.codec import get_codec
+from nonebot.adapters.secluded.encoder import MessageEncoder, register_segment_encoder
+from nonebot.adapters.secluded.message import Message, MessageSegment
+
+
+def baseline(account_id: str, group_id, message: Message, reply=None) -> dict:
+    """改用编码函数之前 message_to_origin 的结果"""
+    first = {'Account': account_id}
+    if not group_id is None:
+        first['Group'] = 'Group'
+        first['GroupId'] = group_id
+    if not reply is None:
+        first['Reply'] = reply
+    data = [first]
+    for i in message:
+        match i.type:
+            case 'text':
+                data.append({'Text': i.data['text']})
+            case 'img':
+                data.append({'Img': i.data['url']})
+            case 'gif':
+                data.append({'Gif': i.data['url']})
+            case 'at':
+                data.append({'AtName': i.data['user_name'], 'AtUin': i.data['user_id']})
+            case 'at_all':
+                data.append({'AtAll': 'AtAll'})
+    return {'seq': 7, 'cmd': 'SendOicqMsg', 'rsp': True, 'data': data}
+
+
+MESSAGES = [
+    Message(),
+    Message([MessageSegment('text', {'text': '收到'})]),
+    Message([
+        MessageSegment('at', {'user_name': '路过的群友', 'user_id': '2233445566'}),
+        MessageSegment('text', {'text': ' 今天晴, "气温" 18~26℃\n适合出门 \\o/ 。'}),
+        MessageSegment('img', {'url': 'https://example.com/weather.png'}),
+        MessageSegment('gif', {'url': 'https://example.com/a.gif'}),
+        MessageSegment('at_all', {})
+    ])
+]
+
+
+def codecs() -> list[str]:
+    names = ['json']
+    for name in ('orjson', 'msgspec'):
+        try:
+            get_codec(name) # type: ignore
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def items(value):
+    """比较时包括键的顺序"""
+    if isinstance(value, dict):
+        return [(k, items(v)) for k, v in value.items()]
+    if isinstance(value, list):
+        return [items(i) for i in value]
+    return value
+
+
+@pytest.mark.parametrize('codec_name', codecs())
+@pytest.mark.parametrize('message', MESSAGES)
+@pytest.mark.parametrize('group_id', ['123', None])
+@pytest.mark.parametrize('reply', ['99', None])
+def test_baseline(codec_name, message, group_id, reply):
+    codec = get_codec(codec_name)
+    frame = MessageEncoder(codec).encode('10001', group_id, message, reply)
+    assert items(codec.loads(frame.encode(7))) == items(baseline('10001', group_id, message, reply))
+
+
+@pytest.mark.parametrize('codec_name', codecs())
+def test_uploaded_media(codec_name):
+    codec = get_codec(codec_name)
+    message = Message([MessageSegment('img', {'url': 'u', 'md5': 'abc', 'size': 10})])
+    frame = MessageEncoder(codec).encode('10001', '123', message)
+    assert items(codec.loads(frame.encode(1))['data'][1]) == [('Img', 'u'), ('MD5', 'abc'), ('Size', '10')]
+
+
+@pytest.mark.parametrize('codec_name', codecs())
+def test_registered_encoders(monkeypatch, codec_name):
+    """注册的编码函数可以添加新类型, 也可以覆盖内置类型, 返回 None 时丢弃"""
+    monkeypatch.setattr(encoder_module, 'SEGMENT_ENCODERS', dict(encoder_module.SEGMENT_ENCODERS))
+    register_segment_encoder('xml')(lambda segment: {'Xml': segment.data['xml']})
+    register_segment_encoder('text')(lambda segment: None if segment.data['text'] == '' else {'Text': segment.data['text'].upper()})
+    codec = get_codec(codec_name)
+    message = Message([
+        MessageSegment('text', {'text': 'hi'}),
+        MessageSegment('text', {'text': ''}),
+        MessageSegment('xml', {'xml': '<a/>'}), # type: ignore
+        MessageSegment('unknown', {}), # type: ignore
+        MessageSegment('at_all', {})
+    ])
+    encoder = MessageEncoder(codec)
+    data = codec.loads(encoder.encode('10001', None, message).encode(1))['data']
+    assert data[1:] == [{'Text': 'HI'}, {'Xml': '<a/>'}, {'AtAll': 'AtAll'}]
+    assert [dict(i) for i in encoder.segments(message)] == data[1:]
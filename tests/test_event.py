@@ -0,0 +1,100 @@
+import copy
+import pickle
+
+import pytest
+from nonebot.compat import model_dump
+
+from nonebot.adapters.secluded import Adapter
+from nonebot.adapters.secluded.event import MessageEvent
+from nonebot.adapters.secluded.message import Message, MessageSegment
+from nonebot.adapters.secluded.parser import SEGMENT_DECODERS, register_segment_decoder
+
+from conftest import push
+
+
+def parse() -> MessageEvent:
+    event = Adapter.payload_to_event(push('10001', '123', '42', '7', {'Text': 'hi'}, {'AtUin': '10001', 'AtName': 'bot'})) # type: ignore
+    assert isinstance(event, MessageEvent)
+    return event
+
+
+def expected() -> Message:
+    return Message([
+        MessageSegment('text', {'text': 'hi'}),
+        MessageSegment('at', {'user_name': 'bot', 'user_id': '10001', 'text': '@bot'})
+    ])
+
+
+def copies(event: MessageEvent) -> list[MessageEvent]:
+    return [
+        copy.copy(event),
+        copy.deepcopy(event),
+        event.model_copy() if hasattr(event, 'model_copy') else event.copy(),
+        pickle.loads(pickle.dumps(event))
+    ]
+
+
+@pytest.mark.parametrize('decoded', [False, True])
+def test_copy(decoded: bool):
+    """复制和 pickle 之后消息仍然可以读取, 无论之前是否已经解析"""
+    event = parse()
+    if decoded:
+        assert list(event.message) == list(expected())
+    for item in copies(event):
+        assert (item.account_id, item.group_id, item.user_id, item.msg_id) == ('10001', '123', '42', '7')
+        assert list(item.message) == list(expected())
+        assert item.get_plaintext() == 'hi'
+
+
+def test_deepcopy_is_independent():
+    event = parse()
+    item = copy.deepcopy(event)
+    item.message.append(MessageSegment('text', {'text': '!'}))
+    assert list(event.message) == list(expected())
+
+
+def test_dump():
+    event = parse()
+    data = model_dump(event)
+    assert data['msg_id'] == '7'
+    assert [(i['type'], i['data']) for i in data['message']] == [(i.type, i.data) for i in expected()]
+
+
+def test_constructed_event():
+    event = MessageEvent(
+        message=expected(),
+        account_id='10001',
+        user_id='42',
+        user_name='群友',
+        user_group_name='群名片',
+        group_id='123',
+        group_name='测试群',
+        msg_id='7'
+    )
+    for item in copies(event):
+        assert list(item.message) == list(expected())
+    assert len(model_dump(event)['message']) == 2
+
+
+SEGMENTS = [
+    [{'Text': 'hi'}, {'AtName': 'bot', 'AtUin': '10001'}],
+    # 按第一个 key 解析, 图片的说明文字和文本中的 AtUin 都不算
+    [{'Img': 'u', 'Text': 'caption'}, {'Text': 'hi', 'AtUin': '10001'}],
+    [{'AtUin': '42'}, {}, {'Unknown': '1', 'Text': 'x'}],
+    [{'Xml': '<a/>'}, {'Text': 'hi'}]
+]
+
+
+@pytest.mark.parametrize('segments', SEGMENTS)
+@pytest.mark.parametrize('custom', [False, True])
+def test_lazy_matches_decoded(segments: list, custom: bool, monkeypatch: pytest.MonkeyPatch):
+    """未解析时的 get_plaintext 和 is_tome 与解析之后的结果相同"""
+    monkeypatch.setattr('nonebot.adapters.secluded.parser.SEGMENT_DECODERS', dict(SEGMENT_DECODERS))
+    if custom:
+        register_segment_decoder('Xml')(lambda segment: MessageSegment('at', {'user_name': '', 'user_id': '10001', 'text': segment['Xml']}))
+        register_segment_decoder('Img')(lambda segment: MessageSegment('text', {'text': segment['Img']}))
+    lazy = Adapter.payload_to_event(push('10001', '123', '42', '7', *segments)) # type: ignore
+    decoded = Adapter.payload_to_event(push('10001', '123', '42', '7', *segments)) # type: ignore
+    assert isinstance(lazy, MessageEvent) and isinstance(decoded, MessageEvent)
+    decoded.get_message()
+    assert (lazy.get_plaintext(), lazy.is_tome()) == (decoded.get_plaintext(), decoded.is_tome())
@@ -0,0 +1,64 @@
+import pytest
+from nonebot.drivers import Request
+from nonebot.drivers.websockets import WebSocket as WebsocketsWebSocket
+from nonebot.exception import WebSocketClosed
+from websockets.exceptions import ConnectionClosedError
+from websockets.frames import Close
+
+
+class FakeConnection:
+    """websockets 的连接, 记录收发时的参数"""
+
+    def __init__(self, frames: list):
+        self.frames = frames
+        self.sent: list[tuple[bytes, dict]] = []
+        self.close_code = None
+
+    async def send(self, data, **kwargs):
+        self.sent.append((data, kwargs))
+
+    async def recv(self, **kwargs):
+        assert kwargs == {'decode': False}
+        if not self.frames:
+            raise ConnectionClosedError(Close(1011, 'bye'), None)
+        return self.frames.pop(0)
+
+
+class FakeWebSocket:
+    """其他驱动的 WebSocket"""
+
+    def __init__(self, frames: list):
+        self.frames = frames
+        self.sent: list = []
+
+    async def receive(self):
+        return self.frames.pop(0)
+
+    async def send_text(self, data: str):
+        self.sent.append(data)
+
+
+async def test_websockets_driver_bytes(make_adapter):
+    """websockets 驱动下直接以 bytes 收发文本帧"""
+    adapter = make_adapter()
+    conn = adapter.connections[0]
+    raw = adapter.codec.dumps({'seq': 1, 'cmd': 'SendOicqMsg', 'data': [{'Text': '你好'}]})
+    ws = FakeConnection([raw])
+    conn.ws = WebsocketsWebSocket(request=Request('GET', 'ws://127.0.0.1:1'), websocket=ws) # type: ignore
+    await adapter._send_frame(conn, raw)
+    assert ws.sent == [(raw, {'text': True})]
+    assert await adapter._recv_frame(conn) == raw
+    with pytest.raises(WebSocketClosed) as e:
+        await adapter._recv_frame(conn)
+    assert e.value.code == 1011
+
+
+async def test_other_driver_text(make_adapter):
+    adapter = make_adapter()
+    conn = adapter.connections[0]
+    raw = adapter.codec.dumps({'seq': 1, 'cmd': 'SendOicqMsg', 'data': [{'Text': '你好'}]})
+    ws = FakeWebSocket([raw.decode()])
+    conn.ws = ws
+    await adapter._send_frame(conn, raw)
+    assert ws.sent == [raw.decode()]
+    assert adapter.codec.loads(await adapter._recv_frame(conn)) == adapter.codec.loads(raw)
@@ -0,0 +1,62 @@
+from nonebot.adapters.secluded.codec import get_codec
+from nonebot.adapters.secluded.history import MessageHistory
+
+from conftest import push
+
+
+def make_history(max_entries: int = 3, max_bytes: int = 1 << 20, max_groups: int = 10) -> MessageHistory:
+    return MessageHistory(get_codec('json'), max_entries, max_bytes, max_groups)
+
+
+def add(history: MessageHistory, group_id: str, *msg_ids: str, text: str = '你好'):
+    for msg_id in msg_ids:
+        history.add(push('10001', group_id, '42', msg_id, {'Text': text})['data'])
+
+
+def msg_ids(history: MessageHistory, group_id: str) -> list[str]:
+    return [i[0]['MsgId'] for i in history.recent('10001', group_id, 100)]
+
+
+def test_ring_buffer():
+    """超过条数上限时淘汰最早的消息, 每个群分别计数"""
+    history = make_history(max_entries=3)
+    add(history, '123', '1', '2', '3', '4', '5')
+    add(history, '456', 'a', 'b')
+    assert msg_ids(history, '123') == ['3', '4', '5']
+    assert msg_ids(history, '456') == ['a', 'b']
+    assert history.messages == 5
+    assert history.find('10001', '123', '2') is None
+    found = history.find('10001', '123', '4')
+    assert not found is None
+    assert (found[0]['MsgId'], found[0]['Uin'], found[0]['UinName'], found[1:]) == ('4', '42', '群友', [{'Text': '你好'}])
+    assert [i[0]['MsgId'] for i in history.recent('10001', '123', 2)] == ['4', '5']
+
+    # 重复推送的消息不重复记录
+    add(history, '123', '5')
+    assert msg_ids(history, '123') == ['3', '4', '5']
+
+
+def test_max_bytes():
+    """超过字节数上限时淘汰最早的消息, 但至少保留最新的一条"""
+    history = make_history(max_entries=100, max_bytes=1000)
+    add(history, '123', '1', '2', '3', '4', text='x' * 200)
+    kept = msg_ids(history, '123')
+    assert kept and kept[-1] == '4' and len(kept) < 4
+    assert history.bytes <= 1000
+    add(history, '123', '5', text='x' * 2000)
+    assert msg_ids(history, '123') == ['5']
+    assert history.messages == 1
+
+
+def test_max_groups():
+    """超过群数上限时淘汰最久没有收到消息的群, 统计同时减去"""
+    history = make_history(max_groups=2)
+    add(history, '1', 'a', 'b')
+    add(history, '2', 'c')
+    add(history, '1', 'd')
+    add(history, '3', 'e')
+    assert msg_ids(history, '2') == []
+    assert msg_ids(history, '1') == ['a', 'b', 'd']
+    assert msg_ids(history, '3') == ['e']
+    assert history.messages == 4
+    assert history.bytes == sum(i.size for group in history._groups.values() for i in group.entries)
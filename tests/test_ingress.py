@@ -0,0 +1,54 @@
+import pytest
+
+from nonebot.adapters.secluded.ingress import IngressFilter
+
+from conftest import push
+
+
+def private(user_id: str = '42') -> list[dict]:
+    return [{'Account': '10001', 'Uin': user_id, 'UinName': '好友', 'MsgId': '1'}, {'Text': '你好'}]
+
+
+@pytest.mark.parametrize('data, expected', [
+    (push(group_id='123')['data'], None),
+    (push(group_id='456')['data'], 'allow_groups'),
+    # 配置中的数字按字符串比较
+    (push(group_id='789')['data'], None),
+    # 私聊没有群号, 不受群规则限制
+    (private(), None)
+])
+def test_allow_groups(data, expected):
+    assert IngressFilter(allow_groups=['123', 789]).match(data) == expected
+
+
+def test_deny_groups_and_users():
+    ingress = IngressFilter(deny_groups=['456'], deny_users=[10000])
+    assert ingress.match(push(group_id='123')['data']) is None
+    assert ingress.match(push(group_id='456')['data']) == 'deny_groups'
+    assert ingress.match(push(user_id='10000')['data']) == 'deny_users'
+    assert ingress.match(private('10000')) == 'deny_users'
+    assert ingress.match(private()) is None
+
+
+def test_deny_events():
+    """可以按事件类型或事件 key 丢弃"""
+    first = {'Account': '10001', 'Uin': '42', 'GroupId': '123'}
+    ingress = IngressFilter(deny_events=['notice', 'GroupBeatABeat'])
+    assert ingress.match(push()['data']) is None
+    assert ingress.match([first, {'GroupMemberSignout': '1'}]) == 'deny_events'
+    assert ingress.match([first, {'GroupBeatABeat': '1'}]) == 'deny_events'
+    assert IngressFilter(deny_events=['message']).match(push()['data']) == 'deny_events'
+
+
+async def test_adapter_drops_before_parsing(make_adapter, monkeypatch):
+    assert make_adapter().ingress is None
+    adapter = make_adapter(secluded_ingress_deny_users=['10000'])
+    assert not adapter.ingress is None
+    forwarded = []
+    monkeypatch.setattr(adapter, '_forward', lambda recv, raw: forwarded.append(recv['data'][0]['Uin']))
+    conn = adapter.connections[0]
+    conn.accounts.add('10001')
+    for user_id in ('42', '10000', '43'):
+        await adapter._handle_frame(conn, adapter.codec.dumps(push(user_id=user_id, msg_id=user_id)))
+    assert forwarded == ['42', '43']
+    assert adapter._m_ingress.get('deny_users') == 1
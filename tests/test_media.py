@@ -0,0 +1,112 @@
+import asyncio
+import base64
+import hashlib
+
+import pytest
+
+from nonebot.adapters.secluded.cache import SingleFlight
+from nonebot.adapters.secluded.exception import ActionFailed
+from nonebot.adapters.secluded.media import MediaUploader
+from nonebot.adapters.secluded.message import Message, MessageSegment
+
+
+class Server:
+    """记录上传的分片, 收到最后一个分片后返回引用地址"""
+
+    def __init__(self, url: bool = True):
+        self.url = url
+        self.chunks: list[dict[str, str]] = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def request(self, account_id: str, data: list[dict[str, str]]):
+        await self.gate.wait()
+        self.chunks.append(data[0])
+        end = int(data[0]['Offset']) + len(base64.b64decode(data[0]['CacheNewFile']))
+        if self.url and end >= int(data[0]['Size']):
+            return {'Url': f'url-{data[0]["MD5"]}'}
+        return {}
+
+
+async def test_prepare():
+    server = Server()
+    uploader = MediaUploader(server.request, 4, 16, 60)
+    file = b'0123456789'
+    md5 = hashlib.md5(file).hexdigest()
+    message = await uploader.prepare('10001', Message([
+        MessageSegment('text', {'text': 'hi'}),
+        MessageSegment('img', {'file': file})
+    ]))
+    assert list(message) == [
+        MessageSegment('text', {'text': 'hi'}),
+        MessageSegment('img', {'url': f'url-{md5}', 'md5': md5, 'size': 10})
+    ]
+    assert [i['Offset'] for i in server.chunks] == ['0', '4', '8']
+    assert uploader.uploaded_bytes == 10
+
+    # 再次发送时使用缓存
+    await uploader.prepare('10001', Message(MessageSegment('gif', {'file': file})))
+    assert len(server.chunks) == 3
+    assert uploader.hits == 1
+
+
+async def test_upload_once():
+    """同一内容同时发给多个群时只上传一次"""
+    server = Server()
+    server.gate.clear()
+    uploader = MediaUploader(server.request, 1024, 16, 60)
+    tasks = [
+        asyncio.ensure_future(uploader.prepare('10001', Message(MessageSegment('img', {'file': b'image'}))))
+        for _ in range(5)
+    ]
+    await asyncio.sleep(0)
+    server.gate.set()
+    results = await asyncio.gather(*tasks)
+    assert len(server.chunks) == 1
+    assert uploader.uploads == 1
+    assert len({i[0].data['url'] for i in results}) == 1
+
+
+async def test_missing_url():
+    """应答中没有引用地址时报错, 不把 MD5 当作地址"""
+    server = Server(url=False)
+    uploader = MediaUploader(server.request, 4, 16, 60)
+    with pytest.raises(ActionFailed):
+        await uploader.prepare('10001', Message(MessageSegment('img', {'file': b'0123456789'})))
+    assert len(uploader.cache) == 0
+
+
+async def test_single_flight():
+    flight: SingleFlight[str] = SingleFlight()
+    calls = []
+    gate = asyncio.Event()
+
+    async def func():
+        calls.append(1)
+        await gate.wait()
+        return 'done'
+
+    first = asyncio.ensure_future(flight.run('a', func))
+    second = asyncio.ensure_future(flight.run('a', func))
+    await asyncio.sleep(0)
+    assert 'a' in flight
+    # 一个调用方被取消不影响其他调用方
+    first.cancel()
+    await asyncio.sleep(0)
+    gate.set()
+    assert await second == 'done'
+    assert first.cancelled()
+    assert calls == [1]
+    assert not 'a' in flight
+
+
+async def test_single_flight_error():
+    flight: SingleFlight[str] = SingleFlight()
+
+    async def fail():
+        raise ValueError('boom')
+
+    results = await asyncio.gather(flight.run('a', fail), flight.run('a', fail), return_exceptions=True)
+    assert all(isinstance(i, ValueError) for i in results)
+    # 失败后不保留, 下次重新执行
+    assert not 'a' in flight
@@ -0,0 +1,79 @@
+from nonebot.adapters.secluded import Bot
+from nonebot.adapters.secluded import cache as cache_module
+from nonebot.adapters.secluded.metadata import MetadataCache
+from nonebot.adapters.secluded.model import MemberInfo
+
+from conftest import push
+
+
+def observe(cache: MetadataCache, user_id: str, name: str = '群友'):
+    first = push(user_id=user_id)['data'][0]
+    first['UinName'] = name
+    cache.observe(first)
+
+
+def test_passive_member():
+    """从推送中得到的成员不知道是否为管理员"""
+    cache = MetadataCache(100, 60)
+    observe(cache, '42')
+    member = cache.member('10001', '123', '42')
+    assert not member is None
+    assert (member.user_name, member.is_admin) == ('群友', None)
+    assert cache.group('10001', '123').group_name == '测试群' # type: ignore
+
+
+def test_member_list_with_passive_entry():
+    """列表中的成员被淘汰后又从推送中得到时, 列表不再完整"""
+    cache = MetadataCache(100, 60)
+    cache.fill_members('10001', '123', [MemberInfo('123', '42', is_admin=True), MemberInfo('123', '43', is_admin=False)])
+    assert [i.user_id for i in cache.member_list('10001', '123')] == ['42', '43'] # type: ignore
+
+    # 已有的成员被推送更新时保留管理员信息
+    observe(cache, '42', '新昵称')
+    member = cache.member('10001', '123', '42')
+    assert (member.user_name, member.is_admin) == ('新昵称', True) # type: ignore
+    assert not cache.member_list('10001', '123') is None
+
+    cache.members.pop(('10001', '123', '43'))
+    observe(cache, '43')
+    assert cache.member_list('10001', '123') is None
+
+
+async def test_get_member_info(make_adapter, monkeypatch):
+    adapter = make_adapter(secluded_metadata_size=100)
+    assert not adapter.metadata is None
+    bot = Bot(adapter, '10001')
+    fetched = []
+
+    async def fetch_member_list(group_id):
+        fetched.append(group_id)
+        members = [MemberInfo(group_id, '42', '群友', is_admin=True)]
+        adapter.metadata.fill_members('10001', group_id, members)
+        return members
+
+    monkeypatch.setattr(bot, '_fetch_member_list', fetch_member_list)
+    observe(adapter.metadata, '42')
+    member = await bot.get_member_info('123', '42')
+    assert not member is None and member.is_admin
+    assert fetched == ['123']
+    # 之后直接使用缓存
+    assert (await bot.get_member_info('123', '42')).is_admin # type: ignore
+    assert (await bot.get_member_list('123'))[0].user_id == '42'
+    assert fetched == ['123']
+
+
+def test_entries_gauge(make_adapter, monkeypatch):
+    """指标只统计未过期的项"""
+    clock = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: clock[0])
+    adapter = make_adapter(secluded_metadata_size=100, secluded_metadata_ttl=60)
+    assert not adapter.metadata is None
+    gauge = adapter.metrics.get('secluded_metadata_entries')
+    assert not gauge is None
+    observe(adapter.metadata, '42')
+    clock[0] += 30
+    observe(adapter.metadata, '43')
+    assert gauge.snapshot() == {('group',): 1, ('member',): 2, ('friend',): 0}
+    clock[0] += 40
+    assert gauge.snapshot() == {('group',): 1, ('member',): 1, ('friend',): 0}
+    assert len(adapter.metadata.members) == 2
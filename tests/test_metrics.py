@@ -0,0 +1,27 @@
+from nonebot.adapters.secluded.metrics import MetricsRegistry
+
+
+def test_render_types():
+    registry = MetricsRegistry()
+    frames = registry.counter('frames_total', '收到的包数', ('cmd',))
+    registry.gauge('queue_depth', '等待处理的事件数', lambda: {(): 3})
+    registry.func_counter('reconnects_total', '重连次数', lambda: {('ws://a',): 2}, ('host',))
+    frames.inc('PushOicqMsg')
+    frames.inc('PushOicqMsg')
+    lines = registry.render().splitlines()
+    assert '# TYPE frames_total counter' in lines
+    assert 'frames_total{cmd="PushOicqMsg"} 2' in lines
+    assert '# TYPE queue_depth gauge' in lines
+    assert 'queue_depth 3' in lines
+    assert '# TYPE reconnects_total counter' in lines
+    assert 'reconnects_total{host="ws://a"} 2' in lines
+
+
+def test_adapter_metric_types(make_adapter):
+    """只增不减的总数以 counter 类型导出, 名字以 _total 结尾"""
+    adapter = make_adapter()
+    assert adapter.adapter_config.secluded_metrics_path is None
+    for line in adapter.metrics.render().splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split()
+            assert name.endswith('_total') == (kind == 'counter'), line
@@ -0,0 +1,106 @@
+import pytest
+
+from nonebot.adapters.secluded import Adapter
+from nonebot.adapters.secluded.event import MessageEvent, RequestEvent, NoticeEvent, MetaEvent, OtherEvent
+from nonebot.adapters.secluded.message import MessageSegment
+from nonebot.adapters.secluded.parser import (
+    EVENT_KEY_INDEX,
+    SEGMENT_DECODERS,
+    classify,
+    decode_message,
+    is_liveness,
+    register_segment_decoder
+)
+
+from conftest import push
+
+
+@pytest.mark.parametrize(('data', 'expected'), [
+    ([{'Uin': '1'}, {'Text': 'a'}], ('message', 'Text')),
+    ([{'Uin': '1'}, {'GroupNotify': '1'}], ('request', 'GroupNotify')),
+    ([{'Uin': '1'}, {'GroupNewMember': '1'}], ('notice', 'GroupNewMember')),
+    ([{'Heartbeat': 1}], ('meta_event', 'Heartbeat')),
+    ([{'Uin': '1'}, {'Xml': '<a/>'}], ('other_event', None)),
+    ([], ('other_event', None)),
+    # 同时出现多种 key 时取优先级最高的, 与 key 出现的顺序无关
+    ([{'Heartbeat': 1}, {'GroupNewMember': '1'}, {'NewFriendNotify': '1'}, {'Img': 'u'}], ('message', 'Img')),
+    ([{'Online': '1'}, {'GroupBeatABeat': '1'}], ('notice', 'GroupBeatABeat')),
+    ([{'System': '1', 'GroupNotify': '1'}], ('request', 'GroupNotify')),
+])
+def test_classify(data, expected):
+    assert classify(data) == expected
+
+
+def test_event_key_index_priorities():
+    ranks = {'message': 4, 'request': 3, 'notice': 2, 'meta_event': 1}
+    for key, (event_type, rank) in EVENT_KEY_INDEX.items():
+        assert ranks[event_type] == rank, key
+
+
+def test_is_liveness():
+    assert is_liveness([{'Account': '1', 'Heartbeat': 1}])
+    assert is_liveness([{'Account': '1'}, {'Heartbeating': '1'}])
+    assert not is_liveness([{'Account': '1'}, {'Text': 'Heartbeat'}])
+
+
+def test_decode_builtin_segments():
+    message = decode_message([
+        {'Text': '你好'},
+        {'AtUin': '10001', 'AtName': '机器人'},
+        {'AtName': '只有名字'},
+        {'AtAll': 'AtAll'},
+        {'Img': 'https://example.com/a.png'},
+        {'Gif': 'https://example.com/b.gif'},
+        # 没有解析函数和空的消息段被丢弃
+        {'Xml': '<a/>'},
+        {}
+    ])
+    assert list(message) == [
+        MessageSegment('text', {'text': '你好'}),
+        MessageSegment('at', {'user_name': '机器人', 'user_id': '10001', 'text': '@机器人'}),
+        MessageSegment('at', {'user_name': '只有名字', 'user_id': '', 'text': '@只有名字'}),
+        MessageSegment('at_all', {}),
+        MessageSegment('img', {'type': 'img', 'url': 'https://example.com/a.png'}),
+        MessageSegment('img', {'type': 'gif', 'url': 'https://example.com/b.gif'}),
+    ]
+
+
+def test_register_segment_decoder(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr('nonebot.adapters.secluded.parser.SEGMENT_DECODERS', dict(SEGMENT_DECODERS))
+
+    @register_segment_decoder('Xml', 'Json')
+    def _(segment):
+        return MessageSegment('text', {'text': next(iter(segment.values()))})
+
+    # 覆盖内置的解析函数, 返回 None 时丢弃
+    register_segment_decoder('Img')(lambda segment: None)
+
+    message = decode_message([{'Xml': '<a/>'}, {'Json': '{}'}, {'Img': 'u'}, {'Text': 't'}])
+    assert [i.data['text'] for i in message] == ['<a/>', '{}', 't']
+
+
+def test_payload_to_event_types():
+    event = Adapter.payload_to_event(push('10001', '123', '42', '7', {'Text': 'hi'}, {'AtUin': '10001', 'AtName': 'bot'})) # type: ignore
+    assert isinstance(event, MessageEvent)
+    assert (event.account_id, event.group_id, event.user_id, event.msg_id) == ('10001', '123', '42', '7')
+    assert event.get_plaintext() == 'hi'
+    assert event.is_tome()
+    assert event.get_session_id() == '10001/123/42'
+
+    first = {'Account': '10001', 'Uin': '42', 'UinName': '群友'}
+    request = Adapter.payload_to_event({'seq': 0, 'cmd': 'PushOicqMsg', 'data': [{**first, 'GroupNotify': '1'}]}) # type: ignore
+    assert isinstance(request, RequestEvent)
+    assert request.get_event_name() == 'group_new_member_request'
+    assert request.get_user_id() == '42'
+
+    notice = Adapter.payload_to_event({'seq': 0, 'cmd': 'PushOicqMsg', 'data': [first, {'GroupMemberSignout': '1'}]}) # type: ignore
+    assert isinstance(notice, NoticeEvent)
+    assert notice.get_event_name() == 'group_member_signout'
+
+    meta = Adapter.payload_to_event({'seq': 0, 'cmd': 'PushOicqMsg', 'data': [{'Account': '10001', 'Heartbeat': 1}]}) # type: ignore
+    assert isinstance(meta, MetaEvent)
+
+    # 命中了事件类型但没有对应的事件描述时作为 other_event
+    other = Adapter.payload_to_event({'seq': 0, 'cmd': 'PushOicqMsg', 'data': [first, {'GroupBeatABeat': '1'}]}) # type: ignore
+    assert isinstance(other, OtherEvent)
+    assert isinstance(Adapter.payload_to_event({'seq': 0, 'cmd': 'PushOicqMsg', 'data': [first, {'Xml': '<a/>'}]}), OtherEvent) # type: ignore
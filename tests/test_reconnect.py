@@ -0,0 +1,84 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from nonebot.adapters.secluded.exception import NetworkError
+
+
+class FakeWebSocket:
+    closed = False
+
+    async def close(self, *args):
+        self.closed = True
+
+
+async def test_reconnect_after_clean_exit(make_adapter, monkeypatch):
+    """连接没有抛出异常就结束时也按退避间隔重连"""
+    adapter = make_adapter(secluded_reconnect_interval=0.01)
+    conn = adapter.connections[0]
+    attempts = []
+
+    @asynccontextmanager
+    async def websocket(request):
+        attempts.append(request)
+        yield FakeWebSocket()
+
+    async def run_connection(conn):
+        return None
+
+    async def sync_oicq(conn):
+        return None
+
+    monkeypatch.setattr(adapter, 'websocket', websocket)
+    monkeypatch.setattr(adapter, '_sync_oicq', sync_oicq)
+    monkeypatch.setattr(adapter, '_run_connection', run_connection)
+    task = asyncio.ensure_future(adapter._forward_ws(conn))
+    try:
+        for _ in range(100):
+            if len(attempts) >= 3:
+                break
+            await asyncio.sleep(0.01)
+        assert not task.done()
+        assert len(attempts) >= 3
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def test_backoff_grows_and_resets(make_adapter, monkeypatch):
+    adapter = make_adapter(secluded_reconnect_interval=0.01, secluded_reconnect_max_interval=0.04)
+    conn = adapter.connections[0]
+    delays = []
+    monkeypatch.setattr('nonebot.adapters.secluded.adapter.random.uniform', lambda a, b: 1)
+
+    @asynccontextmanager
+    async def websocket(request):
+        # 前三次连接失败, 之后上线
+        if len(delays) < 3:
+            raise NetworkError('连接失败')
+        yield FakeWebSocket()
+
+    async def run_connection(conn):
+        raise NetworkError('连接中断')
+
+    async def sync_oicq(conn):
+        return None
+
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(adapter, 'websocket', websocket)
+    monkeypatch.setattr(adapter, '_sync_oicq', sync_oicq)
+    monkeypatch.setattr(adapter, '_run_connection', run_connection)
+    monkeypatch.setattr('nonebot.adapters.secluded.adapter.asyncio.sleep', sleep)
+    task = asyncio.ensure_future(adapter._forward_ws(conn))
+    try:
+        while len(delays) < 5:
+            await real_sleep(0)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    # 每次失败翻倍, 不超过上限; 上线后从初始间隔重新开始
+    assert delays[:5] == [0.01, 0.02, 0.04, 0.01, 0.01]
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from nonebot.adapters.secluded.exception import NetworkError
+
+
+class FakeSocket:
+    """记录发出的包, 不自动应答"""
+
+    def __init__(self, adapter):
+        self.adapter = adapter
+        self.sent: list[dict] = []
+
+    async def send_text(self, data: str):
+        self.sent.append(self.adapter.codec.loads(data))
+
+
+def connect(adapter) -> FakeSocket:
+    conn = adapter.connections[0]
+    conn.ws = FakeSocket(adapter)
+    conn.set_connected()
+    adapter._routes['10001'] = conn
+    return conn.ws
+
+
+def request(op: str) -> dict:
+    return {'seq': 0, 'cmd': 'SendOicqMsg', 'rsp': True, 'data': [{'Account': '10001', op: '1'}]}
+
+
+def response(adapter, seq: int, data: dict) -> bytes:
+    return adapter.codec.dumps({'seq': seq, 'cmd': 'Response', 'data': data})
+
+
+async def test_responses_matched_by_seq(make_adapter):
+    """应答包乱序到达时按 seq 交给对应的调用"""
+    adapter = make_adapter()
+    ws = connect(adapter)
+    conn = adapter.connections[0]
+    first = asyncio.ensure_future(adapter._request(request('A'), 1))
+    second = asyncio.ensure_future(adapter._request(request('B'), 1))
+    await asyncio.sleep(0)
+    seqs = {'A' if 'A' in i['data'][0] else 'B': i['seq'] for i in ws.sent}
+    assert len(set(seqs.values())) == 2
+    assert conn.pending == 2
+
+    await adapter._handle_frame(conn, response(adapter, seqs['B'], {'op': 'B'}))
+    await adapter._handle_frame(conn, response(adapter, seqs['A'], {'op': 'A'}))
+    assert await first == {'op': 'A'}
+    assert await second == {'op': 'B'}
+    assert conn.pending == 0
+
+    # 重复或未知的应答包被忽略
+    await adapter._handle_frame(conn, response(adapter, seqs['A'], {'op': 'A'}))
+    assert conn.pending == 0
+
+
+async def test_timeout_forgets_pending(make_adapter):
+    adapter = make_adapter()
+    connect(adapter)
+    conn = adapter.connections[0]
+    with pytest.raises(NetworkError):
+        await adapter._request(request('A'), 0.01)
+    assert conn.pending == 0
+
+
+async def test_disconnect_fails_pending(make_adapter):
+    """连接断开时正在等待应答的调用立即失败, 不等到超时"""
+    adapter = make_adapter()
+    connect(adapter)
+    conn = adapter.connections[0]
+    calls = [asyncio.ensure_future(adapter._request(request(op), 10)) for op in ('A', 'B')]
+    await asyncio.sleep(0)
+    assert conn.pending == 2
+
+    adapter._close_connection(conn)
+    for call in calls:
+        with pytest.raises(NetworkError, match='连接中断'):
+            await asyncio.wait_for(call, 1)
+    assert conn.pending == 0
@@ -0,0 +1,27 @@
+import pytest
+from nonebot.drivers import Request
+
+
+def request(query: str = '', authorization: str | None = None) -> Request:
+    headers = {} if authorization is None else {'Authorization': authorization}
+    return Request('GET', f'ws://127.0.0.1/secluded?id=a{query}', headers=headers)
+
+
+@pytest.mark.parametrize('req, ok', [
+    (request('&access_token=secret'), True),
+    (request(authorization='Bearer secret'), True),
+    (request('&access_token=wrong'), False),
+    (request(authorization='Bearer wrong'), False),
+    (request('&access_token=秘密'), False),
+    (request(), False)
+])
+def test_access_token(make_adapter, req, ok):
+    adapter = make_adapter(secluded_reverse_access_token='secret')
+    assert adapter._check_access_token(req) is ok
+
+
+def test_no_token_rejects(make_adapter):
+    """没有设置 access_token 时不接受任何反向连接"""
+    adapter = make_adapter()
+    assert not adapter._check_access_token(request())
+    assert not adapter._check_access_token(request('&access_token='))
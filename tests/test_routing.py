@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from nonebot.adapters.secluded.exception import NetworkError
+
+HOSTS = ('ws://127.0.0.1:1', 'ws://127.0.0.1:2')
+
+
+class FakeSocket:
+    def __init__(self, adapter):
+        self.adapter = adapter
+        self.sent: list[dict] = []
+
+    async def send_text(self, data: str):
+        self.sent.append(self.adapter.codec.loads(data))
+
+
+def make_routed_adapter(make_adapter, **config):
+    """两条连接都已经连上, 还没有收到任何账号的包"""
+    adapter = make_adapter(secluded_connections=[{'host': HOSTS[1], 'token': 'token'}], **config)
+    assert [i.config.host for i in adapter.connections] == list(HOSTS)
+    for conn in adapter.connections:
+        conn.ws = FakeSocket(adapter)
+        conn.set_connected()
+    return adapter
+
+
+def close(adapter):
+    """断开连接, 注销测试中上线的 Bot"""
+    for conn in adapter.connections:
+        adapter._close_connection(conn)
+
+
+def heartbeat(account_id: str) -> dict:
+    return {'seq': 0, 'cmd': 'PushOicqMsg', 'data': [{'Account': account_id, 'Heartbeat': 1}]}
+
+
+def frame(account_id: str, text: str) -> dict:
+    return {'seq': 0, 'cmd': 'SendOicqMsg', 'rsp': False, 'data': [{'Account': account_id}, {'Text': text}]}
+
+
+async def test_route_by_account(make_adapter):
+    """按收到的包中的 Account 记录账号所在的连接, 发包时从这条连接发出"""
+    adapter = make_routed_adapter(make_adapter)
+    first, second = adapter.connections
+    try:
+        await adapter._handle_frame(first, adapter.codec.dumps(heartbeat('10001')))
+        await adapter._handle_frame(second, adapter.codec.dumps(heartbeat('10002')))
+        assert adapter._routes == {'10001': first, '10002': second}
+        assert set(adapter.bots) == {'10001', '10002'}
+
+        await adapter._request(frame('10002', 'b'))
+        await adapter._request(frame('10001', 'a'))
+        assert [i['data'][1]['Text'] for i in first.ws.sent] == ['a']
+        assert [i['data'][1]['Text'] for i in second.ws.sent] == ['b']
+
+        # 账号换到另一条连接上报后改为从新的连接发出
+        await adapter._handle_frame(second, adapter.codec.dumps(heartbeat('10001')))
+        assert adapter._routes['10001'] is second
+
+        with pytest.raises(NetworkError):
+            await adapter._request(frame('10003', 'c'))
+    finally:
+        close(adapter)
+
+
+async def test_spool_key_by_account(make_adapter, tmp_path):
+    """账号还没有上线时按账号写入离线队列, 上线后从所在的连接重发, 之后按连接保存"""
+    adapter = make_routed_adapter(make_adapter, secluded_spool_path=str(tmp_path / 'spool.db'))
+    assert not adapter.spool is None
+    await adapter.spool.open()
+    second = adapter.connections[1]
+    try:
+        assert adapter._spool_key('10002') == 'account:10002'
+        assert await adapter._request(frame('10002', 'early')) is None
+        assert [i.frame for i in await adapter.spool.pop_all(HOSTS[1])] == []
+
+        await adapter._handle_frame(second, adapter.codec.dumps(heartbeat('10002')))
+        assert adapter._spool_key('10002') == HOSTS[1]
+        await asyncio.gather(*adapter._spool_tasks)
+        assert [i['data'][1]['Text'] for i in second.ws.sent] == ['early']
+        assert await adapter.spool.pop_all('account:10002') == []
+    finally:
+        close(adapter)
+        await adapter.spool.close()
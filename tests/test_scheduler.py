@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+import pytest
+
+from nonebot.adapters.secluded.scheduler import PRIORITY_BULK, PRIORITY_REPLY, OutboundScheduler, TokenBucket
+
+
+class Recorder:
+    def __init__(self):
+        self.sent: list[tuple[str, float]] = []
+
+    async def __call__(self, frame: str, timeout):
+        self.sent.append((frame, time.monotonic()))
+        return frame
+
+
+def test_token_bucket():
+    bucket = TokenBucket(2, 3)
+    now = bucket.last
+    # 开始时有 burst 个令牌
+    for _ in range(3):
+        assert bucket.delay(now) == 0
+        bucket.take()
+    assert bucket.delay(now) == 0.5
+    # 每秒补充 rate 个, 最多补到 burst
+    assert bucket.delay(now + 0.5) == 0
+    assert bucket.delay(now + 100) == 0
+    assert bucket.tokens == 3
+
+
+def test_token_bucket_unlimited():
+    bucket = TokenBucket(0, 1)
+    for _ in range(100):
+        assert bucket.delay(bucket.last) == 0
+        bucket.take()
+
+
+async def test_priority_before_bulk():
+    send = Recorder()
+    scheduler = OutboundScheduler(send)
+    bulk = [asyncio.ensure_future(scheduler.submit('g', f'bulk{i}', PRIORITY_BULK)) for i in range(3)]
+    reply = asyncio.ensure_future(scheduler.submit('g', 'reply', PRIORITY_REPLY))
+    await asyncio.sleep(0)
+    scheduler.start()
+    assert await asyncio.wait_for(reply, 1) == 'reply'
+    await asyncio.wait_for(asyncio.gather(*bulk), 1)
+    await scheduler.stop()
+    assert [i[0] for i in send.sent] == ['reply', 'bulk0', 'bulk1', 'bulk2']
+
+
+async def test_groups_take_turns():
+    send = Recorder()
+    scheduler = OutboundScheduler(send)
+    futures = [asyncio.ensure_future(scheduler.submit('a', f'a{i}')) for i in range(4)]
+    futures += [asyncio.ensure_future(scheduler.submit('b', f'b{i}')) for i in range(2)]
+    await asyncio.sleep(0)
+    scheduler.start()
+    await asyncio.wait_for(asyncio.gather(*futures), 1)
+    await scheduler.stop()
+    # 一个群排了很多消息也不会让其他群一直等待
+    assert [i[0] for i in send.sent] == ['a0', 'b0', 'a1', 'b1', 'a2', 'a3']
+
+
+async def test_group_rate_limit_does_not_block_other_groups():
+    send = Recorder()
+    scheduler = OutboundScheduler(send, group_rate=20, group_burst=1)
+    scheduler.start()
+    start = time.monotonic()
+    await asyncio.wait_for(asyncio.gather(
+        *(scheduler.submit('a', f'a{i}') for i in range(4)),
+        scheduler.submit('b', 'b0')
+    ), 2)
+    await scheduler.stop()
+    sent = dict(send.sent)
+    # 同一个群每 0.05 秒一条
+    assert sent['a3'] - start >= 0.14
+    assert sent['b0'] - start < 0.04
+    assert scheduler.stats['a'].sent == 4
+    assert scheduler.stats['a'].queued == 0
+    assert scheduler.stats['a'].wait_max >= 0.14
+
+
+async def test_global_rate_limit():
+    send = Recorder()
+    scheduler = OutboundScheduler(send, global_rate=20, global_burst=2)
+    scheduler.start()
+    start = time.monotonic()
+    await asyncio.wait_for(asyncio.gather(*(scheduler.submit(str(i), str(i)) for i in range(4))), 2)
+    await scheduler.stop()
+    # 前两条用掉突发额度, 之后每 0.05 秒一条
+    assert send.sent[1][1] - start < 0.04
+    assert send.sent[3][1] - start >= 0.09
+
+
+async def test_cancelled_sender_is_skipped():
+    send = Recorder()
+    scheduler = OutboundScheduler(send)
+    first = asyncio.ensure_future(scheduler.submit('g', 'cancelled'))
+    second = asyncio.ensure_future(scheduler.submit('g', 'kept'))
+    await asyncio.sleep(0)
+    first.cancel()
+    scheduler.start()
+    assert await asyncio.wait_for(second, 1) == 'kept'
+    await scheduler.stop()
+    assert [i[0] for i in send.sent] == ['kept']
+    assert scheduler.qsize == 0
+
+
+async def test_send_error_is_raised_to_sender():
+    async def send(frame, timeout):
+        raise ValueError(frame)
+
+    scheduler = OutboundScheduler(send)
+    scheduler.start()
+    with pytest.raises(ValueError, match='x'):
+        await asyncio.wait_for(scheduler.submit('g', 'x'), 1)
+    await scheduler.stop()
+
+
+async def test_idle_groups_pruned():
+    """队列为空且令牌桶已满的群被删除, 总发送数不变"""
+    send = Recorder()
+    scheduler = OutboundScheduler(send, group_rate=20, group_burst=1, prune_interval=0)
+    scheduler.start()
+    try:
+        await asyncio.wait_for(asyncio.gather(scheduler.submit('a', 'a'), scheduler.submit('b', 'b')), 1)
+        assert set(scheduler.stats) == set(scheduler._buckets) == {'a', 'b'}
+        await asyncio.sleep(0.1)
+        await asyncio.wait_for(scheduler.submit('c', 'c'), 1)
+        # c 刚发出, 令牌桶还没有补满
+        assert set(scheduler.stats) == set(scheduler._buckets) == {'c'}
+        assert scheduler.sent == 3
+    finally:
+        await scheduler.stop()
@@ -0,0 +1,64 @@
+import asyncio
+
+from nonebot.adapters.secluded import Adapter
+
+from conftest import push
+
+
+class FakeBot:
+    """处理 block 中的消息时一直等待, 其余消息立即处理完"""
+
+    def __init__(self, block: set[str]):
+        self.block = block
+        self.handled: list[str] = []
+
+    async def handle_event(self, event):
+        if event.msg_id in self.block:
+            await asyncio.Event().wait()
+        self.handled.append(event.msg_id)
+
+
+async def test_drain_accounting(make_adapter, monkeypatch):
+    """关闭时分别统计处理完, 仍在处理和丢弃的事件, 以及等待期间收到应答的消息"""
+    adapter = make_adapter(secluded_shutdown_timeout=0.2, secluded_dispatch_workers=1)
+    sends = 0
+
+    async def send(frame, timeout):
+        nonlocal sends
+        await asyncio.sleep(0.05)
+        sends += 1
+
+    monkeypatch.setattr(adapter.scheduler, '_send', send)
+    adapter.dispatcher.start()
+    adapter.scheduler.start()
+    try:
+        bot = FakeBot({'2'})
+        for msg_id in ('1', '2', '3', '4'):
+            assert adapter.dispatcher.put(bot, Adapter.payload_to_event(push(msg_id=msg_id))) # type: ignore
+        submit = asyncio.ensure_future(adapter.scheduler.submit('123', {}))
+        await asyncio.sleep(0.01)
+        assert adapter.scheduler.sending == 1
+        assert bot.handled == ['1']
+
+        await adapter._drain()
+        assert submit.done() and sends == 1
+        assert [adapter._m_drain_events.get(i) for i in ('processed', 'running', 'dropped')] == [0, 1, 2]
+        assert [adapter._m_drain_sends.get(i) for i in ('sent', 'spooled', 'dropped')] == [1, 0, 0]
+        assert adapter.dispatcher.qsize == 0
+    finally:
+        await adapter.dispatcher.stop()
+        await adapter.scheduler.stop()
+
+
+async def test_drain_all_processed(make_adapter):
+    adapter = make_adapter(secluded_shutdown_timeout=1)
+    adapter.dispatcher.start()
+    try:
+        bot = FakeBot(set())
+        for msg_id in ('1', '2'):
+            adapter.dispatcher.put(bot, Adapter.payload_to_event(push(msg_id=msg_id))) # type: ignore
+        await adapter._drain()
+        assert sorted(bot.handled) == ['1', '2']
+        assert [adapter._m_drain_events.get(i) for i in ('processed', 'running', 'dropped')] == [2, 0, 0]
+    finally:
+        await adapter.dispatcher.stop()
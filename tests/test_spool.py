@@ -0,0 +1,155 @@
+import asyncio
+
+from nonebot.adapters.secluded import spool as spool_module
+from nonebot.adapters.secluded.spool import OutboundSpool
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def open_spool(tmp_path, max_items: int = 100, ttl: float = 60) -> OutboundSpool:
+    spool = OutboundSpool(str(tmp_path / 'spool.db'), max_items, ttl)
+    await spool.open()
+    return spool
+
+
+async def test_order(tmp_path):
+    spool = await open_spool(tmp_path)
+    try:
+        for i in range(5):
+            await spool.push('a', f'{i}'.encode())
+        await spool.push('b', b'other')
+        assert [i.frame for i in await spool.pop_all('a')] == [b'0', b'1', b'2', b'3', b'4']
+        assert await spool.pop_all('a') == []
+        assert [i.frame for i in await spool.pop_all('b')] == [b'other']
+    finally:
+        await spool.close()
+
+
+async def test_ttl(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(spool_module.time, 'time', clock)
+    spool = await open_spool(tmp_path, ttl=60)
+    try:
+        await spool.push('a', b'old')
+        clock.now += 50
+        await spool.push('a', b'new')
+        clock.now += 20
+        assert [i.frame for i in await spool.pop_all('a')] == [b'new']
+    finally:
+        await spool.close()
+
+
+async def test_max_items(tmp_path):
+    spool = await open_spool(tmp_path, max_items=3)
+    try:
+        for i in range(5):
+            await spool.push('a', f'{i}'.encode())
+        assert [i.frame for i in await spool.pop_all('a')] == [b'2', b'3', b'4']
+    finally:
+        await spool.close()
+
+
+async def test_restore_keeps_created(tmp_path, monkeypatch):
+    """重发失败放回队列的包保留原来的写入时间和顺序"""
+    clock = Clock()
+    monkeypatch.setattr(spool_module.time, 'time', clock)
+    spool = await open_spool(tmp_path, ttl=60)
+    try:
+        await spool.push('a', b'1')
+        await spool.push('a', b'2')
+        clock.now += 40
+        frames = await spool.pop_all('a')
+        await spool.push('a', b'3')
+        await spool.restore('a', frames)
+        clock.now += 10
+        assert [i.frame for i in await spool.pop_all('a')] == [b'1', b'2', b'3']
+
+        await spool.restore('a', frames)
+        clock.now += 20
+        # 从第一次写入算起已经超过有效期
+        assert await spool.pop_all('a') == []
+    finally:
+        await spool.close()
+
+
+async def test_spool_before_first_connect(make_adapter, tmp_path, monkeypatch):
+    """账号第一次上线前的发送按账号保存, 上线后从账号所在的连接重发"""
+    adapter = make_adapter(secluded_spool_path=str(tmp_path / 'spool.db'))
+    assert not adapter.spool is None
+    await adapter.spool.open()
+    sent = []
+
+    async def send_frame(conn, raw):
+        sent.append(adapter.codec.loads(raw))
+
+    monkeypatch.setattr(adapter, '_send_frame', send_frame)
+    try:
+        data = {
+            'seq': 0,
+            'cmd': 'SendOicqMsg',
+            'rsp': True,
+            'data': [{'Account': '10001', 'Group': 'Group', 'GroupId': '123'}, {'Text': '你好'}]
+        }
+        assert await adapter._request(data) is None
+        assert sent == []
+
+        conn = adapter.connections[0]
+        conn.ws = object()
+        adapter._handle_connect(conn, '10001')
+        await asyncio.gather(*adapter._spool_tasks)
+        assert [i['data'] for i in sent] == [data['data']]
+        assert await adapter.spool.pop_all('account:10001') == []
+    finally:
+        adapter._handle_disconnect(conn)
+        await adapter.spool.close()
+
+
+async def test_send_during_replay(make_adapter, tmp_path, monkeypatch):
+    """重发离线消息期间的发送排在重发的消息之后发出, 不会留在离线队列中"""
+    adapter = make_adapter(secluded_spool_path=str(tmp_path / 'spool.db'))
+    assert not adapter.spool is None
+    await adapter.spool.open()
+    conn = adapter.connections[0]
+    adapter._routes['10001'] = conn
+    sent = []
+    late: list[asyncio.Task] = []
+
+    def frame(text: str) -> dict:
+        return {
+            'seq': 0,
+            'cmd': 'SendOicqMsg',
+            'rsp': True,
+            'data': [{'Account': '10001', 'Group': 'Group', 'GroupId': '123'}, {'Text': text}]
+        }
+
+    async def send_frame(conn, raw):
+        data = adapter.codec.loads(raw)
+        sent.append(data['data'][1]['Text'])
+        if not late:
+            late.append(asyncio.ensure_future(adapter._request(frame('new'), 1)))
+        await asyncio.sleep(0)
+        if data['rsp'] and data['seq']:
+            conn.handle_response({'seq': data['seq'], 'cmd': 'Response', 'data': {'status': True}})
+
+    async def read_frames(conn):
+        await late[0]
+
+    monkeypatch.setattr(adapter, '_send_frame', send_frame)
+    monkeypatch.setattr(adapter, '_read_frames', read_frames)
+    try:
+        for i in range(5):
+            await adapter.spool.push(conn.config.host, adapter._encode_frame(frame(f'old{i}'), 0, False))
+        conn.ws = object()
+        conn.state = 'connecting'
+        await adapter._run_connection(conn)
+        assert sent == ['old0', 'old1', 'old2', 'old3', 'old4', 'new']
+        assert await adapter.spool.pop_all(conn.config.host) == []
+    finally:
+        adapter._close_connection(conn)
+        await adapter.spool.close()
@@ -0,0 +1,77 @@
+import base64
+import hashlib
+
+import pytest
+
+from nonebot.adapters.secluded.exception import ActionFailed, NetworkError
+from nonebot.adapters.secluded.transfer import FileTransfer
+
+CONTENT = bytes(range(256)) * 4
+
+
+class Server:
+    """按 Offset 和 Size 返回 content 的分片"""
+
+    def __init__(self, content: bytes = CONTENT, md5: str | None = None, failures: int = 0):
+        self.content = content
+        self.md5 = hashlib.md5(content).hexdigest() if md5 is None else md5
+        self.failures = failures
+        self.offsets: list[int] = []
+
+    async def __call__(self, account_id, data, timeout):
+        if self.failures:
+            self.failures -= 1
+            raise NetworkError('连接中断')
+        offset, size = int(data[0]['Offset']), int(data[0]['Size'])
+        self.offsets.append(offset)
+        return {
+            'GroupFile': base64.b64encode(self.content[offset:offset + size]).decode(),
+            'Size': str(len(self.content)),
+            'MD5': self.md5
+        }
+
+
+def make_transfer(server: Server) -> FileTransfer:
+    return FileTransfer(server, 300, 2, 2, 0)
+
+
+async def download(server: Server, tmp_path, part: bytes | None = None) -> bytes:
+    if not part is None:
+        (tmp_path / 'a.bin.part').write_bytes(part)
+    path = await make_transfer(server).download('10001', '123', 'file', tmp_path / 'a.bin')
+    assert not (tmp_path / 'a.bin.part').exists()
+    return path.read_bytes()
+
+
+async def test_download(tmp_path):
+    server = Server(failures=1)
+    assert await download(server, tmp_path) == CONTENT
+    assert server.offsets == [0, 300, 600, 900]
+
+
+async def test_resume(tmp_path):
+    server = Server()
+    assert await download(server, tmp_path, CONTENT[:500]) == CONTENT
+    assert server.offsets == [500, 800]
+
+
+async def test_complete_part(tmp_path):
+    """.part 已经是完整的文件时直接校验并改名"""
+    server = Server()
+    assert await download(server, tmp_path, CONTENT) == CONTENT
+    assert server.offsets == [len(CONTENT)]
+
+
+async def test_oversized_part(tmp_path):
+    """.part 比文件还大时从头下载"""
+    server = Server()
+    assert await download(server, tmp_path, CONTENT + b'stale') == CONTENT
+    assert server.offsets == [len(CONTENT) + 5, 0, 300, 600, 900]
+
+
+async def test_md5_mismatch(tmp_path):
+    server = Server(md5='0' * 32)
+    with pytest.raises(ActionFailed):
+        await make_transfer(server).download('10001', '123', 'file', tmp_path / 'a.bin')
+    assert not (tmp_path / 'a.bin.part').exists()
+    assert not (tmp_path / 'a.bin').exists()
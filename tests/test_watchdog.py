@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+import pytest
+
+from nonebot.adapters.secluded.exception import NetworkError
+
+
+@pytest.fixture
+def fast_sleep(monkeypatch):
+    """看门狗每秒检查一次, 测试中缩短为 1 毫秒"""
+    sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, 'sleep', lambda delay, *args: sleep(min(delay, 0.001), *args))
+    return sleep
+
+
+async def test_no_ping_while_paused(make_adapter, fast_sleep):
+    """暂停读取期间收不到 pong, 不发 ping 也不因此断开"""
+    adapter = make_adapter(secluded_ping_interval=0.001, secluded_heartbeat_missed=0)
+    conn = adapter.connections[0]
+    pings = []
+
+    async def ping(timeout):
+        pings.append(conn.paused)
+        raise asyncio.TimeoutError
+
+    conn.ping = ping
+    conn.paused = True
+    watchdog = asyncio.ensure_future(adapter._watchdog(conn))
+    await fast_sleep(0.05)
+    assert not watchdog.done()
+    assert pings == []
+
+    conn.paused = False
+    with pytest.raises(NetworkError):
+        await asyncio.wait_for(watchdog, 1)
+    assert pings == [False]
+    assert adapter._m_watchdog.get('ping') == 1
+
+
+async def test_pause_during_ping(make_adapter, fast_sleep):
+    """等待 pong 期间暂停过读取时, 超时不算作连接断开"""
+    adapter = make_adapter(secluded_ping_interval=0.001, secluded_heartbeat_missed=0)
+    conn = adapter.connections[0]
+    pings = 0
+
+    async def ping(timeout):
+        nonlocal pings
+        pings += 1
+        if pings == 1:
+            # 读取暂停后又恢复, 期间的 pong 没有处理
+            conn.paused = True
+            conn.paused = False
+            conn.resumed_at = time.monotonic()
+            raise asyncio.TimeoutError
+        return 0.01
+
+    conn.ping = ping
+    watchdog = asyncio.ensure_future(adapter._watchdog(conn))
+    try:
+        await fast_sleep(0.05)
+        assert not watchdog.done()
+        assert pings > 1
+        assert adapter._m_watchdog.get('ping') == 0
+    finally:
+        watchdog.cancel()
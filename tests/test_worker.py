@@ -0,0 +1,108 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from nonebot.adapters.secluded import worker
+from nonebot.adapters.secluded.codec import get_codec
+from nonebot.adapters.secluded.dispatcher import route
+from nonebot.adapters.secluded.worker import WorkerPool, hook_filter, split_command
+
+from conftest import push
+
+
+@pytest.mark.parametrize('argv, expected', [
+    (['python', 'bot.py'], ([], 'path', 'bot.py', [])),
+    (['python', '-u', '-X', 'dev', 'bot.py', '-v'], (['-u', '-X', 'dev'], 'path', 'bot.py', ['-v'])),
+    (['python', '-Wignore', '-m', 'bot', 'a'], (['-Wignore'], 'module', 'bot', ['a'])),
+    (['python', '-Bm', 'bot'], (['-B'], 'module', 'bot', [])),
+    (['python', '-c', 'print(1)', 'a'], ([], 'command', 'print(1)', ['a'])),
+    (['python', '--', '-bot.py'], ([], 'path', '-bot.py', [])),
+    (['python', '-'], None),
+    (['python', '-u'], None)
+])
+def test_split_command(argv, expected):
+    assert split_command(argv) == expected
+
+
+def test_bootstrap_ignores_driver(tmp_path):
+    """子进程按原来的方式运行脚本, nonebot.init() 中传入的 driver 被环境变量中的 ~none 取代"""
+    script = tmp_path / 'bot.py'
+    script.write_text(
+        'import sys\n'
+        'import nonebot\n'
+        'from nonebot import init\n'
+        "init(driver='~websockets')\n"
+        'print(nonebot.get_driver().type, __name__, sys.argv[1:], sys.path[0] == __file__.rpartition("/")[0])\n'
+    )
+    (tmp_path / 'botmod.py').write_text(script.read_text())
+    env = {**os.environ, 'DRIVER': '~none'}
+    for mode, target in (('path', str(script)), ('module', 'botmod')):
+        result = subprocess.run(
+            [sys.executable, '-c', worker._BOOTSTRAP, mode, target, 'a', 'b'],
+            cwd=tmp_path,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+        assert result.stdout.splitlines()[-1] == "none __main__ ['a', 'b'] True", result.stderr
+
+
+def test_hook_filter():
+    registered = []
+
+    def register(func):
+        registered.append(func)
+        return func
+
+    def hook():
+        pass
+
+    wrapper = hook_filter(register, ('nonebot.', 'nonebot_plugin_orm.'))
+    for module in ('nonebot.adapters.secluded.adapter', 'nonebot_plugin_orm', 'nonebot_plugin_orm.migrate', 'nonebot_plugin_apscheduler', '__main__'):
+        hook.__module__ = module
+        assert wrapper(hook) is hook
+    assert len(registered) == 3
+
+
+async def test_forward_without_parsing(make_adapter, monkeypatch):
+    """多进程模式下主进程只按包头选择子进程, 不解析事件"""
+    adapter = make_adapter(secluded_worker_processes=4)
+    assert not adapter.workers is None
+    put = []
+
+    def payload_to_event(payload):
+        raise AssertionError('不应解析')
+
+    monkeypatch.setattr(adapter, 'payload_to_event', payload_to_event)
+    monkeypatch.setattr(adapter.workers, 'put', lambda session_id, raw: put.append((session_id, raw)) or True)
+    recv = push('10001', '123', '42', '7')
+    raw = adapter.codec.dumps(recv)
+    assert adapter._forward(recv, raw)
+
+    monkeypatch.undo()
+    event = adapter.payload_to_event(recv) # type: ignore
+    assert put == [(event.get_session_id(), raw)]
+    assert worker.route_session(put[0][0], 4) == route(event, 4)
+
+
+async def test_stop_cancels_connections():
+    """关闭时取消每个子进程连接的任务, 不留下未处理的 CancelledError"""
+    codec = get_codec('json')
+    pool = WorkerPool(1, 10, codec, None, lambda: ()) # type: ignore
+    pool._server = await asyncio.start_server(pool._accept, '127.0.0.1', 0)
+    port = pool._server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    channel = worker._Channel(reader, writer, codec)
+    channel.write(worker.HELLO, [0, pool._token])
+    await asyncio.wait_for(pool._workers[0].ready.wait(), 5)
+    assert len(pool._tasks) == 1
+    task = next(iter(pool._tasks))
+
+    await asyncio.wait_for(pool.stop(), 5)
+    assert task.done() and not task.cancelled()
+    assert pool._tasks == set()
+    channel.close()